@@ -35,6 +35,7 @@ import giza.operations.sphinx_cmds
 import giza.operations.translate
 import giza.operations.tx
 import giza.operations.code_review
+import giza.operations.watch
 
 commands = {
     'main': [
@@ -47,7 +48,8 @@ commands = {
         giza.operations.deploy.twofa_code,
         giza.operations.http_serve.start,
         giza.operations.configuration.report_version,
-        giza.operations.make.main
+        giza.operations.make.main,
+        giza.operations.watch.main,
     ],
     'git': [
         giza.operations.git.apply_patch,
@@ -85,6 +87,7 @@ commands = {
         giza.operations.includes.unused,
         giza.operations.includes.list,
         giza.operations.includes.graph,
+        giza.operations.includes.affected,
         giza.operations.includes.clean,
     ],
     'packaging': [
@@ -92,6 +95,7 @@ commands = {
         giza.operations.packaging.unwind,
         giza.operations.packaging.create,
         giza.operations.packaging.deploy,
+        giza.operations.packaging.verify,
     ],
     'env': [
         giza.operations.build_env.package,
@@ -45,6 +45,17 @@ class PathsConfig(RecursiveConfigurationBase):
     def buildarchive(self, value):
         self.state['buildarchive'] = os.path.join(self.output, 'archive')
 
+    @property
+    def image_cache(self):
+        if 'image_cache' not in self.state:
+            self.image_cache = None
+
+        return self.state['image_cache']
+
+    @image_cache.setter
+    def image_cache(self, value):
+        self.state['image_cache'] = os.path.join(self.output, 'image-cache')
+
     @property
     def global_config(self):
         return os.path.join(self.buildsystem, 'data')
@@ -121,6 +132,17 @@ class PathsConfig(RecursiveConfigurationBase):
 
         self.state['branch_source'] = p
 
+    @property
+    def branch_shared_source(self):
+        if 'branch_shared_source' not in self.state:
+            self.branch_shared_source = None
+
+        return self.state['branch_shared_source']
+
+    @branch_shared_source.setter
+    def branch_shared_source(self, value):
+        self.state['branch_shared_source'] = os.path.join(self.branch_output, 'shared-' + self.source)
+
     @property
     def branch_staging(self):
         if 'branch_staging' not in self.state:
@@ -213,7 +213,9 @@ class RuntimeStateConfig(RuntimeStateConfigurationBase):
                          'git_sign_patch', 'package_path',
                          'clean_generated', 'include_mask', 'push_targets',
                          'dry_run', 't_corpora_config', 't_translate_config',
-                         't_output_file', 't_source', 't_target', 'port']
+                         't_output_file', 't_source', 't_target', 'port',
+                         'changed_files', 'poll', 'debounce', 'deploy_fanout',
+                         'verify_members', 'package_base', 'deploy_full']
 
     def __init__(self, obj=None):
         super(RuntimeStateConfig, self).__init__(obj)
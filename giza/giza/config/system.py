@@ -113,6 +113,204 @@ class SystemConfig(RecursiveConfigurationBase):
         else:
             self.state['dependency_cache_fn'] = value
 
+    @property
+    def dependency_backend(self):
+        if 'dependency_backend' not in self.state:
+            self.dependency_backend = None
+
+        return self.state['dependency_backend']
+
+    @dependency_backend.setter
+    def dependency_backend(self, value):
+        if value is None:
+            self.state['dependency_backend'] = 'sqlite'
+        elif value in ('sqlite', 'json'):
+            self.state['dependency_backend'] = value
+        else:
+            raise TypeError('{0} is not a supported dependency cache backend'.format(value))
+
+    @property
+    def change_detection(self):
+        if 'change_detection' not in self.state:
+            self.change_detection = None
+
+        return self.state['change_detection']
+
+    @change_detection.setter
+    def change_detection(self, value):
+        if value is None:
+            self.state['change_detection'] = 'hash'
+        elif value in ('hash', 'git'):
+            self.state['change_detection'] = value
+        else:
+            raise TypeError('{0} is not a supported change detection mode'.format(value))
+
+    @property
+    def last_built_commit(self):
+        if 'last_built_commit' not in self.state:
+            self.last_built_commit = None
+
+        return self.state['last_built_commit']
+
+    @last_built_commit.setter
+    def last_built_commit(self, value):
+        if value is not None:
+            self.state['last_built_commit'] = value
+        else:
+            if self.conf.project.edition is None:
+                fn = 'last-built-commit'
+            else:
+                fn = 'last-built-commit-' + self.conf.project.edition
+
+            self.state['last_built_commit'] = os.path.join(self.conf.paths.projectroot,
+                                                           self.conf.paths.branch_output, fn)
+
+    @property
+    def source_transfer(self):
+        if 'source_transfer' not in self.state:
+            self.source_transfer = None
+
+        return self.state['source_transfer']
+
+    @source_transfer.setter
+    def source_transfer(self, value):
+        if value is None:
+            self.state['source_transfer'] = 'reflink'
+        elif value in ('rsync', 'copy', 'reflink', 'hardlink'):
+            self.state['source_transfer'] = value
+        else:
+            raise TypeError('{0} is not a supported source transfer mode'.format(value))
+
+    @property
+    def shared_source(self):
+        if 'shared_source' not in self.state:
+            self.shared_source = False
+
+        return self.state['shared_source']
+
+    @shared_source.setter
+    def shared_source(self, value):
+        if isinstance(value, bool):
+            self.state['shared_source'] = value
+        else:
+            raise TypeError
+
+    @property
+    def search_index(self):
+        if 'search_index' not in self.state:
+            self.search_index = False
+
+        return self.state['search_index']
+
+    @search_index.setter
+    def search_index(self, value):
+        if isinstance(value, bool):
+            self.state['search_index'] = value
+        else:
+            raise TypeError
+
+    @property
+    def archive_compression(self):
+        if 'archive_compression' not in self.state:
+            self.archive_compression = None
+
+        return self.state['archive_compression']
+
+    @archive_compression.setter
+    def archive_compression(self, value):
+        if value is None:
+            self.state['archive_compression'] = 'gzip'
+        elif value in ('gzip', 'zstd'):
+            self.state['archive_compression'] = value
+        else:
+            raise TypeError('{0} is not a supported archive compression'.format(value))
+
+    @property
+    def source_manifest(self):
+        if 'source_manifest' not in self.state:
+            self.source_manifest = None
+
+        return self.state['source_manifest']
+
+    @source_manifest.setter
+    def source_manifest(self, value):
+        if value is not None:
+            self.state['source_manifest'] = value
+        else:
+            if self.conf.project.edition is None:
+                fn = 'source-manifest.json'
+            else:
+                fn = 'source-manifest-' + self.conf.project.edition + '.json'
+
+            self.state['source_manifest'] = os.path.join(self.conf.paths.projectroot,
+                                                         self.conf.paths.branch_output, fn)
+
+    @property
+    def sphinx_engine(self):
+        if 'sphinx_engine' not in self.state:
+            self.sphinx_engine = None
+
+        return self.state['sphinx_engine']
+
+    @sphinx_engine.setter
+    def sphinx_engine(self, value):
+        if value is None:
+            self.state['sphinx_engine'] = 'command'
+        elif value in ('command', 'inprocess'):
+            self.state['sphinx_engine'] = value
+        else:
+            raise TypeError('{0} is not a supported sphinx engine'.format(value))
+
+    @property
+    def targeted_rebuilds(self):
+        if 'targeted_rebuilds' not in self.state:
+            self.targeted_rebuilds = False
+
+        return self.state['targeted_rebuilds']
+
+    @targeted_rebuilds.setter
+    def targeted_rebuilds(self, value):
+        if isinstance(value, bool):
+            self.state['targeted_rebuilds'] = value
+        else:
+            raise TypeError
+
+    @property
+    def changed_documents(self):
+        if 'changed_documents' not in self.state:
+            self.changed_documents = None
+
+        return self.state['changed_documents']
+
+    @changed_documents.setter
+    def changed_documents(self, value):
+        if value is not None:
+            self.state['changed_documents'] = value
+        else:
+            if self.conf.project.edition is None:
+                fn = 'changed-documents.json'
+            else:
+                fn = 'changed-documents-' + self.conf.project.edition + '.json'
+
+            self.state['changed_documents'] = os.path.join(self.conf.paths.projectroot,
+                                                           self.conf.paths.branch_output, fn)
+
+    @property
+    def sphinx_timings(self):
+        if 'sphinx_timings' not in self.state:
+            self.sphinx_timings = None
+
+        return self.state['sphinx_timings']
+
+    @sphinx_timings.setter
+    def sphinx_timings(self, value):
+        if value is not None:
+            self.state['sphinx_timings'] = value
+        else:
+            self.state['sphinx_timings'] = os.path.join(self.conf.paths.projectroot,
+                                                        self.conf.paths.branch_output,
+                                                        'sphinx-timings.json')
+
     @property
     def runstate(self):
         return self.conf.runstate
@@ -0,0 +1,173 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Change detection from git history. When ``change_detection`` in the ``system``
+configuration is ``git``, giza records the commit of every successful build in
+``build/<branch>/last-built-commit[-<edition>]``. The next build diffs the tree
+of that commit against the working tree, which covers both new commits and
+uncommitted changes, so finding the changed source files costs time
+proportional to the size of the change rather than the size of the
+project. :func:`giza.content.dependencies.refresh_deps()` uses these changes
+in place of the hashes in the dependency cache, and
+:func:`giza.content.dependencies.dump_file_hashes()` does not need to hash the
+source tree.
+
+A build may include uncommitted changes, so giza also records the files that
+differed from the commit at the time of the build, and the next build counts
+them as changed: if they were reverted since, the diff from the commit would
+not show them.
+
+When there is no recorded commit, the commit is not in the repository
+(e.g. in a shallow clone), or :mod:`pygit2` is not installed, the functions in
+this module return ``None`` and giza falls back to hash-based change detection.
+"""
+
+import logging
+import os.path
+
+logger = logging.getLogger('giza.content.changes')
+
+from giza.core.task import normalize_dep_path
+from giza.tools.files import atomic_write, safe_create_directory
+
+def _read_last_built(conf):
+    # returns the recorded commit and the files that were dirty at the time
+    # of the build, or None.
+    fn = conf.system.last_built_commit
+
+    if not os.path.isfile(fn):
+        return None
+
+    with open(fn, 'r') as f:
+        lines = [ ln.strip() for ln in f ]
+
+    if len(lines) == 0 or len(lines[0]) == 0:
+        return None
+    else:
+        return lines[0], [ ln for ln in lines[1:] if ln ]
+
+def get_last_built_commit(conf):
+    last_built = _read_last_built(conf)
+
+    if last_built is None:
+        return None
+    else:
+        return last_built[0]
+
+def get_last_built_dirty_files(conf):
+    """
+    :returns: The list of the absolute paths of the files that had
+       uncommitted changes at the time of the last recorded build.
+    """
+
+    last_built = _read_last_built(conf)
+
+    if last_built is None:
+        return []
+    else:
+        return last_built[1]
+
+def record_built_commit(conf):
+    fn = conf.system.last_built_commit
+    sha = conf.git.commit
+
+    dirty = git_changed_files(conf.paths.projectroot, sha)
+    if dirty is None:
+        # without the uncommitted changes, the commit alone would hide
+        # reverted files from the next build.
+        if os.path.isfile(fn):
+            os.remove(fn)
+        return
+
+    safe_create_directory(os.path.dirname(fn))
+    atomic_write(fn, ''.join(line + '\n' for line in [ sha ] + sorted(dirty)).encode('utf-8'))
+
+    logger.info('recorded {0} as the last built commit, with {1} uncommitted changes, in: {2}'.format(sha, len(dirty), fn))
+
+def git_changed_files(path, base):
+    """
+    :param string path: A path inside of a git repository.
+
+    :param string base: A commit, or any other revision that resolves to a
+       commit.
+
+    :returns: A set of absolute paths of all files that differ between the
+       tree of ``base`` and the working tree of the repository, including
+       untracked files that git does not ignore. Returns ``None`` if the
+       changes cannot be determined.
+    """
+
+    try:
+        import pygit2
+    except ImportError:
+        logger.warning('pygit2 is not installed, cannot use git to detect changed files.')
+        return None
+
+    repo_path = pygit2.discover_repository(path)
+    if repo_path is None:
+        logger.warning('{0} is not in a git repository, cannot use git to detect changed files.'.format(path))
+        return None
+
+    repo = pygit2.Repository(repo_path)
+
+    try:
+        commit = repo.revparse_single(base)
+        tree = commit.peel(pygit2.Tree)
+    except (KeyError, ValueError, pygit2.GitError):
+        logger.warning('cannot find commit {0}, cannot use git to detect changed files.'.format(base))
+        return None
+
+    flags = pygit2.GIT_DIFF_INCLUDE_UNTRACKED | pygit2.GIT_DIFF_RECURSE_UNTRACKED_DIRS
+    diff = tree.diff_to_workdir(flags)
+
+    changed = set()
+    for delta in diff.deltas:
+        # renames report both paths; both affect the files that include them.
+        changed.add(os.path.join(repo.workdir, delta.old_file.path))
+        changed.add(os.path.join(repo.workdir, delta.new_file.path))
+
+    return changed
+
+def changed_since_last_build(graph, conf):
+    """
+    :param dict graph: The include graph, as returned by
+       :func:`giza.includes.include_files()`.
+
+    :returns: The list of files in ``graph`` that changed since the last
+       successful build, or ``None`` if giza must use hash-based change
+       detection.
+
+    As with hash-based change detection, files that giza generates in
+    ``build/<branch>/source`` never count as changed.
+    """
+
+    base = get_last_built_commit(conf)
+    if base is None:
+        logger.info('no recorded build commit, cannot use git to detect changed files.')
+        return None
+
+    changed_files = git_changed_files(conf.paths.projectroot, base)
+    if changed_files is None:
+        return None
+
+    changed_files.update(get_last_built_dirty_files(conf))
+    changed_files = set(os.path.realpath(fn) for fn in changed_files)
+
+    changed = [ fn for fn in graph
+                if os.path.realpath(normalize_dep_path(fn, conf, False)) in changed_files ]
+
+    logger.info('git reports {0} changed files since {1}, {2} of which are included in other files'.format(len(changed_files), base, len(changed)))
+
+    return changed
@@ -24,14 +24,18 @@ combination with this cache of file hashes to ensure that Sphinx does not skip
 building files.
 """
 
-import datetime
-import json
 import logging
 import os
 
-from giza.includes import include_files
+from giza.includes import include_files, IncludeGraph
 from giza.core.task import check_hashed_dependency, normalize_dep_path
-from giza.tools.files import expand_tree, md5_file, safe_create_directory
+from giza.content.changes import changed_since_last_build
+from giza.content.dependency_store import get_dependency_store
+from giza.content.source import get_transfer_source
+from giza.sphinxext import extension_enabled, has_outdated_hook, to_docname
+from giza.tools.files import expand_tree, hash_files, safe_create_directory
+from giza.tools.serialization import write_json
+from giza.tools.transfer import manifest_signatures
 from giza.tools.timing import Timer
 
 logger = logging.getLogger('giza.content.dependencies')
@@ -39,37 +43,37 @@ logger = logging.getLogger('giza.content.dependencies')
 ########## Update File Hashes ##########
 
 def dump_file_hashes(conf):
-    output = conf.system.dependency_cache
+    if conf.system.change_detection == 'git':
+        # the next build diffs against the commit recorded after this build,
+        # and doesn't need file hashes.
+        logger.info('using git to detect changes, not hashing the source tree.')
+        return
 
-    o = { 'time': datetime.datetime.utcnow().strftime("%s"),
-          'files': { }
-        }
+    store = get_dependency_store(conf)
+    previous = store.load()
 
-    files = expand_tree(os.path.join(conf.paths.projectroot, conf.paths.branch_source), None)
+    target = os.path.join(conf.paths.projectroot, conf.paths.branch_source)
+    files = expand_tree(target, None)
 
-    fmap = o['files']
+    # only files whose size, mtime or inode changed since the last build need
+    # to be hashed again. The source transfer recorded the digests of the files
+    # that it placed in the build source, so these don't need to be read.
+    signatures = dict(previous or {})
+    if conf.system.source_transfer != 'rsync':
+        signatures.update(manifest_signatures(conf.system.source_manifest,
+                                              get_transfer_source(conf), target))
 
-    for fn in files:
-        if os.path.exists(fn):
-            fmap[fn] = md5_file(fn)
-
-    safe_create_directory(os.path.dirname(output))
-
-    with open(output, 'w') as f:
-        json.dump(o, f)
-
-    logger.info('wrote dependency cache to: {0}'.format(output))
+    store.write(hash_files(files, signatures, conf.runstate.pool_size), previous)
 
 ########## Update Dependencies ##########
 
-def _refresh_deps(graph, dep_map, conf):
+def _changed_includes(graph, dep_map, conf):
     warned = set()
-    count = 0
+    changed = []
 
-    # For each file in the source tree, bump the timestamp of all files that
-    # include it, if the file changed since the last build.
+    # Find the included files that changed since the last build.
 
-    for file, dependents in graph.items():
+    for file in graph:
         if check_hashed_dependency(file, dep_map, conf) is True:
             core_file = normalize_dep_path(file, conf, False)
             norm_file = normalize_dep_path(file, conf, True)
@@ -78,23 +82,49 @@ def _refresh_deps(graph, dep_map, conf):
                 # these are generated files in the build/<branch>/source. No
                 # need to touch these files.
                 continue
-            for dep in [ normalize_dep_path(dep, conf, branch=True) for dep in dependents]:
-                if not os.path.exists(core_file):
-                    # this file doesn't exist in the source. Sphinx will
-                    # warn about this file later (though the output silently
-                    # ignores the unavailable content.)
-
-                    if core_file in warned:
-                        continue
-                    else:
-                        warned.add(core_file)
-                        logger.warning('included file does not exist: ' + core_file)
-                elif os.path.exists(dep):
-                    logger.debug('updating timestamp of "{0}" because of "{1}"'.format(dep, file))
-                    os.utime(dep, None)
-                    count += 1
-
-    logger.info('bumped timestamps for {0} files'.format(count))
+            elif not os.path.exists(core_file):
+                # this file doesn't exist in the source. Sphinx will
+                # warn about this file later (though the output silently
+                # ignores the unavailable content.)
+
+                if core_file not in warned:
+                    warned.add(core_file)
+                    logger.warning('included file does not exist: ' + core_file)
+            else:
+                changed.append(file)
+
+    return changed
+
+def _refresh_deps(graph, changed, conf):
+    # Report or bump the timestamp of every file that includes a changed file,
+    # directly or through nested includes.
+
+    affected = IncludeGraph(graph).affected(changed)
+
+    docnames = sorted(set(to_docname(fn) for fn in affected))
+    safe_create_directory(os.path.dirname(conf.system.changed_documents))
+    write_json(docnames, conf.system.changed_documents)
+    logger.info('{0} documents affected by {1} changed includes'.format(len(docnames), len(changed)))
+
+    if conf.system.targeted_rebuilds is True and has_outdated_hook() is True:
+        if extension_enabled(os.path.join(conf.paths.projectroot, 'conf.py')):
+            # giza.sphinxext reports these documents to Sphinx, so there's no
+            # need to modify files in the build/<branch>/source directory.
+            return docnames
+        else:
+            logger.info('giza.sphinxext is not in the extensions in conf.py, updating timestamps instead of targeted rebuilds')
+
+    count = 0
+    for dep in affected:
+        dep = normalize_dep_path(dep, conf, branch=True)
+        if os.path.exists(dep):
+            logger.debug('updating timestamp of "{0}" because an included file changed'.format(dep))
+            os.utime(dep, None)
+            count += 1
+
+    logger.info('bumped timestamps for {0} files affected by {1} changed includes'.format(count, len(changed)))
+
+    return docnames
 
 def refresh_deps(conf):
     with Timer('resolve dependency graph'):
@@ -102,21 +132,19 @@ def refresh_deps(conf):
         # (i.e. the ones that they include).
         graph = include_files(conf=conf)
 
-        # load, if possible, a mappping of all source files with hashes from the
-        # last build.
-        if not os.path.exists(conf.system.dependency_cache):
-            dep_map = None
-        else:
-            with open(conf.system.dependency_cache, 'r') as f:
-                try:
-                    dep_cache = json.load(f)
-                    dep_map = dep_cache['files']
-                except ValueError:
-                    dep_map = None
-                    logger.warning('no stored dependency information, will rebuild more things than necessary.')
+    with Timer('find changed includes'):
+        changed = None
+        if conf.system.change_detection == 'git':
+            changed = changed_since_last_build(graph, conf)
+
+        if changed is None:
+            # load, if possible, a mappping of all source files with hashes
+            # from the last build.
+            dep_map = get_dependency_store(conf).load()
+            changed = _changed_includes(graph, dep_map, conf)
 
     with Timer('dependency updates'):
-        _refresh_deps(graph, dep_map, conf)
+        return _refresh_deps(graph, changed, conf)
 
 # In previous versions, giza loaded the dep_map in the main thread, and then
 # passed the checks and update to a worker pool, but the pool took ~40 seconds
@@ -135,6 +163,9 @@ def dump_file_hash_tasks(conf, app):
     t = app.add('task')
     t.job = dump_file_hashes
     t.args = [conf]
-    t.target = conf.system.dependency_cache
+    # the dump only re-hashes files with changed stat data, so it's cheap enough
+    # to run on every build, and the sqlite store is shared between editions,
+    # so its mtime is not a useful target.
+    t.target = None
     t.dependency = os.path.join(conf.paths.projectroot, conf.paths.branch_source)
     t.description = "writing dependency cache to a file for the next build"
@@ -0,0 +1,270 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Storage backends for the dependency cache that
+:mod:`giza.content.dependencies` maintains between builds. The cache maps the
+absolute paths of files in ``build/<branch>/source`` to ``[digest, size,
+mtime_ns, inode]`` signatures.
+
+- :class:`~giza.content.dependency_store.JsonDependencyStore` is the original
+  format: one ``dependencies-<edition>.json`` file per edition, which is loaded
+  and rewritten in full on every build.
+
+- :class:`~giza.content.dependency_store.SqliteDependencyStore` keeps all
+  editions of a branch in one ``dependencies.db`` file. Paths are stored once,
+  relative to the project root, and shared between editions; digests are stored
+  as binary. Builds only write the rows that changed. When an edition has no
+  data in the database, the store reads the edition's JSON cache, so existing
+  build directories migrate without a full rebuild.
+
+Set ``dependency_backend`` in the ``system`` configuration to ``json`` or
+``sqlite`` to choose a backend. The default is ``sqlite`` when the
+:mod:`sqlite3` module is available.
+"""
+
+import binascii
+import datetime
+import json
+import logging
+import os.path
+
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+logger = logging.getLogger('giza.content.dependency_store')
+
+from giza.tools.files import safe_create_directory, hash_algorithm
+
+class DependencyStoreError(Exception):
+    pass
+
+class DependencyStore(object):
+    """
+    Base class for dependency cache backends. Subclasses implement
+    :meth:`~giza.content.dependency_store.DependencyStore.load()` and
+    :meth:`~giza.content.dependency_store.DependencyStore.write()`.
+    """
+
+    def __init__(self, conf):
+        self.conf = conf
+
+    @property
+    def path(self):
+        raise NotImplementedError
+
+    def load(self):
+        """
+        :returns: The mapping of file names to signatures from the last build,
+           or ``None`` if there is no usable cache.
+        """
+
+        raise NotImplementedError
+
+    def write(self, files, previous=None):
+        """
+        :param dict files: The mapping of file names to signatures for the
+           current build.
+
+        :param dict previous: The mapping that
+           :meth:`~giza.content.dependency_store.DependencyStore.load()`
+           returned, which backends may use to only write changed entries.
+        """
+
+        raise NotImplementedError
+
+    def _check_algorithm(self, algorithm):
+        # caches written before giza stored the hash algorithm hold md5 digests.
+        if algorithm in (None, 'md5'):
+            algorithm = 'md5'
+
+        if algorithm != hash_algorithm:
+            logger.warning('dependency cache uses a different hash algorithm, will rebuild more things than necessary.')
+            return False
+        else:
+            return True
+
+class JsonDependencyStore(DependencyStore):
+    @property
+    def path(self):
+        return self.conf.system.dependency_cache
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return None
+
+        with open(self.path, 'r') as f:
+            try:
+                dep_cache = json.load(f)
+            except ValueError:
+                logger.warning('no stored dependency information, will rebuild more things than necessary.')
+                return None
+
+        if self._check_algorithm(dep_cache.get('hash')) is False:
+            return None
+
+        return dep_cache['files']
+
+    def write(self, files, previous=None):
+        o = { 'time': datetime.datetime.utcnow().strftime("%s"),
+              'hash': hash_algorithm,
+              'files': files
+            }
+
+        safe_create_directory(os.path.dirname(self.path))
+
+        with open(self.path, 'w') as f:
+            json.dump(o, f)
+
+        logger.info('wrote dependency cache to: {0}'.format(self.path))
+
+class SqliteDependencyStore(DependencyStore):
+    schema = [
+        'CREATE TABLE IF NOT EXISTS paths (id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL)',
+        'CREATE TABLE IF NOT EXISTS editions (edition TEXT PRIMARY KEY, algorithm TEXT, time INTEGER)',
+        ('CREATE TABLE IF NOT EXISTS signatures (edition TEXT NOT NULL, path_id INTEGER NOT NULL, '
+         'digest BLOB, size INTEGER, mtime INTEGER, inode INTEGER, PRIMARY KEY (edition, path_id))'),
+    ]
+
+    def __init__(self, conf):
+        if sqlite3 is None:
+            raise DependencyStoreError('the sqlite3 module is not available')
+
+        super(SqliteDependencyStore, self).__init__(conf)
+        self.edition = conf.project.edition or ''
+        self.root = conf.paths.projectroot
+
+    @property
+    def path(self):
+        return os.path.join(self.root, self.conf.paths.branch_output, 'dependencies.db')
+
+    def _connect(self):
+        safe_create_directory(os.path.dirname(self.path))
+
+        db = sqlite3.connect(self.path, timeout=60)
+        for statement in self.schema:
+            db.execute(statement)
+
+        return db
+
+    def _relative(self, fn):
+        if fn.startswith(self.root):
+            return fn[len(self.root)+1:]
+        else:
+            return fn
+
+    def _absolute(self, fn):
+        if os.path.isabs(fn):
+            return fn
+        else:
+            return os.path.join(self.root, fn)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return self._migrate()
+
+        db = self._connect()
+        try:
+            row = db.execute('SELECT algorithm FROM editions WHERE edition = ?', (self.edition,)).fetchone()
+            if row is None:
+                return self._migrate()
+            elif self._check_algorithm(row[0]) is False:
+                return None
+
+            files = {}
+            cursor = db.execute('SELECT paths.path, digest, size, mtime, inode FROM signatures '
+                                'JOIN paths ON paths.id = signatures.path_id WHERE edition = ?',
+                                (self.edition,))
+            for path, digest, size, mtime, inode in cursor:
+                digest = binascii.hexlify(bytes(digest)).decode('ascii')
+                if size is None:
+                    files[self._absolute(path)] = digest
+                else:
+                    files[self._absolute(path)] = [digest, size, mtime, inode]
+
+            return files
+        finally:
+            db.close()
+
+    def _migrate(self):
+        files = JsonDependencyStore(self.conf).load()
+        if files is not None:
+            logger.info('reading legacy dependency cache: {0}'.format(self.conf.system.dependency_cache))
+
+        return files
+
+    def _path_id(self, db, fn):
+        rel = self._relative(fn)
+        db.execute('INSERT OR IGNORE INTO paths (path) VALUES (?)', (rel,))
+        return db.execute('SELECT id FROM paths WHERE path = ?', (rel,)).fetchone()[0]
+
+    def write(self, files, previous=None):
+        db = self._connect()
+        try:
+            row = db.execute('SELECT algorithm FROM editions WHERE edition = ?', (self.edition,)).fetchone()
+            if row is None or row[0] != hash_algorithm:
+                # the stored data is from another algorithm or from the JSON
+                # cache: replace all entries for this edition.
+                db.execute('DELETE FROM signatures WHERE edition = ?', (self.edition,))
+                previous = {}
+            elif previous is None:
+                previous = {}
+
+            changed = [ (fn, sig) for fn, sig in files.items() if previous.get(fn) != sig ]
+            removed = [ fn for fn in previous if fn not in files ]
+
+            for fn in removed:
+                db.execute('DELETE FROM signatures WHERE edition = ? AND path_id = '
+                           '(SELECT id FROM paths WHERE path = ?)', (self.edition, self._relative(fn)))
+
+            rows = []
+            for fn, sig in changed:
+                if isinstance(sig, list):
+                    digest, size, mtime, inode = sig
+                else:
+                    digest, size, mtime, inode = sig, None, None, None
+
+                rows.append((self.edition, self._path_id(db, fn),
+                             sqlite3.Binary(binascii.unhexlify(digest)), size, mtime, inode))
+
+            db.executemany('INSERT OR REPLACE INTO signatures (edition, path_id, digest, size, mtime, inode) '
+                           'VALUES (?, ?, ?, ?, ?, ?)', rows)
+            db.execute('INSERT OR REPLACE INTO editions (edition, algorithm, time) VALUES (?, ?, ?)',
+                       (self.edition, hash_algorithm, int(datetime.datetime.utcnow().strftime("%s"))))
+            db.commit()
+        finally:
+            db.close()
+
+        logger.info('updated {0} and removed {1} entries in dependency cache: {2}'.format(len(changed), len(removed), self.path))
+
+dependency_store_backends = {
+    'json': JsonDependencyStore,
+    'sqlite': SqliteDependencyStore,
+}
+
+def get_dependency_store(conf):
+    """
+    :returns: The :class:`~giza.content.dependency_store.DependencyStore`
+       selected by ``conf.system.dependency_backend``.
+    """
+
+    backend = conf.system.dependency_backend
+
+    if backend == 'sqlite' and sqlite3 is None:
+        logger.warning('sqlite3 is not available, using the json dependency cache.')
+        backend = 'json'
+
+    return dependency_store_backends[backend](conf)
@@ -23,7 +23,7 @@ import os
 
 logger = logging.getLogger('giza.content.examples')
 
-from giza.tools.files import expand_tree, safe_create_directory, verbose_remove
+from giza.tools.files import expand_tree, safe_create_directory, verbose_remove, write_if_changed
 from giza.config.content import new_content_type
 from giza.content.examples.inheritance import ExampleDataCache
 from giza.content.examples.views import full_example
@@ -34,7 +34,7 @@ def register_examples(conf):
 
 def write_full_example(collection, examples, fn):
     content = full_example(collection, examples)
-    content.write(fn)
+    return write_if_changed(fn, content.data)
 
 def example_tasks(conf):
     # In the beginning of this operation, which executes in the main thread, we
@@ -17,7 +17,7 @@ import logging
 
 logger = logging.getLogger('giza.content.extract.tasks')
 
-from giza.tools.files import safe_create_directory
+from giza.tools.files import safe_create_directory, write_if_changed
 from giza.tools.transformation import append_to_file, prepend_to_file
 from giza.content.extract.inheritance import ExtractDataCache
 from giza.content.extract.views import render_extracts, get_include_statement
@@ -29,8 +29,11 @@ def register_extracts(conf):
 
 def write_extract_file(extract, fn):
     content = render_extracts(extract)
-    content.write(fn)
-    logger.info('wrote extract file: ' + fn)
+    result = write_if_changed(fn, content.data)
+    if result.changed is True:
+        logger.info('wrote extract file: ' + fn)
+
+    return result
 
 def extract_tasks(conf):
     extract_sources = conf.system.content.extracts.sources
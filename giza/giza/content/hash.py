@@ -26,31 +26,23 @@ logger = logging.getLogger('giza.hash')
 
 from rstcloth.rstcloth import RstCloth
 
+from giza.tools.files import write_if_changed
+
 #################### Rendering ####################
 
 def generate_hash_file(fn, conf):
     r = RstCloth()
 
-    if os.path.exists(fn):
-        with open(fn, 'r') as f:
-            existing = f.read()
-    else:
-        existing = []
-
     commit = conf.git.commit
     r.directive('|commit| replace', '``{0}``'.format(commit))
 
-    try:
-        if r.data == existing[:-1]:
-            logger.info('no new commit(s), not updating {0} ({1})'.format(fn, commit[:10]))
-            return True
-    except TypeError:
-        logger.warning('problem generating {0}, continuing'.format(fn))
-        with file(fn, 'a'):
-            os.utime(fn, times)
-    else:
-        r.write(fn)
+    result = write_if_changed(fn, r.data)
+    if result.changed is True:
         logger.info('regenerated {0} with new commit hash: {1}'.format(fn, commit[:10]))
+    else:
+        logger.info('no new commit(s), not updating {0} ({1})'.format(fn, commit[:10]))
+
+    return result
 
 def generate_release_file(release_fn, conf):
     release_root = os.path.dirname(release_fn)
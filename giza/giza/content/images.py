@@ -52,7 +52,6 @@ is in :func:`giza.content.images.generate_image_pages()`.
    The current implementation does not strictly enforce the metadata schema.
 """
 
-import sys
 import os.path
 import logging
 
@@ -61,8 +60,9 @@ logger = logging.getLogger('giza.content.images')
 from docutils.core import publish_parts
 from rstcloth.rstcloth import RstCloth
 
-from giza.tools.command import command
-from giza.tools.files import verbose_remove
+from giza.core.task import check_dependency
+from giza.tools.files import verbose_remove, write_if_changed
+from giza.tools.inkscape import render_images
 from giza.tools.serialization import ingest_yaml_list
 from giza.tools.strings import dot_concat, hyph_concat
 
@@ -150,30 +150,11 @@ def generate_image_pages(dir, name, alt, output, conf):
         r.newline()
 
     image_rst_file_path = os.path.join(conf.paths.projectroot, image + '.rst')
-    r.write(image_rst_file_path)
-    logger.debug('generated include file {0}.rst'.format(image))
+    result = write_if_changed(image_rst_file_path, r.data)
+    if result.changed is True:
+        logger.debug('generated include file {0}.rst'.format(image))
 
-def _get_inkscape_cmd():
-    if sys.platform in ['linux', 'linux2']:
-        return '/usr/bin/inkscape'
-    elif sys.platform == 'darwin':
-        inkscape = '/Applications/Inkscape.app/Contents/Resources/bin/inkscape'
-        if os.path.exists(inkscape):
-            return inkscape
-
-    return 'inkscape'
-
-def _generate_images(cmd, dpi, width, target, source):
-    full_cmd = cmd.format(cmd=_get_inkscape_cmd(),
-                          dpi=dpi,
-                          width=width,
-                          target=target,
-                          source=source)
-    command(full_cmd)
-
-    logger.debug(full_cmd)
-
-    logger.info('generated image file {0}'.format(target))
+    return result
 
 def get_images_metadata_file(conf):
     base = None
@@ -208,6 +189,7 @@ def image_tasks(conf, app):
         images = [ conf.system.files.data.images ]
 
     image_dir = conf.paths.branch_images
+    renders = []
 
     for image in images:
         image['dir'] = image_dir
@@ -247,19 +229,26 @@ def image_tasks(conf, app):
 
             target_img = ''.join([source_base, tag, '.', build_type])
 
-            if build_type == 'png':
-                inkscape_cmd = '{cmd} -z -d {dpi} -w {width} -y 0.0 -e >/dev/null {target} {source}'
-            elif build_type == 'eps':
-                inkscape_cmd = '{cmd} -z -d {dpi} -w {width} -y 1.0 -E >/dev/null {target} {source}'
-
-            t = app.add('task')
-            t.conf = conf
-            t.job = _generate_images
-            t.args = [ inkscape_cmd, output['dpi'], output['width'], target_img, source_file ]
-            t.target = target_img
-            t.dependency = [ source_core ]
-            t.description = 'generating image file {0} from {1}'.format(target_img, source_core)
-            logger.debug('adding image creation job for {0}'.format(target_img))
+            if conf.runstate.force is True or check_dependency(target_img, source_core) is True:
+                renders.append((source_file, target_img, output['dpi'], output['width'], build_type))
+
+    if len(renders) == 0:
+        return
+
+    # each task starts one inkscape process and renders its share of the
+    # images in that process.
+    batches = min(len(renders), conf.runstate.pool_size)
+    for idx in range(batches):
+        batch = renders[idx::batches]
+
+        t = app.add('task')
+        t.conf = conf
+        t.job = render_images
+        t.args = [ batch, os.path.join(conf.paths.projectroot, conf.paths.image_cache) ]
+        t.target = [ target for _, target, _, _, _ in batch ]
+        t.dependency = None
+        t.description = 'generating {0} image files with inkscape'.format(len(batch))
+        logger.debug('adding image creation job for {0} images'.format(len(batch)))
 
 def image_clean(conf, app):
     if 'images' not in conf.system.files.data:
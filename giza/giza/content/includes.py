@@ -25,7 +25,7 @@ import os.path
 logger = logging.getLogger('giza.content.includes')
 
 from giza.includes import generated_includes, included_recusively, include_files
-from giza.tools.files import expand_tree
+from giza.tools.files import expand_tree, write_if_changed
 from giza.tools.serialization import ingest_yaml_doc
 from giza.tools.timing import Timer
 
@@ -48,8 +48,11 @@ def write_include_index(overview_fn, conf):
     r = build_page(fd, conf)
 
     if r is not None:
-        r.write(overview_fn)
-        logger.info('includes: generated /meta/includes source page.')
+        result = write_if_changed(overview_fn, r.data)
+        if result.changed is True:
+            logger.info('includes: generated /meta/includes source page.')
+
+        return result
 
 def include_file_data(conf):
     inc_path = os.path.join(conf.paths.includes)
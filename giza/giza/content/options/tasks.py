@@ -17,7 +17,7 @@ import logging
 
 logger = logging.getLogger('giza.content.options.tasks')
 
-from giza.tools.files import expand_tree, verbose_remove, safe_create_directory
+from giza.tools.files import expand_tree, verbose_remove, safe_create_directory, write_if_changed
 from giza.tools.strings import hyph_concat
 from giza.content.options.inheritance import OptionDataCache
 from giza.content.options.views import render_options
@@ -29,8 +29,11 @@ def register_options(conf):
 
 def write_options(option, fn, conf):
     content = render_options(option, conf)
-    content.write(fn)
-    logger.info('wrote options file: ' + fn)
+    result = write_if_changed(fn, content.data)
+    if result.changed is True:
+        logger.info('wrote options file: ' + fn)
+
+    return result
 
 def option_tasks(conf):
     option_sources = conf.system.content.options.sources
@@ -29,7 +29,7 @@ import logging
 logger = logging.getLogger('giza.content.param')
 
 from giza.tools.strings import dot_concat
-from giza.tools.files import expand_tree
+from giza.tools.files import expand_tree, write_if_changed
 from giza.tools.serialization import ingest_yaml_list
 
 from rstcloth.rstcloth import RstCloth
@@ -245,8 +245,11 @@ def api_targets(conf):
 
 def _generate_api_param(source, target, conf):
     r = generate_params(ingest_yaml_list(source), source, conf)
-    r.write(target)
-    logger.info('rebuilt {0}'.format(target))
+    result = write_if_changed(target, r.data)
+    if result.changed is True:
+        logger.info('rebuilt {0}'.format(target))
+
+    return result
 
 def api_tasks(conf, app):
     for source in api_sources(conf):
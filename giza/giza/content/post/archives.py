@@ -23,26 +23,37 @@ import logging
 logger = logging.getLogger('giza.content.post.archives')
 
 from giza.tools.strings import hyph_concat
-from giza.tools.files import copy_if_needed, create_link, tarball
+from giza.tools.files import copy_if_needed, create_link
+from giza.tools.compression import tarball
 
 def get_tarball_name(builder, conf):
+    if conf.system.archive_compression == 'zstd':
+        ext = '.tar.zst'
+    else:
+        ext = '.tar.gz'
+
     if builder == 'link-html':
-        fn = conf.project.name + '.tar.gz'
+        fn = conf.project.name + ext
     elif builder == 'link-man':
-        fn = "manpages.tar.gz"
+        fn = "manpages" + ext
     elif builder == 'link-slides':
-        fn = hyph_concat(conf.project.name, 'slides') + '.tar.gz'
+        fn = hyph_concat(conf.project.name, 'slides') + ext
     elif builder.startswith('man'):
-        fn = hyph_concat('manpages', conf.git.branches.current) + '.tar.gz'
+        fn = hyph_concat('manpages', conf.git.branches.current) + ext
     elif builder.startswith('html'):
-        fn = hyph_concat(conf.project.name, conf.git.branches.current) + '.tar.gz'
+        fn = hyph_concat(conf.project.name, conf.git.branches.current) + ext
     else:
-        fn = hyph_concat(conf.project.name, conf.git.branches.current, builder) + '.tar.gz'
+        fn = hyph_concat(conf.project.name, conf.git.branches.current, builder) + ext
 
     return os.path.join(conf.paths.projectroot,
                         conf.paths.public_site_output,
                         fn)
 
+def get_tarball_root(tarball_name):
+    # i.e. the "project-master.tar" directory in "project-master.tar.gz", as
+    # in the tarballs that earlier versions of giza wrote.
+    return os.path.splitext(os.path.basename(tarball_name))[0]
+
 def html_tarball(builder, conf):
     copy_if_needed(os.path.join(conf.paths.projectroot,
                                 conf.paths.branch_includes, 'hash.rst'),
@@ -56,7 +67,8 @@ def html_tarball(builder, conf):
             path=builder,
             cdir=os.path.join(conf.paths.projectroot,
                               conf.paths.branch_output),
-            newp=os.path.splitext(os.path.basename(tarball_name))[0])
+            newp=get_tarball_root(tarball_name),
+            threads=conf.runstate.pool_size)
 
     link_name = get_tarball_name('link-html', conf)
 
@@ -79,7 +91,8 @@ def slides_tarball(builder, conf):
             path=builder,
             cdir=os.path.join(conf.paths.projectroot,
                               conf.paths.branch_output),
-            newp=os.path.splitext(os.path.basename(tarball_name))[0])
+            newp=get_tarball_root(tarball_name),
+            threads=conf.runstate.pool_size)
 
     link_name = get_tarball_name('link-slides', conf)
 
@@ -95,7 +108,8 @@ def man_tarball(builder, conf):
     tarball(name=tarball_name,
             path=builder,
             cdir=os.path.join(conf.paths.projectroot, conf.paths.branch_output),
-            newp=conf.project.name + '-manpages')
+            newp=conf.project.name + '-manpages',
+            threads=conf.runstate.pool_size)
 
     link_name = get_tarball_name('link-man', conf)
 
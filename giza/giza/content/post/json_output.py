@@ -16,7 +16,14 @@
 Post-process all output produced by JSON to add a "text" field to these
 documents that omits the XML data injected into this format by default so that
 search tools can use this data to index content. Also generates a file with a
-list of paths in the output.
+list of paths in the output, and, when ``search_index`` is set in the
+``system`` configuration, a compact search index of the documents (see
+:mod:`giza.tools.search_index`).
+
+The files are processed in chunks, one task per chunk, so that the build's
+process pool shares the work without the overhead of one task per
+document. Each chunk records the signatures of its ``.fjson`` inputs, and the
+next build skips inputs whose content has not changed.
 """
 
 import json
@@ -28,8 +35,40 @@ logger = logging.getLogger('giza.content.post.json_output')
 
 from giza.tools.command import command
 from giza.tools.strings import dot_concat
-from giza.tools.files import expand_tree, copy_if_needed, safe_create_directory
-from giza.tools.transformation import munge_content
+from giza.tools.files import (expand_tree, copy_if_needed, safe_create_directory,
+                              atomic_write, file_signature)
+from giza.tools.search_index import update_index
+
+########## Markup Stripping ##########
+
+# tags, non-breaking spaces, and numeric entities other than quotation marks
+# are removed in one pass. Calling a function for every match to replace the
+# remaining entities in the same pass is slower than replacing them
+# afterwards.
+markup_regex = re.compile(r'<[^>]*>|&nbsp;|&#(?!82(?:1[67]|2[01]);)\d{4};')
+
+entity_replacements = [
+    ('&#8220;', '"'),
+    ('&#8221;', '"'),
+    ('&#8216;', "'"),
+    ('&#8217;', "'"),
+    ('&gt;', '>'),
+    ('&lt;', '<'),
+]
+
+def strip_markup(text):
+    """
+    :returns: ``text`` without HTML tags, with quotation and comparison
+       entities replaced with the corresponding characters.
+    """
+
+    text = markup_regex.sub('', text)
+
+    if '&' in text:
+        for entity, character in entity_replacements:
+            text = text.replace(entity, character)
+
+    return text
 
 ########## Process Sphinx Json Output ##########
 
@@ -53,22 +92,40 @@ def json_output(conf):
                        dst=json_dst))
 
     copy_if_needed(list_file, public_list_file)
+
+    if conf.system.search_index is True:
+        copy_if_needed(get_search_index_file(conf), os.path.join(json_dst, '.search-index'))
+
     logger.info('deployed json files to local staging.')
 
-def json_output_tasks(conf, app):
-    regexes = [
-        (re.compile(r'<a class=\"headerlink\"'), '<a'),
-        (re.compile(r'<[^>]*>'), ''),
-        (re.compile(r'&#8220;'), '"'),
-        (re.compile(r'&#8221;'), '"'),
-        (re.compile(r'&#8216;'), "'"),
-        (re.compile(r'&#8217;'), "'"),
-        (re.compile(r'&#\d{4};'), ''),
-        (re.compile(r'&nbsp;'), ''),
-        (re.compile(r'&gt;'), '>'),
-        (re.compile(r'&lt;'), '<')
-    ]
+def get_json_signatures_file(conf):
+    if 'edition' in conf.project and conf.project.edition != conf.project.name:
+        fn = 'json-signatures-' + conf.project.edition + '.json'
+    else:
+        fn = 'json-signatures.json'
+
+    return os.path.join(conf.paths.projectroot, conf.paths.branch_output, fn)
+
+def get_search_index_file(conf):
+    if 'edition' in conf.project and conf.project.edition != conf.project.name:
+        fn = 'search-index-' + conf.project.edition + '.idx'
+    else:
+        fn = 'search-index.idx'
+
+    return os.path.join(conf.paths.projectroot, conf.paths.branch_output, fn)
+
+def load_json_signatures(fn):
+    if not os.path.isfile(fn):
+        return {}
+
+    with open(fn, 'r') as f:
+        try:
+            return json.load(f)
+        except ValueError:
+            logger.warning('could not read json signatures from {0}, processing all files'.format(fn))
+            return {}
 
+def json_output_tasks(conf, app):
     outputs = []
     for fn in expand_tree('source', 'txt'):
         # path = build/<branch>/json/<filename>
@@ -82,34 +139,139 @@ def json_output_tasks(conf, app):
             path = os.path.join(conf.paths.branch_output,
                                 'json', os.path.splitext(fn.split(os.path.sep, 1)[1])[0])
 
+        outputs.append((dot_concat(path, 'fjson'), dot_concat(path, 'json')))
+
+    signatures_fn = get_json_signatures_file(conf)
+    signatures = load_json_signatures(signatures_fn)
 
+    # chunks write their signatures to fragments, which a later task merges.
+    fragments_dir = os.path.splitext(signatures_fn)[0]
+    if os.path.isdir(fragments_dir):
+        for fn in os.listdir(fragments_dir):
+            os.remove(os.path.join(fragments_dir, fn))
 
-        fjson = dot_concat(path, 'fjson')
-        json = dot_concat(path, 'json')
+    chunk_size = max(1, len(outputs) // (conf.runstate.pool_size * 4) + 1)
 
-        task = app.add('task')
-        task.target = json
-        task.dependency = fjson
-        task.job = process_json_file
-        task.description = "processing json file".format(json)
-        task.args = [fjson, json, regexes, conf]
+    process_app = app.add('app')
+    for idx in range(0, len(outputs), chunk_size):
+        chunk = outputs[idx:idx+chunk_size]
 
-        outputs.append(json)
+        task = process_app.add('task')
+        task.job = process_json_files
+        task.args = [chunk,
+                     dict((fjson, signatures[fjson]) for fjson, _ in chunk if fjson in signatures),
+                     os.path.join(fragments_dir, '{0}.json'.format(idx)),
+                     conf]
+        task.description = 'processing {0} json files'.format(len(chunk))
 
     list_file = os.path.join(conf.paths.branch_output, 'json-file-list')
 
-    list_task = app.add('task')
+    output = app.add('app')
+
+    list_task = output.add('task')
     list_task.target = list_file
     list_task.job = generate_list_file
-    list_task.args = [outputs, list_file, conf]
+    list_task.args = [[ json for _, json in outputs ], list_file, conf]
 
-    output = app.add('app')
-    out_task = output.add('task')
+    signatures_task = output.add('task')
+    signatures_task.job = merge_json_signatures
+    signatures_task.args = [fragments_dir, signatures_fn]
+    signatures_task.description = 'recording signatures of json input files'
+
+    transfer = output.add('app')
+
+    if conf.system.search_index is True:
+        index_task = transfer.add('task')
+        index_task.job = build_search_index
+        index_task.args = [outputs, signatures_fn, get_search_index_file(conf)]
+        index_task.description = 'updating search index'
+
+        transfer = transfer.add('app')
+
+    out_task = transfer.add('task')
     out_task.job = json_output
     out_task.args = [conf]
     out_task.description = 'transfer json output to public directory'
 
-def process_json_file(input_fn, output_fn, regexes, conf=None):
+def process_json_files(files, signatures, fragment, conf):
+    """
+    :param list files: A list of ``(fjson, json)`` file name tuples.
+
+    :param dict signatures: The signatures of the ``fjson`` files from the last
+       run, as returned by :func:`giza.tools.files.file_signature()`.
+
+    :param string fragment: The file where this chunk records the signatures
+       of its input files.
+
+    Processes the ``fjson`` files whose content changed since the last run.
+
+    :returns: The number of processed files.
+    """
+
+    current = {}
+    processed = 0
+
+    for input_fn, output_fn in files:
+        if os.path.isfile(input_fn) is False:
+            continue
+
+        previous = signatures.get(input_fn)
+        current[input_fn] = file_signature(input_fn, previous)
+
+        if (isinstance(previous, list) and previous[0] == current[input_fn][0] and
+                os.path.isfile(output_fn)):
+            continue
+
+        process_json_file(input_fn, output_fn, conf)
+        processed += 1
+
+    safe_create_directory(os.path.dirname(fragment))
+    with open(fragment, 'w') as f:
+        json.dump(current, f)
+
+    logger.debug('processed {0} json files, {1} unchanged'.format(processed, len(current) - processed))
+
+    return processed
+
+def merge_json_signatures(fragments_dir, fn):
+    signatures = {}
+
+    if os.path.isdir(fragments_dir):
+        for fragment in os.listdir(fragments_dir):
+            fragment = os.path.join(fragments_dir, fragment)
+            signatures.update(load_json_signatures(fragment))
+            os.remove(fragment)
+
+        os.rmdir(fragments_dir)
+
+    atomic_write(fn, json.dumps(signatures))
+
+def _read_indexed_document(fn):
+    if not os.path.isfile(fn):
+        return None
+
+    with open(fn, 'r') as f:
+        doc = json.load(f)
+
+    return doc.get('url', ''), doc.get('title', ''), doc.get('text', '')
+
+def build_search_index(outputs, signatures_fn, index_fn):
+    """
+    :param list outputs: A list of ``(fjson, json)`` file name tuples.
+
+    Updates the search index in ``index_fn`` from the processed ``json``
+    files. Only documents whose ``fjson`` digest changed since the last update
+    are read.
+    """
+
+    signatures = load_json_signatures(signatures_fn)
+
+    digests = dict((json_fn, signatures[fjson][0])
+                   for fjson, json_fn in outputs if fjson in signatures)
+
+    return update_index(index_fn, digests, _read_indexed_document)
+
+def process_json_file(input_fn, output_fn, conf=None):
     if  os.path.isfile(input_fn) is False:
         return False
 
@@ -120,13 +282,13 @@ def process_json_file(input_fn, output_fn, regexes, conf=None):
 
     if 'body' in doc:
         text = doc['body'].encode('ascii', 'ignore')
-        text = munge_content(text, regexes)
+        text = strip_markup(text)
 
         doc['text'] = ' '.join(text.split('\n')).strip()
 
     if 'title' in doc:
         title = doc['title'].encode('ascii', 'ignore')
-        title = munge_content(title, regexes)
+        title = strip_markup(title)
 
         doc['title'] = title
 
@@ -16,10 +16,13 @@
 Post-processes Sphinx's latex output and generate PDFs from these ``tex`` files.
 """
 
+import hashlib
+import json
 import logging
 import os
 import re
 import subprocess
+import time
 
 logger = logging.getLogger('giza.content.post.latex')
 
@@ -27,16 +30,69 @@ from giza.content.helper import edition_check
 from giza.tools.command import command
 from giza.tools.serialization import ingest_yaml_list
 from giza.tools.strings import hyph_concat
-from giza.tools.transformation import process_page
-from giza.tools.files import (create_link, copy_if_needed,
+from giza.tools.transformation import process_pages
+from giza.tools.files import (create_link, copy_if_needed, atomic_write, hash_file,
                               decode_lines_from_file, encode_lines_to_file)
 
 #################### PDFs from Latex Produced by Sphinx  ####################
 
+# files that pdflatex reads back on the next pass. When a pass leaves them
+# unchanged, another pass would produce the same PDF.
+convergence_extensions = ('.aux', '.toc', '.ind', '.out')
+
+# files in the latex directory that a document may include.
+asset_extensions = ('.png', '.jpg', '.jpeg', '.gif', '.eps', '.pdf', '.sty',
+                    '.cls', '.fd', '.def', '.ist')
+
+max_pdflatex_passes = 5
+
+def _digest_files(fns):
+    return [ hash_file(fn) if os.path.isfile(fn) else None for fn in fns ]
+
+def get_render_digest(fn, path):
+    """
+    :returns: A digest of the ``tex`` file ``fn`` and the files in ``path``
+       that it may include. PDFs rendered from other ``tex`` files are not
+       assets.
+    """
+
+    h = hashlib.sha1()
+    h.update(hash_file(fn).encode('ascii'))
+
+    for asset in sorted(os.listdir(path)):
+        base, ext = os.path.splitext(asset)
+        if ext not in asset_extensions:
+            continue
+        elif ext == '.pdf' and os.path.isfile(os.path.join(path, base + '.tex')):
+            continue
+
+        h.update(asset.encode('utf-8'))
+        h.update(hash_file(os.path.join(path, asset)).encode('ascii'))
+
+    return h.hexdigest()
+
+def _load_render_state(fn):
+    if not os.path.isfile(fn):
+        return {}
+
+    with open(fn, 'r') as f:
+        try:
+            return json.load(f)
+        except ValueError:
+            return {}
+
 def _render_tex_into_pdf(fn, deployed_path, path, output_format="pdf"):
     """
     Runs ``pdflatex`` operations, can generate ``dvi`` and ``pdf``. Runs
-    pdflatex multiple times to correctly index and cross reference the PDF.
+    pdflatex until the files that it reads back on the next pass (i.e. the
+    ``.aux``, ``.toc`` and index files) stop changing, and runs ``makeindex``
+    whenever the index entries change.
+
+    Records the digest of the ``tex`` file and its assets, and the duration of
+    each pass, in ``<name>.render.json``. Skips rendering if neither the
+    ``tex`` file nor its assets changed since the last successful render.
+    Returns ``False``, without deploying the PDF or recording the render, if
+    the last pass failed or the passes did not converge.
     """
 
     if output_format == 'dvi':
@@ -48,31 +104,79 @@ def _render_tex_into_pdf(fn, deployed_path, path, output_format="pdf"):
         return
 
     base_fn = os.path.basename(fn)
-    cmds = [ pdflatex,
-             "makeindex -s {0}/python.ist {0}/{1}.idx ".format(path, base_fn[:-4]),
-             pdflatex,
-             pdflatex ]
+    base_path = os.path.join(path, os.path.splitext(base_fn)[0])
+    pdf_fn = os.path.splitext(fn)[0] + '.pdf'
 
-    if output_format == 'dvi':
-        cmds.append("cd {0}; dvipdf {1}.dvi".format(path, base_fn[:-4]))
+    state_fn = base_path + '.render.json'
+    digest = get_render_digest(fn, path)
 
-    for idx, cmd in enumerate(cmds):
-        r = command(command=cmd, ignore=True)
+    if (_load_render_state(state_fn).get('digest') == digest and
+            os.path.isfile(pdf_fn) and os.path.isfile(deployed_path)):
+        logger.info('pdf {0} is up to date, not rendering'.format(base_fn))
+        return
+
+    makeindex = "makeindex -s {0}/python.ist {1}.idx ".format(path, base_path)
+    convergence_fns = [ base_path + ext for ext in convergence_extensions ]
+
+    timings = []
+    index_digest = None
+    converged = False
+
+    for idx in range(max_pdflatex_passes):
+        before = _digest_files(convergence_fns)
+
+        start = time.time()
+        r = command(command=pdflatex, ignore=True)
+        timings.append(['pdflatex', time.time() - start])
+        passed = r.succeeded is True
 
-        if r.succeeded is True:
-            logger.info('pdf completed rendering stage {0} of {1} successfully ({2}).'.format(idx, len(cmds), base_fn))
+        if passed is True:
+            logger.info('pdf completed pdflatex pass {0} successfully ({1}).'.format(idx + 1, base_fn))
+        elif idx == 0:
+            logger.warning('pdf build encountered error early on {0}, continuing cautiously.'.format(base_fn))
         else:
-            if idx <= 1:
-                logger.warning('pdf build encountered error early on {0}, continuing cautiously.'.format(base_fn))
-                continue
-            else:
-                logger.error('pdf build encountered error running pdflatex, investigate on {0}. terminating'.format(base_fn))
-                logger.error(cmd)
-                return False
+            logger.error('pdf build encountered error running pdflatex, investigate on {0}. terminating'.format(base_fn))
+            logger.error(pdflatex)
+            return False
+
+        current_index = _digest_files([ base_path + '.idx' ])[0]
+        if current_index is not None and current_index != index_digest:
+            start = time.time()
+            r = command(command=makeindex, ignore=True)
+            timings.append(['makeindex', time.time() - start])
+            index_digest = current_index
+
+            if r.succeeded is not True:
+                logger.warning('makeindex encountered error on {0}, continuing cautiously.'.format(base_fn))
+
+        # the output of a failed pass is incomplete, even if it did not
+        # change the aux files.
+        if passed is True and _digest_files(convergence_fns) == before:
+            converged = True
+            break
+
+    if converged is False:
+        logger.error('pdf {0} did not converge after {1} pdflatex passes, not deploying it'.format(base_fn, max_pdflatex_passes))
+        return False
+
+    if output_format == 'dvi':
+        dvipdf = "cd {0}; dvipdf {1}.dvi".format(path, base_fn[:-4])
+
+        start = time.time()
+        r = command(command=dvipdf, ignore=True)
+        timings.append(['dvipdf', time.time() - start])
+
+        if r.succeeded is not True:
+            logger.error('pdf build encountered error running dvipdf, investigate on {0}. terminating'.format(base_fn))
+            logger.error(dvipdf)
+            return False
+
+    logger.info('rendered {0} in {1} pdflatex passes, {2:.2f} seconds'.format(base_fn, len([ t for t in timings if t[0] == 'pdflatex' ]), sum(t[1] for t in timings)))
 
-    pdf_fn = os.path.splitext(fn)[0] + '.pdf'
     copy_if_needed(pdf_fn, deployed_path, 'pdf')
 
+    atomic_write(state_fn, json.dumps({ 'digest': digest, 'timings': timings }))
+
 def pdf_tasks(sconf, conf, app):
     """Adds tasks to a BuildApp() to generate all PDFs."""
 
@@ -104,16 +208,16 @@ def pdf_tasks(sconf, conf, app):
 
     deploy_path = os.path.join(conf.paths.projectroot, conf.paths.public_site_output)
 
+    # (source, output, regex, builder) tuples of the tex files to process.
+    pages = []
+
     # special case operations on "offset pdfs", which use EPS images.
     if 'tags' in sconf and "offset" in sconf.tags:
         output_format = "dvi"
         sty_file = os.path.join(latex_dir, 'sphinx.sty')
-        process_page(fn=sty_file,
-                     output_fn=sty_file,
-                     regex=(re.compile(r'\\usepackage\[pdftex\]\{graphicx\}'), r'\usepackage{graphicx}'),
-                     app=process_app,
-                     builder='sphinx-latex',
-                     copy='ifNeeded')
+        pages.append((sty_file, sty_file,
+                      (re.compile(r'\\usepackage\[pdftex\]\{graphicx\}'), r'\usepackage{graphicx}'),
+                      'sphinx-latex'))
     else:
         output_format = "pdf"
 
@@ -134,8 +238,8 @@ def pdf_tasks(sconf, conf, app):
         i['link'] = os.path.join(deploy_path, link_name)
         i['path'] = latex_dir
 
-        # add the processing task
-        process_page(i['source'], i['processed'], tex_regexes, process_app, builder='tex-munge', copy='ifNeeded')
+        # add the file to the processing tasks
+        pages.append((i['source'], i['processed'], tex_regexes, 'tex-munge'))
 
         # add task for changing TEX to PDF.
         render_task = render_app.add('task')
@@ -151,3 +255,5 @@ def pdf_tasks(sconf, conf, app):
             link_task.target = i['link']
             link_task.job = create_link
             link_task.args = (deploy_fn, i['link'])
+
+    process_pages(pages, process_app, copy='ifNeeded')
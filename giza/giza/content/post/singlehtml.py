@@ -26,8 +26,15 @@ logger = logging.getLogger('giza.content.post.singlehtml')
 
 from giza.core.task import check_dependency
 from giza.tools.strings import hyph_concat
-from giza.tools.files import (expand_tree, copy_if_needed, decode_lines_from_file,
-                              encode_lines_to_file, FileNotFoundError, safe_create_directory)
+from giza.tools.files import (expand_tree, copy_if_needed, FileNotFoundError,
+                              safe_create_directory)
+from giza.tools.transformation import munge_page, Transformation
+
+single_html_transformation = Transformation([
+    (re.compile('href="contents.html'), 'href="index.html'),
+    (re.compile('name="robots" content="index"'), 'name="robots" content="noindex"'),
+    (re.compile('href="genindex.html'), 'href="../genindex/')
+])
 
 def get_single_html_dir(conf):
     return os.path.join(conf.paths.projectroot, conf.paths.public_site_output, 'single')
@@ -38,22 +45,11 @@ def manual_single_html(input_file, output_file):
         logging.info('singlehtml not changed, not reprocessing.')
         return False
     else:
-        text_lines = decode_lines_from_file(input_file)
-
-        regexes = [
-            (re.compile('href="contents.html'), 'href="index.html'),
-            (re.compile('name="robots" content="index"'), 'name="robots" content="noindex"'),
-            (re.compile('href="genindex.html'), 'href="../genindex/')
-        ]
-
-        for regex, subst in regexes:
-            text_lines = [ regex.sub(subst, text) for text in text_lines ]
-
-        encode_lines_to_file(output_file, text_lines)
+        munge_page(fn=input_file, regex=single_html_transformation,
+                   out_fn=output_file, tag='singlehtml')
 
         logging.info('processed singlehtml file.')
 
-# TODO: convert this to use common infrastructure in giza.tools.transformations.
 def finalize_single_html_tasks(builder, conf, app):
     single_html_dir = get_single_html_dir(conf)
 
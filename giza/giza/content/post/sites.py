@@ -12,17 +12,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import fnmatch
 import logging
 import os.path
 import re
-import sys
+
+try:
+    from urllib.parse import quote
+except ImportError:
+    from urllib import quote
+
+from xml.etree import ElementTree
 
 logger = logging.getLogger('giza.content.post.sites')
 
 from giza.core.task import check_dependency
-from giza.tools.command import command
+from giza.tools.publish import load_manifest, publish_tree
+from giza.tools.sitemap import write_sitemaps
 from giza.tools.serialization import ingest_yaml_list, ingest_yaml_doc
-from giza.tools.transformation import munge_page
+from giza.tools.transformation import munge_pages, Transformation
 from giza.tools.files import (expand_tree, create_link, copy_if_needed,
                               decode_lines_from_file, encode_lines_to_file,
                               safe_create_directory)
@@ -53,19 +61,58 @@ def error_pages(sconf, conf):
     if 'errors' not in conf.system.files.data:
         return None
     else:
-        sub = (re.compile(r'\.\./\.\./'), conf.project.url + r'/' + conf.project.tag + r'/')
+        sub = Transformation((re.compile(r'\.\./\.\./'), conf.project.url + r'/' + conf.project.tag + r'/'))
 
-        for idx, error in enumerate(conf.system.files.data.errors):
+        pages = []
+        for error in conf.system.files.data.errors:
             page = os.path.join(conf.paths.projectroot,
                                 conf.paths.branch_output, builder,
                                 'meta', error, 'index.html')
-            munge_page(fn=page, regex=sub, tag='error-pages')
+            pages.append((page, page, sub, 'error-pages'))
+
+        munge_pages(pages)
+
+        logger.info('error-pages: rendered {0} error pages'.format(len(pages)))
+
+def get_publish_name(conf):
+    """
+    :returns: A name for the public tree of the current language and edition
+       (i.e. ``public-es-master`` for ``build/public-es/master``), so that each
+       public tree has its own snapshots and manifest.
+    """
+
+    public = os.path.relpath(os.path.join(conf.paths.projectroot, conf.paths.public_site_output),
+                             os.path.join(conf.paths.projectroot, conf.paths.output))
 
-        logger.info('error-pages: rendered {0} error pages'.format(idx))
+    return '-'.join(public.split(os.path.sep))
+
+def get_publish_snapshots_dir(conf):
+    return os.path.join(conf.paths.projectroot, conf.paths.branch_output,
+                        get_publish_name(conf) + '-snapshots')
+
+def get_publish_manifest_file(conf):
+    return os.path.join(conf.paths.projectroot, conf.paths.branch_output,
+                        get_publish_name(conf) + '-manifest.json')
 
 def finalize_dirhtml_build(sconf, conf):
     builder = sconf.builder
 
+    if 'excluded_files' in sconf:
+        excluded = sconf.excluded_files
+    else:
+        excluded = None
+
+    dest = os.path.join(conf.paths.projectroot, conf.paths.public_site_output)
+    copied = publish_tree(source=sconf.fq_build_output,
+                          public=dest,
+                          snapshots=get_publish_snapshots_dir(conf),
+                          manifest_fn=get_publish_manifest_file(conf),
+                          excluded=excluded,
+                          pool_size=conf.runstate.pool_size)
+
+    logger.info('"{0}" published build from {1} to {2}, copying {3} changed files'.format(sconf.name, sconf.fq_build_output, dest, copied))
+
+    # the search page goes into the new snapshot.
     single_html_dir = get_single_html_dir(conf)
     search_page = os.path.join(conf.paths.branch_output, builder, 'index.html')
 
@@ -73,55 +120,142 @@ def finalize_dirhtml_build(sconf, conf):
         copy_if_needed(source_file=search_page,
                        target_file=os.path.join(single_html_dir, 'search.html'))
 
-    dest = os.path.join(conf.paths.projectroot, conf.paths.public_site_output)
-    m_cmd = command('rsync -a {source}/ {destination}'.format(source=sconf.fq_build_output,
-                                                              destination=dest))
+    if conf.git.branches.current in conf.git.branches.published:
+        sitemap(config_path=None, conf=conf)
 
-    logger.info('"{0}" migrated build from {1} to {2}, with result {3}'.format(sconf.name, sconf.fq_build_output, dest, m_cmd.return_code))
+def get_sitemap_config(config_path, conf):
+    """
+    Reads the ``conf-sitemap.xml`` file of projects that used ``sitemap_gen``.
 
-    if 'excluded_files' in sconf:
-        fns = [ os.path.join(conf.paths.projectroot,
-                      conf.paths.public_site_output,
-                      fn)
-                for fn in sconf['dirhtml']['excluded_files'] ]
+    :returns: A tuple of the base URL and a list of ``(action, match)``
+       filters, where ``action`` is ``pass`` or ``drop`` and ``match`` returns
+       ``True`` for the URLs that the filter applies to.
+    """
 
-        cleaner(fns)
-        logging.info('removed excluded files from dirhtml output directory')
+    if config_path is None:
+        config_path = os.path.join(conf.paths.projectroot, 'conf-sitemap.xml')
 
-    if conf.git.branches.current in conf.git.branches.published:
-        sitemap_exists = sitemap(config_path=None, conf=conf)
+    base_url = None
+    filters = []
 
-        legacy_sitemap_fn = os.path.join(conf.paths.projectroot,
-                                         conf.paths.branch_output,
-                                         'sitemap.xml.gz')
+    if os.path.isfile(config_path):
+        try:
+            root = ElementTree.parse(config_path).getroot()
+        except ElementTree.ParseError as e:
+            logger.error('sitemap: cannot read {0}: {1}'.format(config_path, e))
+            root = None
 
-        if os.path.exists(legacy_sitemap_fn) and sitemap_exists is True:
-            copy_if_needed(source_file=legacy_sitemap_fn,
-                           target_file=os.path.join(conf.paths.projectroot,
-                                                    conf.paths.public_site_output,
-                                                    'sitemap.xml.gz'))
+        if root is not None:
+            base_url = root.get('base_url')
 
+            if root.get('store_into') is not None:
+                logger.info('sitemap: ignoring store_into in {0}, writing sitemaps to the public tree'.format(config_path))
 
-def sitemap(config_path, conf):
-    paths = conf.paths
+            for element in root.iter('filter'):
+                f = get_sitemap_filter(element)
+                if f is None:
+                    logger.error('sitemap: ignoring invalid filter in {0}: {1}'.format(config_path, element.attrib))
+                else:
+                    filters.append(f)
 
-    sys.path.append(os.path.join(paths.projectroot, paths.buildsystem, 'bin'))
-    import sitemap_gen
+    if base_url is None:
+        base_url = '/'.join(p for p in (conf.project.url, conf.project.tag) if p)
 
-    if config_path is None:
-        config_path = os.path.join(paths.projectroot, 'conf-sitemap.xml')
+    return base_url.rstrip('/') + '/', filters
 
-    if not os.path.exists(config_path):
-        logger.error('sitemap: configuration file {0} does not exist. Returning early'.format(config_path))
-        return False
+def get_sitemap_filter(element):
+    # filters have the same meaning as in sitemap_gen: the type is
+    # ``wildcard`` (the default) or ``regexp``, and the action is ``drop``
+    # (the default) or ``pass``.
+    pattern = element.get('pattern')
+    kind = element.get('type', 'wildcard').lower()
+    action = element.get('action', 'drop').lower()
 
-    sitemap = sitemap_gen.CreateSitemapFromFile(configpath=config_path,
-                                                suppress_notify=True)
-    if sitemap is None:
-        logger.error('sitemap: failed to generate the sitemap due to encountered errors.')
+    if not pattern or action not in ('pass', 'drop'):
+        return None
+    elif kind == 'wildcard':
+        return action, lambda url: fnmatch.fnmatchcase(url, pattern)
+    elif kind == 'regexp':
+        try:
+            regexp = re.compile(pattern)
+        except re.error:
+            return None
+
+        return action, lambda url: regexp.search(url) is not None
+    else:
+        return None
+
+def filter_sitemap_urls(urls, filters):
+    """
+    :returns: The URLs in ``urls`` that the first matching filter in
+       ``filters`` does not drop.
+    """
+
+    kept = []
+    for url in urls:
+        for action, match in filters:
+            if match(url):
+                if action == 'pass':
+                    kept.append(url)
+                break
+        else:
+            kept.append(url)
+
+    return kept
+
+def get_sitemap_urls(base_url, files, excluded=None):
+    """
+    :param list files: Paths of published ``dirhtml`` files.
+
+    :param list excluded: Optional. Directories whose pages are not listed.
+
+    :returns: The URLs of the pages, one for each ``index.html`` file outside
+       of directories that begin with ``_`` or ``.``.
+    """
+
+    if excluded is None:
+        excluded = []
+
+    urls = []
+    for fn in files:
+        parts = fn.split(os.path.sep)
+
+        if parts[-1] != 'index.html' or any(p.startswith(('_', '.')) for p in parts[:-1]):
+            continue
+
+        path = '/'.join(parts[:-1])
+        if path in excluded:
+            continue
+
+        if path == '':
+            urls.append(base_url)
+        else:
+            urls.append(base_url + quote(path.encode('utf-8')) + '/')
+
+    return urls
+
+def sitemap(config_path, conf):
+    """
+    Writes ``sitemap.xml.gz``, and its parts for large sites, to the public
+    tree, using the list of pages in the publish manifest of the ``dirhtml``
+    build, and the base URL and filters of ``conf-sitemap.xml``, if it exists.
+    """
+
+    files = load_manifest(get_publish_manifest_file(conf))
+    if len(files) == 0:
+        logger.error('sitemap: no published dirhtml pages. Returning early')
         return False
 
-    sitemap.Generate()
+    if 'errors' in conf.system.files.data:
+        excluded = [ '/'.join(['meta', error]) for error in conf.system.files.data.errors ]
+    else:
+        excluded = None
+
+    base_url, filters = get_sitemap_config(config_path, conf)
+    urls = filter_sitemap_urls(get_sitemap_urls(base_url, files, excluded), filters)
+
+    write_sitemaps(path=os.path.join(conf.paths.projectroot, conf.paths.public_site_output),
+                   base_url=base_url,
+                   urls=urls)
 
-    logger.error('sitemap: generated sitemap according to the config file {0}'.format(config_path))
     return True
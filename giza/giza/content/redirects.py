@@ -25,6 +25,7 @@ import logging
 logger = logging.getLogger('giza.content.post.redirects')
 
 from giza.tools.serialization import ingest_yaml_list
+from giza.tools.files import write_if_changed
 
 def make_redirect(conf):
     o = [ ]
@@ -51,14 +52,11 @@ def make_redirect(conf):
     return o
 
 def write_redirects(fn, conf):
-    if not os.path.exists(os.path.dirname(fn)):
-        os.makedirs(os.path.dirname(fn))
+    result = write_if_changed(fn, ''.join(make_redirect(conf)) + '\n')
+    if result.changed is True:
+        logger.info('wrote redirects to: ' + fn)
 
-    with open(fn, 'w') as f:
-        f.writelines(make_redirect(conf))
-        f.write('\n')
-
-    logger.info('wrote redirects to: ' + fn)
+    return result
 
 def redirect_tasks(conf, app):
     if 'htaccess' in conf.system.files.data:
@@ -17,7 +17,7 @@ import logging
 
 logger = logging.getLogger('giza.content.release.tasks')
 
-from giza.tools.files import expand_tree, verbose_remove, safe_create_directory
+from giza.tools.files import expand_tree, verbose_remove, safe_create_directory, write_if_changed
 from giza.content.release.inheritance import ReleaseDataCache
 from giza.content.release.views import render_releases
 from giza.config.content import new_content_type
@@ -28,8 +28,11 @@ def register_releases(conf):
 
 def write_release_file(release, fn, conf):
     content = render_releases(release, conf)
-    content.write(fn)
-    logger.info('wrote release content: ' + fn)
+    result = write_if_changed(fn, content.data)
+    if result.changed is True:
+        logger.info('wrote release content: ' + fn)
+
+    return result
 
 def release_tasks(conf):
     release_sources = conf.system.content.releases.sources
@@ -27,8 +27,19 @@ make it possible to:
 - have different versions of the source tree for different editions of the
   content (i.e. by redacting files or modifying the source,)
 
-At the center of this operation is an ``rsync`` operation that uses check-summing
-rather than timestampping to compare source and destination files.
+At the center of this operation is :func:`giza.tools.transfer.transfer_tree()`,
+which compares source and destination files by content rather than timestamp,
+but only reads files whose stat information changed since the last
+transfer. Set ``source_transfer`` in the ``system`` configuration to ``copy``,
+``reflink`` (the default), ``hardlink``, or ``rsync`` to use the original
+``rsync --checksum`` operation. Files from ``source/`` are never hard-linked:
+``hardlink`` uses reflinks for them, and only applies to trees made from the
+shared source.
+
+When ``shared_source`` is set in the ``system`` configuration, giza prepares
+one copy of the source in ``build/<branch>/shared-source`` and every
+edition's ``build/<branch>/source-<edition>`` directory is made of hard links
+to it, except for redacted files and generated content.
 """
 
 import os.path
@@ -39,13 +50,25 @@ logger = logging.getLogger('giza.content.source')
 
 from giza.content.primer import primer_migration_tasks
 from giza.content.assets import assets_tasks
-from giza.content.dependencies import dump_file_hashes
 from giza.tools.command import command
 from giza.tools.files import InvalidFile, safe_create_directory
 from giza.tools.strings import hyph_concat
+from giza.tools.transfer import transfer_tree
 
 ##### Transfer Source Files
 
+def get_transfer_source(conf):
+    """
+    :returns: The directory that :func:`~giza.content.source.transfer_source()`
+       copies into ``build/<branch>/source``: either ``source/`` or, when
+       ``shared_source`` is set, the shared tree for all editions.
+    """
+
+    if conf.system.shared_source is True and conf.system.source_transfer != 'rsync':
+        return os.path.join(conf.paths.projectroot, conf.paths.branch_shared_source)
+    else:
+        return os.path.join(conf.paths.projectroot, conf.paths.source)
+
 def transfer_source(conf, sconf):
     target = os.path.join(conf.paths.projectroot, conf.paths.branch_source)
 
@@ -78,16 +101,55 @@ def transfer_source(conf, sconf):
     prefix_len = len(os.path.join(conf.paths.projectroot, conf.paths.branch_source)) + 1
     exclusions.extend([ o for o in conf.system.content.output_directories(prefix_len) ])
 
-    # we don't want rsync to delete directories that hold generated content in
-    # the target so we can have more incremental builds.
-    exclusions = "--exclude=" + ' --exclude='.join(exclusions)
+    # we don't want to delete directories that hold generated content in the
+    # target so we can have more incremental builds.
+    if conf.system.source_transfer == 'rsync':
+        exclusions = "--exclude=" + ' --exclude='.join(exclusions)
+
+        cmd = 'rsync --checksum --recursive {2} --delete {0}/ {1}'.format(source_dir, target, exclusions)
+        command(cmd)
 
-    cmd = 'rsync --checksum --recursive {2} --delete {0}/ {1}'.format(source_dir, target, exclusions)
-    command(cmd)
+        # remove files from the source tree specified in the sphinx config for
+        # this build.
+        source_exclusion(conf, sconf)
+    else:
+        link = conf.system.source_transfer
+
+        if link == 'hardlink':
+            # hard links into the author's tree would let build steps that
+            # modify the source, or update its mtimes, change their files:
+            # only trees that giza owns are linked.
+            link = 'reflink'
+
+        if conf.system.shared_source is True:
+            # prepare one copy of the source for all editions. After the
+            # first edition, this only compares stat information. Each
+            # edition's tree is a farm of hard links to the shared tree
+            # without the redacted files.
+            shared_dir = get_transfer_source(conf)
+            result = transfer_tree(source_dir, shared_dir,
+                                   exclusions=exclusions,
+                                   manifest=shared_dir + '.json',
+                                   link=link,
+                                   pool_size=conf.runstate.pool_size)
+
+            logger.info('copied {0} and deleted {1} files in the shared source tree {2}'.format(result.copied, result.deleted, shared_dir))
+
+            source_dir = shared_dir
+            link = 'hardlink'
+
+        # redacted files are never copied, and are removed from the target
+        # if they exist.
+        result = transfer_tree(source_dir, target,
+                               exclusions=exclusions,
+                               redactions=sconf.excluded,
+                               manifest=conf.system.source_manifest,
+                               link=link,
+                               pool_size=conf.runstate.pool_size)
+
+        logger.info('copied {0}, deleted {1} and kept {2} unchanged files in {3}'.format(result.copied, result.deleted,
+                                                                                         result.unchanged, target))
 
-    # remove files from the source tree specified in the sphinx config for this
-    # build.
-    source_exclusion(conf, sconf)
     os.utime(target, None)
 
     logger.info('prepared and migrated source for sphinx build in {0}'.format(target))
@@ -31,18 +31,21 @@ by giza, into a ``sphinx-build`` invocation. See
 """
 
 import collections
+import json
 import logging
 import os.path
 import pkg_resources
 import re
 import sys
+import time
 
 logger = logging.getLogger('giza.content.sphinx')
 
 from giza.core.app import BuildApp
-from giza.tools.command import command
+from giza.tools.command import command, stream_command
 from giza.tools.files import safe_create_directory
 from giza.tools.timing import Timer
+from giza.sphinxext import changed_documents_variable, phase_timings_variable
 from giza.config.helper import get_config_paths
 from giza.content.links import create_manual_symlink, get_public_links
 from giza.content.post.json_output import json_output_tasks
@@ -60,7 +63,20 @@ from giza.content.post.sites import (finalize_epub_build,
 def is_parallel_sphinx(version):
     return version >= '1.2'
 
-def get_tags(target, sconf):
+def get_timing_key(sconf):
+    """
+    :returns: The name of a builder, edition and language combination in the
+       record of build durations (see :mod:`giza.content.sphinx_planner`).
+    """
+
+    parts = [ sconf.builder ]
+    for field in ('edition', 'language'):
+        if field in sconf and getattr(sconf, field) is not None:
+            parts.append(getattr(sconf, field))
+
+    return '-'.join(parts)
+
+def get_tag_set(target, sconf):
     if 'tags' in sconf:
         ret = set(sconf.tags)
     else:
@@ -77,11 +93,47 @@ def get_tags(target, sconf):
     if 'edition' in sconf:
         ret.add(sconf.edition)
 
+    return set(i for i in ret if i is not None)
+
+def get_tags(target, sconf):
     return ' '.join([' '.join(['-t', i ])
-                     for i in ret
-                     if i is not None])
+                     for i in get_tag_set(target, sconf)])
+
+def get_parallel_jobs(conf):
+    """
+    :returns: The number of parallel processes for each Sphinx build, or
+       ``None`` to run Sphinx serially.
+    """
+
+    if not is_parallel_sphinx(pkg_resources.get_distribution("sphinx").version):
+        return None
+
+    if 'serial_sphinx' in conf.runstate:
+        logger.info('running with serial sphinx processes')
+        if conf.runstate.serial_sphinx == "publish":
+            if ((len(conf.runstate.builder) >= 1 or 'publish' in conf.runstate.builder) or
+                len(conf.runstate.languages_to_build) >= 1 or
+                len(conf.runstate.editions_to_build) >= 1):
+                return None
+            else:
+                return conf.runstate.pool_size
+        elif conf.runstate.serial_sphinx is False:
+            logger.info('running with parallelized sphinx processes')
+            return conf.runstate.pool_size
+        elif (isinstance(conf.runstate.serial_sphinx, (int, long, float)) and
+              conf.runstate.serial_sphinx > 1):
+            logger.info('running with parallelized sphinx processes')
+            return conf.runstate.serial_sphinx
+        else:
+            return None
+    elif len(conf.runstate.builder) >= conf.runstate.pool_size:
+        logger.info('running with serail sphinx processes')
+        return None
+    else:
+        logger.info('running with parallelized sphinx processes')
+        return conf.runstate.pool_size
 
-def get_sphinx_args(sconf, conf):
+def get_sphinx_args(sconf, conf, jobs=None):
     o = []
 
     o.append(get_tags(sconf.builder, sconf))
@@ -89,31 +141,11 @@ def get_sphinx_args(sconf, conf):
 
     o.append('-b {0}'.format(sconf.builder))
 
-    if is_parallel_sphinx(pkg_resources.get_distribution("sphinx").version):
-        if 'serial_sphinx' in conf.runstate:
-            logger.info('running with serial sphinx processes')
-            if conf.runstate.serial_sphinx == "publish":
-                if ((len(conf.runstate.builder) >= 1 or 'publish' in conf.runstate.builder) or
-                    len(conf.runstate.languages_to_build) >= 1 or
-                    len(conf.runstate.editions_to_build) >= 1):
-                    pass
-                else:
-                    o.append(' '.join( [ '-j', str(conf.runstate.pool_size) ]))
-            elif conf.runstate.serial_sphinx is False:
-                logger.info('running with parallelized sphinx processes')
-                o.append(' '.join( [ '-j', str(conf.runstate.pool_size) ]))
-            elif (isinstance(conf.runstate.serial_sphinx, (int, long, float)) and
-                  conf.runstate.serial_sphinx > 1):
-                logger.info('running with parallelized sphinx processes')
-                o.append(' '.join(['-j', str(conf.runstate.serial_sphinx)]))
-            else:
-                pass
-        elif len(conf.runstate.builder) >= conf.runstate.pool_size:
-            logger.info('running with serail sphinx processes')
-            pass
-        else:
-            logger.info('running with parallelized sphinx processes')
-            o.append(' '.join( [ '-j', str(conf.runstate.pool_size) ]))
+    if jobs is None:
+        jobs = get_parallel_jobs(conf)
+
+    if jobs is not None and jobs > 1:
+        o.append(' '.join( [ '-j', str(jobs) ]))
 
     o.append(' '.join( [ '-c', conf.paths.projectroot ] ))
 
@@ -124,47 +156,124 @@ def get_sphinx_args(sconf, conf):
 
 #################### Output Management ####################
 
-def output_sphinx_stream(out, conf):
-    out = [ o for o in out.split('\n') if o != '' ]
+# messages that giza never prints.
+ignored_messages = re.compile('|'.join([
+    r'^WARNING: unknown mimetype',
+    r'^WARNING: search index',
+    r'source/reference/sharding-commands\.txt$',
+    r'Duplicate ID: "cmdoption-h"\.$',
+    r'should look like "opt", "-opt args", "--opt args" or "/opt args" or "\+opt args"$',
+    r'should look like "-opt args", "--opt args" or "/opt args" or "\+opt args"$',
+    r'should look like "opt", "-opt args", "--opt args" or "/opt args"$',
+    r'nonlocal image URI found',
+]))
+
+duplicate_object_regex = re.compile(r'(.*):[0-9]+: WARNING: duplicate object description of ".*", other instance in (.*)')
+
+# messages that giza prints as soon as they appear.
+urgent_messages = re.compile(r'ERROR|SEVERE|Exception occurred|Traceback')
+
+class SphinxOutputFilter(object):
+    """
+    Filters, normalizes and de-duplicates Sphinx output one line at a time, so
+    that processing the output of a build uses memory in proportion to the
+    number of distinct messages rather than the number of lines. Can serve as
+    the ``warning`` stream of an in-process Sphinx application.
+
+    :param bool live: If ``True``, prints errors as soon as they appear, and
+       excludes them from :attr:`~giza.content.sphinx.SphinxOutputFilter.lines`.
+    """
+
+    def __init__(self, conf, live=False):
+        self.conf = conf
+        self.live = live
+        self.full_path = os.path.join(conf.paths.projectroot, conf.paths.branch_output)
+        self.count = 0
+        self.lines = []
+        self._seen = set()
+        self._pending = None
+        self._partial = ''
+
+    def write(self, data):
+        data = self._partial + data
+        lines = data.split('\n')
+        self._partial = lines.pop()
+
+        for line in lines:
+            self.add(line)
+
+    def flush(self):
+        pass
+
+    def add(self, l):
+        l = l.rstrip('\r\n')
+        if l == '':
+            return
+
+        self.count += 1
 
-    full_path = os.path.join(conf.paths.projectroot, conf.paths.branch_output)
-
-    regx = re.compile(r'(.*):[0-9]+: WARNING: duplicate object description of ".*", other instance in (.*)')
-
-    printable = []
-    for idx, l in enumerate(out):
         if is_msg_worthy(l) is False:
-            printable.append(None)
-            continue
+            return
 
-        f1 = regx.match(l)
-        if f1 is not None:
-            g = f1.groups()
+        m = duplicate_object_regex.match(l)
+        if m is not None:
+            g = m.groups()
 
             if g[1].endswith(g[0]):
-                printable.append(None)
-                continue
+                return
 
-        l = path_normalization(l, full_path, conf)
+        l = path_normalization(l, self.full_path, self.conf)
 
         if l.startswith('InputError: [Errno 2] No such file or directory'):
             try:
-                l = path_normalization(l.split(' ')[-1].strip()[1:-2], full_path, conf)
-                printable[idx-1] += ' ' + l
-                l = None
+                l = path_normalization(l.split(' ')[-1].strip()[1:-2], self.full_path, self.conf)
             except IndexError:
                 logger.error("error processing log: {0}".format(l))
-                continue
+                return
+
+            if self._pending is not None:
+                self._pending += ' ' + l
+            return
         elif l.startswith('source/includes/generated/overview.rst'):
-            continue
+            return
         elif l.startswith('source/meta/includes.txt'):
-            continue
+            return
+
+        self._emit()
+        self._pending = l
 
-        printable.append(l)
+    def _emit(self):
+        l = self._pending
+        self._pending = None
+
+        if l is None or l in self._seen:
+            return
+
+        self._seen.add(l)
+
+        if self.live is True and urgent_messages.search(l) is not None:
+            print(l)
+        else:
+            self.lines.append(l)
 
-    printable = stable_deduplicate(printable)
+    def close(self):
+        if self._partial != '':
+            self.add(self._partial)
+            self._partial = ''
 
-    logger.info('sphinx builder has {0} lines of output, processed from {1}'.format(len(printable), len(out)))
+        self._emit()
+
+        return self.lines
+
+def output_sphinx_stream(out, conf):
+    f = SphinxOutputFilter(conf)
+
+    for l in out.split('\n'):
+        f.add(l)
+
+    printable = f.close()
+
+    logger.info('sphinx builder has {0} lines of output, processed from {1}'.format(len(printable), f.count))
     print_build_messages(printable)
 
 def stable_deduplicate(lines):
@@ -200,33 +309,14 @@ def path_normalization(l, full_path, conf):
     return l
 
 def is_msg_worthy(l):
-    if l.startswith('WARNING: unknown mimetype'):
-        return False
-    elif len(l) == 0:
-        return False
-    elif l.startswith('WARNING: search index'):
-        return False
-    elif l.endswith('source/reference/sharding-commands.txt'):
-        return False
-    elif l.endswith('Duplicate ID: "cmdoption-h".'):
-        return False
-    elif l.endswith('should look like "opt", "-opt args", "--opt args" or "/opt args" or "+opt args"'):
-        return False
-    elif l.endswith('should look like "-opt args", "--opt args" or "/opt args" or "+opt args"'):
-        return False
-    elif l.endswith('should look like "opt", "-opt args", "--opt args" or "/opt args"'):
-        return False
-    elif 'nonlocal image URI found' in l:
-        return False
-    else:
-        return True
+    return len(l) > 0 and ignored_messages.search(l) is None
 
 def printer(string):
     logger.info(string)
 
 #################### Builder Operation ####################
 
-def run_sphinx(builder, sconf, conf):
+def prepare_sphinx_output(builder, sconf, conf):
     if safe_create_directory(sconf.fq_build_output):
         logger.info('created directory "{1}" for sphinx builder {0}'.format(builder, sconf.fq_build_output))
 
@@ -234,42 +324,94 @@ def run_sphinx(builder, sconf, conf):
         command('sphinx-intl build --language=' + sconf.language)
         logger.info('compiled all PO files for translated build.')
 
+def run_sphinx_finalizers(builder, sconf, conf, return_code):
+    if True: # return_code == 0:
+        logger.info('successfully completed {0} sphinx build ({1})'.format(builder, return_code))
+
+        finalizer_app = BuildApp(conf)
+        finalizer_app.pool = "thread"
+        finalizer_app.root_app = False
+        finalize_sphinx_build(sconf, conf, finalizer_app)
+
+        with Timer("finalize sphinx {0} build".format(builder)):
+            finalizer_app.run()
+    else:
+        logger.warning('the sphinx build {0} was not successful. not running finalize operation'.format(builder))
+
+def read_phase_timings(fn):
+    """
+    :returns: The read and write durations that :mod:`giza.sphinxext` wrote to
+       ``fn``, or an empty mapping. Removes ``fn``.
+    """
+
+    if not os.path.isfile(fn):
+        return {}
+
+    try:
+        with open(fn, 'r') as f:
+            return json.load(f)
+    except ValueError:
+        return {}
+    finally:
+        os.remove(fn)
+
+def run_sphinx(builder, sconf, conf, jobs=None):
+    """
+    :param int jobs: The number of parallel processes for ``sphinx-build``. By
+       default, uses :func:`~giza.content.sphinx.get_parallel_jobs()`.
+
+    :returns: A tuple of the return code, the filtered output, and a mapping
+       of timing keys to durations (see :mod:`giza.content.sphinx_planner`).
+    """
+
+    prepare_sphinx_output(builder, sconf, conf)
+
     logger.info('starting sphinx build {0}'.format(builder))
 
     cmd = 'sphinx-build {0} -d {1}/doctrees-{2} {3} {4}' # per-builder-doctree
 
-    sphinx_cmd = cmd.format(get_sphinx_args(sconf, conf),
+    sphinx_cmd = cmd.format(get_sphinx_args(sconf, conf, jobs),
                             os.path.join(conf.paths.projectroot, conf.paths.branch_output),
                             sconf.build_output,
                             os.path.join(conf.paths.projectroot, conf.paths.branch_source),
                             sconf.fq_build_output)
 
+    if conf.system.targeted_rebuilds is True:
+        sphinx_cmd = '{0}={1} {2}'.format(changed_documents_variable,
+                                          conf.system.changed_documents,
+                                          sphinx_cmd)
+
+    timing_key = get_timing_key(sconf)
+    timings_fn = os.path.join(conf.paths.projectroot, conf.paths.branch_output,
+                              'sphinx-phases-' + timing_key + '.json')
+    sphinx_cmd = '{0}={1} {2}'.format(phase_timings_variable, timings_fn, sphinx_cmd)
+
+    # errors appear as soon as sphinx reports them; other messages are
+    # de-duplicated and printed after all builds complete.
+    output = SphinxOutputFilter(conf, live=True)
+
     logger.debug(sphinx_cmd)
+    start = time.time()
     with Timer("running sphinx build for: {0}, {1}, {2}".format(builder, sconf.language, sconf.edition)):
-        out = command(sphinx_cmd, capture=True, ignore=True)
+        out = stream_command(sphinx_cmd, output.add, ignore=True)
+
+    phases = read_phase_timings(timings_fn)
+    phases['total'] = time.time() - start
 
     logger.info('completed sphinx build {0}'.format(builder))
 
-    if True: # out.return_code == 0:
-        logger.info('successfully completed {0} sphinx build ({1})'.format(builder, out.return_code))
+    run_sphinx_finalizers(builder, sconf, conf, out.return_code)
 
-        finalizer_app = BuildApp(conf)
-        finalizer_app.pool = "thread"
-        finalizer_app.root_app = False
-        finalize_sphinx_build(sconf, conf, finalizer_app)
-
-        with Timer("finalize sphinx {0} build".format(builder)):
-            finalizer_app.run()
+    if out.return_code == 0:
+        timings = { timing_key: phases }
     else:
-        logger.warning('the sphinx build {0} was not successful. not running finalize operation'.format(builder))
-
-    output = '\n'.join([out.err, out.out])
+        timings = {}
 
-    return out.return_code, output
+    return out.return_code, '\n'.join(output.close()), timings
 
 #################### Application Logic ####################
 
-def sphinx_tasks(sconf, conf, app):
+def sphinx_tasks(sconf, conf, app, jobs=None):
     deps = [None] # always force builds until depchecking is fixed
     deps.extend(get_config_paths('sphinx_local', conf))
     deps.append(os.path.join(conf.paths.projectroot, conf.paths.source))
@@ -278,7 +420,7 @@ def sphinx_tasks(sconf, conf, app):
     task = app.add('task')
     task.job = run_sphinx
     task.conf = conf
-    task.args = [sconf.builder, sconf, conf]
+    task.args = [sconf.builder, sconf, conf, jobs]
     task.target = os.path.join(conf.paths.projectroot, conf.paths.branch_output, sconf.builder)
     task.dependency = deps
     task.description = 'building {0} with sphinx'.format(sconf.builder)
@@ -0,0 +1,208 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Runs Sphinx in-process, and shares one environment between all builders that
+use the same source tree. When ``sphinx_engine`` in the ``system``
+configuration is ``inprocess``, :func:`~giza.content.sphinx_engine.sphinx_group_tasks()`
+replaces the ``sphinx-build`` task for each builder with one task for each
+group of builders. The first builder in a group reads and parses the source;
+the other builders reuse the environment and doctrees and only write their
+output.
+
+Builders share a group when they build the same source directory and have the
+same ``website`` or ``print`` tag, since ``conf.py`` sees the tags of the
+first builder. ``only`` directives are evaluated when writing, with the tags
+of each builder. The ``gettext`` builder uses a different versioning method
+for the environment, and always runs by itself.
+
+Sphinx and docutils keep global state, so when the worker pool is a thread
+pool (i.e. ``giza watch``), the groups run one at a time.
+"""
+
+from __future__ import absolute_import
+
+import collections
+import logging
+import os.path
+import time
+
+from sphinx.application import Sphinx
+from sphinx.util.tags import Tags
+
+logger = logging.getLogger('giza.content.sphinx_engine')
+
+from giza.content.sphinx import (get_tag_set, get_timing_key, get_parallel_jobs,
+                                 prepare_sphinx_output, run_sphinx_finalizers,
+                                 read_phase_timings, SphinxOutputFilter)
+from giza.sphinxext import changed_documents_config, phase_timings_config
+from giza.tools.timing import Timer
+
+unshared_builders = ('gettext',)
+
+def get_group_key(sconf, conf):
+    """
+    :returns: A string that is the same for all builders that can share a
+       Sphinx environment. Also used to name the doctree directory.
+    """
+
+    name = os.path.basename(conf.paths.branch_source)
+
+    if sconf.builder in unshared_builders:
+        name = '-'.join([name, sconf.builder])
+    elif 'website' in get_tag_set(sconf.builder, sconf):
+        name = '-'.join([name, 'website'])
+    else:
+        name = '-'.join([name, 'print'])
+
+    if 'language' in sconf and sconf.language is not None:
+        name = '-'.join([name, sconf.language])
+
+    return name
+
+def group_builds(builds):
+    """
+    :param list builds: A list of ``(sconf, conf)`` tuples.
+
+    :returns: An ordered mapping of group keys to lists of ``(sconf, conf)``
+       tuples.
+    """
+
+    groups = collections.OrderedDict()
+
+    for sconf, conf in builds:
+        groups.setdefault(get_group_key(sconf, conf), []).append((sconf, conf))
+
+    return groups
+
+def _create_app(key, sconf, conf, warning, jobs):
+    if 'language' in sconf and sconf.language is not None:
+        overrides = { 'language': sconf.language }
+    else:
+        overrides = {}
+
+    return Sphinx(srcdir=os.path.join(conf.paths.projectroot, conf.paths.branch_source),
+                  confdir=conf.paths.projectroot,
+                  outdir=sconf.fq_build_output,
+                  doctreedir=os.path.join(conf.paths.projectroot, conf.paths.branch_output, 'doctrees-' + key),
+                  buildername=sconf.builder,
+                  confoverrides=overrides,
+                  status=None,
+                  warning=warning,
+                  tags=sorted(get_tag_set(sconf.builder, sconf)),
+                  parallel=jobs or 0)
+
+def _switch_builder(app, sconf):
+    # the builder adds its own name and format to the tags, so each builder
+    # starts with a fresh set.
+    app.outdir = sconf.fq_build_output
+    app.tags = Tags(sorted(get_tag_set(sconf.builder, sconf)))
+    app.statuscode = 0
+    app._init_builder(sconf.builder)
+
+def run_sphinx_group(key, builds, jobs=None):
+    """
+    Runs all builders in a group in one Sphinx application.
+
+    :param int jobs: The number of parallel processes. By default, uses
+       :func:`~giza.content.sphinx.get_parallel_jobs()`.
+
+    :returns: A ``(return_code, output, timings)`` tuple, like
+       :func:`giza.content.sphinx.run_sphinx()`, with the sum of the return
+       codes, the warnings and the durations of all builders.
+    """
+
+    app = None
+
+    codes = []
+    output = []
+    timings = {}
+    for sconf, conf in builds:
+        if jobs is None:
+            jobs = get_parallel_jobs(conf)
+
+        warning = SphinxOutputFilter(conf, live=True)
+        if app is not None:
+            app._warning = warning
+
+        prepare_sphinx_output(sconf.builder, sconf, conf)
+
+        timing_key = get_timing_key(sconf)
+        timings_fn = os.path.join(conf.paths.projectroot, conf.paths.branch_output,
+                                  'sphinx-phases-' + timing_key + '.json')
+
+        # set on the application rather than in os.environ, which all
+        # threads share.
+        settings = { phase_timings_config: timings_fn,
+                     changed_documents_config: None }
+        if conf.system.targeted_rebuilds is True:
+            settings[changed_documents_config] = conf.system.changed_documents
+
+        start = time.time()
+        logger.info('starting in-process sphinx build {0} ({1})'.format(sconf.builder, key))
+        try:
+            with Timer("running sphinx build for: {0}, {1}, {2}".format(sconf.builder, sconf.language, sconf.edition)):
+                if app is None:
+                    app = _create_app(key, sconf, conf, warning, jobs)
+                else:
+                    _switch_builder(app, sconf)
+
+                for name, value in settings.items():
+                    setattr(app.config, name, value)
+
+                app.build()
+                return_code = app.statuscode
+        except Exception as e:
+            logger.error('sphinx build {0} failed: {1}'.format(sconf.builder, e))
+            warning.write('{0}: {1}\n'.format(type(e).__name__, e))
+            return_code = 1
+            # Sphinx removes the pickled environment after an error, so the
+            # next builder starts over.
+            app = None
+
+        phases = read_phase_timings(timings_fn)
+        phases['total'] = time.time() - start
+        if return_code == 0:
+            timings[timing_key] = phases
+
+        logger.info('completed sphinx build {0}'.format(sconf.builder))
+
+        run_sphinx_finalizers(sconf.builder, sconf, conf, return_code)
+
+        codes.append(return_code)
+        output.extend(warning.close())
+
+    return sum(codes), '\n'.join(output), timings
+
+def sphinx_group_tasks(groups, app, jobs=None):
+    """
+    :param dict groups: A mapping of group keys to lists of ``(sconf, conf)``
+       tuples, as returned by :func:`~giza.content.sphinx_engine.group_builds()`.
+
+    :param list jobs: Optional. The number of parallel processes for each
+       group.
+
+    Adds a task to ``app`` for each group of builders.
+    """
+
+    if jobs is None:
+        jobs = [ None ] * len(groups)
+
+    for (key, group), group_jobs in zip(groups.items(), jobs):
+        task = app.add('task')
+        task.job = run_sphinx_group
+        task.args = [key, group, group_jobs]
+        task.target = [ sconf.fq_build_output for sconf, conf in group ]
+        task.dependency = None
+        task.description = 'building {0} with sphinx'.format(', '.join(sconf.builder for sconf, conf in group))
@@ -0,0 +1,179 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Chooses the number of parallel processes (i.e. ``sphinx-build -j``) for each
+Sphinx build, so that builds that run at the same time share the processors of
+the machine rather than each starting ``pool_size`` processes.
+
+After every build, giza records how long each builder took in
+``build/<branch>/sphinx-timings.json``. When ``giza.sphinxext`` is in the
+project's extensions, the record separates reading from writing; otherwise it
+only has the total duration. Every concurrent build gets one processor, and
+:func:`~giza.content.sphinx_planner.plan_parallel_jobs()` divides the
+remaining processors in proportion to the part of each build that Sphinx can
+parallelize: writing, and with Sphinx 1.3 or later, reading.
+
+An explicit ``--serial_sphinx`` option overrides the plan.
+"""
+
+import json
+import logging
+import multiprocessing
+import os.path
+
+import pkg_resources
+
+logger = logging.getLogger('giza.content.sphinx_planner')
+
+from giza.content.sphinx import is_parallel_sphinx
+from giza.tools.files import atomic_write, safe_create_directory
+
+def load_timings(conf):
+    fn = conf.system.sphinx_timings
+
+    if not os.path.isfile(fn):
+        return {}
+
+    with open(fn, 'r') as f:
+        try:
+            return json.load(f)
+        except ValueError:
+            logger.warning('could not read sphinx build timings from: ' + fn)
+            return {}
+
+def record_timings(conf, timings):
+    """
+    :param dict timings: A mapping of timing keys to mappings of phases
+       (``total``, ``read``, ``write``) to durations in seconds.
+
+    Merges ``timings`` into the timing record. Each duration is the average of
+    the new and the recorded duration, so that one unusually fast or slow
+    build does not dominate the next plan.
+    """
+
+    if len(timings) == 0:
+        return
+
+    history = load_timings(conf)
+
+    for key, phases in timings.items():
+        previous = history.get(key, {})
+
+        history[key] = dict((phase, duration if phase not in previous
+                             else (previous[phase] + duration) / 2.0)
+                            for phase, duration in phases.items())
+
+    fn = conf.system.sphinx_timings
+    safe_create_directory(os.path.dirname(fn))
+    atomic_write(fn, json.dumps(history, indent=2, sort_keys=True))
+
+    logger.debug('recorded sphinx build timings for: ' + ', '.join(sorted(timings)))
+
+def parallel_duration(phases, parallel_read=False):
+    """
+    :returns: The duration of the parallelizable phases in ``phases``, or the
+       total duration if the phases are not known.
+    """
+
+    if 'write' in phases:
+        duration = phases['write']
+        if parallel_read is True:
+            duration += phases.get('read', 0)
+
+        return duration
+    else:
+        return phases.get('total')
+
+def plan_parallel_jobs(tasks, timings, cores, concurrency, parallel_read=False):
+    """
+    :param list tasks: A list with one list of timing keys for each Sphinx
+       task. In-process builds run several builders in one task.
+
+    :param dict timings: The timing record, as returned by
+       :func:`~giza.content.sphinx_planner.load_timings()`.
+
+    :param int cores: The number of available processors.
+
+    :param int concurrency: The number of tasks that run at the same time.
+
+    :returns: A list with the number of processes for each task.
+    """
+
+    if len(tasks) == 0:
+        return []
+
+    if len(tasks) > concurrency:
+        # tasks run in several waves, and we cannot tell which tasks will run
+        # together, so divide the processors evenly.
+        return [ max(1, cores // concurrency) ] * len(tasks)
+    elif cores <= len(tasks):
+        return [ 1 ] * len(tasks)
+
+    weights = []
+    for keys in tasks:
+        durations = [ parallel_duration(timings[key], parallel_read)
+                      for key in keys if key in timings ]
+
+        if len(durations) == len(keys) and None not in durations:
+            weights.append(max(sum(durations), 0.001))
+        else:
+            weights.append(None)
+
+    known = [ w for w in weights if w is not None ]
+    if len(known) == 0:
+        default = 1.0
+    else:
+        default = float(sum(known)) / len(known)
+
+    weights = [ default if w is None else w for w in weights ]
+
+    spare = cores - len(tasks)
+    shares = [ float(spare) * w / sum(weights) for w in weights ]
+
+    jobs = [ 1 + int(share) for share in shares ]
+
+    # give the processors lost to rounding to the tasks with the largest
+    # remainders.
+    by_remainder = sorted(range(len(tasks)), key=lambda idx: shares[idx] - int(shares[idx]), reverse=True)
+    for idx in by_remainder[:cores - sum(jobs)]:
+        jobs[idx] += 1
+
+    return jobs
+
+def sphinx_job_plan(conf, tasks, concurrency):
+    """
+    :param list tasks: A list with one list of timing keys for each Sphinx
+       task.
+
+    :returns: A list with the number of processes for each task. ``None``
+       entries defer to :func:`giza.content.sphinx.get_parallel_jobs()`, which
+       handles Sphinx versions without ``-j`` and the ``--serial_sphinx``
+       option.
+    """
+
+    version = pkg_resources.get_distribution("sphinx").version
+
+    if not is_parallel_sphinx(version) or 'serial_sphinx' in conf.runstate:
+        return [ None ] * len(tasks)
+
+    parallel_read = pkg_resources.parse_version(version) >= pkg_resources.parse_version('1.3')
+
+    jobs = plan_parallel_jobs(tasks, load_timings(conf), multiprocessing.cpu_count(),
+                              min(len(tasks), concurrency), parallel_read)
+
+    logger.info('sphinx processes per build: ' +
+                ', '.join('{0}={1}'.format('+'.join(keys), j) for keys, j in zip(tasks, jobs)))
+
+    return jobs
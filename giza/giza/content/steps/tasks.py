@@ -17,7 +17,7 @@ import logging
 
 logger = logging.getLogger('giza.content.steps.tasks')
 
-from giza.tools.files import expand_tree, verbose_remove, safe_create_directory
+from giza.tools.files import expand_tree, verbose_remove, safe_create_directory, write_if_changed
 from giza.content.steps.inheritance import StepDataCache
 from giza.content.steps.views import render_steps
 from giza.config.content import new_content_type
@@ -28,8 +28,11 @@ def register_steps(conf):
 
 def write_steps(steps, fn, conf):
     content = render_steps(steps, conf)
-    content.write(fn)
-    logger.info('wrote steps to: '  + fn)
+    result = write_if_changed(fn, content.data)
+    if result.changed is True:
+        logger.info('wrote steps to: '  + fn)
+
+    return result
 
 def step_tasks(conf):
     step_sources = conf.system.content.steps.sources
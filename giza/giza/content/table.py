@@ -28,7 +28,7 @@ logger = logging.getLogger('giza.content.table')
 from rstcloth.table import TableBuilder, YamlTable, ListTable
 
 from giza.tools.strings import dot_concat, hyph_concat
-from giza.tools.files import expand_tree, verbose_remove
+from giza.tools.files import expand_tree, verbose_remove, write_if_changed
 
 #################### Table Builder ####################
 
@@ -57,11 +57,12 @@ def _generate_tables(source, target, list_target):
     #     build_all = True
 
     list_table = TableBuilder(ListTable(table_data))
-    list_table.write(list_target)
-    logger.debug('rebuilt rendered table {0}'.format(list_target))
+    results = [ write_if_changed(list_target, list_table.output),
+                write_if_changed(target, list_table.output) ]
 
-    list_table.write(target)
-    logger.debug('rebuilt rendered list table {0}'.format(target))
+    for result in results:
+        if result.changed is True:
+            logger.debug('rebuilt rendered table {0}'.format(result.path))
 
     # if build_all or table_data.format == 'list':
     #     list_table = TableBuilder(ListTable(table_data))
@@ -76,6 +77,8 @@ def _generate_tables(source, target, list_target):
 
     logger.info('rebuilt rendered table output for {0}'.format(source))
 
+    return results
+
 
 #################### Table Source Iterators ####################
 
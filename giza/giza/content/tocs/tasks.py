@@ -19,7 +19,7 @@ logger = logging.getLogger('giza.content.tocs.tasks')
 
 from giza.content.tocs.inheritance import TocDataCache
 from giza.content.tocs.views import render_toctree, render_dfn_list, render_toc_table
-from giza.tools.files import safe_create_directory
+from giza.tools.files import safe_create_directory, write_if_changed
 from giza.tools.strings import hyph_concat
 from giza.config.content import new_content_type
 from giza.core.task import Task
@@ -34,18 +34,27 @@ def register_toc(conf):
 
 def write_toc_tree_output(fn, toc_items):
     content = render_toctree(toc_items)
-    content.write(fn)
-    logger.info("wrote toctree to: " + fn)
+    result = write_if_changed(fn, content.data)
+    if result.changed is True:
+        logger.info("wrote toctree to: " + fn)
+
+    return result
 
 def write_dfn_list_output(fn, toc_items):
     content = render_dfn_list(toc_items)
-    content.write(fn)
-    logger.info("wrote toc dfnlist to: " + fn)
+    result = write_if_changed(fn, content.data)
+    if result.changed is True:
+        logger.info("wrote toc dfnlist to: " + fn)
+
+    return result
 
 def write_toc_table(fn, toc_items):
     content = render_toc_table(toc_items)
-    content.write(fn)
-    logger.info("wrote toc table to: " + fn)
+    result = write_if_changed(fn, content.data)
+    if result.changed is True:
+        logger.info("wrote toc table to: " + fn)
+
+    return result
 
 def toc_tasks(conf):
     toc_sources = conf.system.content.toc.sources
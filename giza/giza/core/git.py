@@ -145,6 +145,11 @@ class GitRepo(object):
     def sha(self, ref='HEAD'):
         return self.cmd('rev-parse', '--verify', ref).out
 
+    def commit_time(self, ref='HEAD'):
+        """:returns: The commit time of ``ref``, in seconds since the epoch."""
+
+        return int(self.cmd('log', '-1', '--format=%ct', ref).out)
+
     def clone(self, remote, repo_path=None, branch=None):
         args = ['clone', remote]
 
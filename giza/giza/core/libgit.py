@@ -98,6 +98,9 @@ class GitRepo(object):
     def sha(self, ref='HEAD'):
         pass
 
+    def commit_time(self, ref='HEAD'):
+        pass
+
     def clone(self, remote, repo_path=None, branch=None):
         pass
 
@@ -28,7 +28,7 @@ import collections
 logger = logging.getLogger('giza.task')
 
 from giza.config.main import ConfigurationBase
-from giza.tools.files import md5_file
+from giza.tools.files import hash_file, file_signature
 
 if sys.version_info >= (3, 0):
     basestring = str
@@ -289,19 +289,26 @@ def check_hashed_dependency(fn, dep_map, conf):
     :return: ``True`` when any of the files that include ``fn`` have changed since
         the generation of the the ``dep_map``. Always returns ``True`` if
         ``dep_map`` is ``None`` (i.e. if this is the first build.)
+
+    The ``dep_map`` holds the state of the ``build/<branch>/source`` tree from
+    the last build. Entries are ``[digest, size, mtime_ns, inode]`` lists, and
+    files whose stat information matches their entry are not re-hashed. Legacy
+    entries are plain digests.
     """
     # logger.info('checking dependency for: ' + fan)
 
-    fn = normalize_dep_path(fn, conf, branch=False)
+    fn = normalize_dep_path(fn, conf, branch=True)
 
     if dep_map is None:
         return True
     elif not os.path.exists(fn):
         return True
     elif fn in dep_map:
-        if dep_map[fn] != md5_file(fn):
-            return True
+        entry = dep_map[fn]
+
+        if isinstance(entry, list):
+            return file_signature(fn, entry)[0] != entry[0]
         else:
-            return False
+            return entry != hash_file(fn)
     else:
         return False
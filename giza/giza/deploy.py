@@ -19,16 +19,51 @@ Given a deploy target, we need to compile the rsync commands to:
 - rsync all static files. (unless non-master and .htaccess)
 - create the rsync command.
 
+Each host gets one session: one rsync command for the content and, using
+``--files-from``, one for all static files. Both commands share one SSH
+connection through OpenSSH connection multiplexing (``ControlMaster``).
+
+Deployments are deltas: before deploying, giza records the content hash of
+every file of the local tree in a manifest, and keeps the manifest that it
+last deployed to each host of the target. The content command for a host
+only transfers the files that differ between the two manifests, and removes
+the deleted files if the target uses the ``delete`` option. The first
+deployment to a host, and deployments with ``--full``, compare every file
+with ``rsync --checksum`` instead.
+:meth:`~giza.deploy.Deploy.run()` deploys to several hosts at once, up to
+``fanout`` hosts, and logs the throughput for each host.
+
+Hosts that begin with ``file://`` are local directories, which stand in for
+remote hosts when testing deployments.
 """
 
+import collections
+import json
 import logging
+import multiprocessing.dummy
 import os.path
+import re
+import tempfile
+import time
 
-from giza.tools.files import InvalidFile
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+from giza.tools.files import InvalidFile, atomic_write
 from giza.tools.command import command, CommandError
+from giza.tools.publish import tree_signatures
 
 logger = logging.getLogger('giza.deploy')
 
+HostResult = collections.namedtuple('HostResult', ['host', 'transferred', 'seconds'])
+
+local_host_prefix = 'file://'
+
+# rsync 3.1 and later group digits with commas.
+transferred_regex = re.compile(r'Total transferred file size: ([\d,]+)')
+
 class Deploy(object):
     def __init__(self, conf):
         self.conf = conf
@@ -41,6 +76,10 @@ class Deploy(object):
         self.hosts = None
         self.static_files = []
         self.branched = False
+        self.fanout = None
+        self.full = False
+        self.pool_size = 1
+        self.rsync = 'rsync'
 
     def load(self, pspec):
         if 'target' in pspec:
@@ -69,41 +108,267 @@ class Deploy(object):
         if 'static' in pspec['paths']:
             self.static_files.extend(pspec['paths']['static'])
 
-    def _base_cmd(self):
-        base_cmd = [ 'rsync', '-cqltz']
+    def _base_cmd(self, delta=False):
+        if delta is True:
+            # transfer exactly the listed files, without rsync's own checks.
+            base_cmd = [ self.rsync, '-ltzI', '--stats' ]
+        else:
+            base_cmd = [ self.rsync, '-cltz', '--stats' ]
 
-        if self.delete is True:
-            base_cmd.append('--delete')
+            if self.delete is True:
+                base_cmd.append('--delete')
 
-        if self.recursive is True:
-            base_cmd.append('--recursive')
+            if self.recursive is True:
+                base_cmd.append('--recursive')
 
         if 'args' in self.deploy_env:
             base_cmd.extend(self.deploy_env.args)
 
         return base_cmd
 
+    def _session_args(self, host, base_cmd):
+        # share one ssh connection between all commands for a host, unless the
+        # deploy configuration sets its own remote shell.
+        if host.startswith(local_host_prefix) or '-e' in base_cmd or any(arg.startswith('--rsh') for arg in base_cmd):
+            return []
+
+        control_path = os.path.join(tempfile.gettempdir(), 'giza-ssh-%r@%h:%p')
+        rsh = 'ssh -o ControlMaster=auto -o ControlPersist=60 -o ControlPath=' + control_path
+
+        return [ '-e', quote(rsh) ]
+
+    def destination(self, host, path=None):
+        if path is None:
+            remote = self.remote_path
+        else:
+            remote = os.path.join(self.remote_path, path)
+
+        if host.startswith(local_host_prefix):
+            return os.path.join(host[len(local_host_prefix):], remote.lstrip('/'))
+        else:
+            return host + ':' + remote
+
+    def _static_files(self):
+        for fn in self.static_files:
+            if self.conf.git.branches.current != 'master' and fn == '.htaccess':
+                logger.debug('skipping .htaccess files from non-master branch')
+                continue
+            else:
+                yield fn
+
+    def static_files_list(self):
+        """
+        Writes the list of static files for ``rsync --files-from``.
+
+        :returns: The name of the list, or ``None`` if there are no static
+           files to deploy.
+        """
+
+        static_files = list(self._static_files())
+        if len(static_files) == 0:
+            return None
+
+        # concurrent hosts rewrite the same list, so replace it atomically.
+        fn = os.path.join(self.conf.paths.branch_output, 'deploy-{0}-static-files'.format(self.name))
+        atomic_write(fn, ('\n'.join(static_files) + '\n').encode('utf-8'))
+
+        return fn
+
+    def local_root(self):
+        return os.path.join(self.conf.paths.output, self.local_path)
+
+    def content_path(self):
+        # the public branch directory is a symbolic link to a snapshot, so
+        # sync its contents.
+        if self.branched is True:
+            return os.path.join(self.local_root(), self.conf.git.branches.current)
+        else:
+            return self.local_root()
+
+    def _host_file(self, host, suffix):
+        slug = re.sub(r'[^\w.@-]+', '-', host).strip('-')
+
+        return os.path.join(self.conf.paths.branch_output,
+                            'deploy-{0}-{1}-{2}'.format(self.name, slug, suffix))
+
+    @property
+    def manifest_fn(self):
+        return os.path.join(self.conf.paths.branch_output, 'deploy-{0}-manifest.json'.format(self.name))
+
+    def load_manifest(self):
+        """
+        :returns: The manifest of the target, with the signatures of the
+           local files in ``files`` and, in ``hosts``, a mapping of each host
+           to the digests of the files that were last deployed to it.
+        """
+
+        manifest = { 'files': {}, 'hosts': {} }
+
+        if os.path.isfile(self.manifest_fn):
+            with open(self.manifest_fn, 'r') as f:
+                try:
+                    manifest.update(json.load(f))
+                except ValueError:
+                    logger.warning('could not read deploy manifest {0}, deploying all files'.format(self.manifest_fn))
+
+        return manifest
+
+    def save_manifest(self, manifest):
+        atomic_write(self.manifest_fn, json.dumps(manifest).encode('utf-8'))
+
+    def update_manifest(self, manifest):
+        """
+        Records the signatures of the files of the local tree in ``manifest``,
+        reading only the files that changed since the last call.
+        """
+
+        manifest['files'] = tree_signatures(self.content_path(), manifest['files'], self.pool_size)
+
+        return manifest
+
+    def delta(self, manifest, host):
+        """
+        :returns: A tuple of the lists of the changed or added files, and of
+           the deleted files, for ``host``, or ``None`` if giza has not
+           deployed to ``host`` before.
+        """
+
+        deployed = manifest['hosts'].get(host)
+        if deployed is None or self.full is True:
+            return None
+
+        changed = sorted(rel for rel, sig in manifest['files'].items() if deployed.get(rel) != sig[0])
+        deleted = sorted(rel for rel in deployed if rel not in manifest['files'])
+
+        return changed, deleted
+
+    def host_commands(self, host, manifest=None):
+        """
+        :param dict manifest: Optional. The deploy manifest, with up to date
+           signatures of the local files.
+
+        :returns: The list of rsync commands for ``host``.
+        """
+
+        if manifest is None:
+            manifest = self.update_manifest(self.load_manifest())
+
+        source = self.content_path() + '/'
+        if self.branched is True:
+            destination = self.destination(host, self.conf.git.branches.current)
+        else:
+            destination = self.destination(host)
+
+        commands = []
+        delta = self.delta(manifest, host)
+
+        if delta is None:
+            base = self._base_cmd()
+            base.extend(self._session_args(host, base))
+            commands.append(base + [ source, destination ])
+        else:
+            changed, deleted = delta
+            if self.delete is False:
+                deleted = []
+
+            if len(changed) + len(deleted) > 0:
+                files_list = self._host_file(host, 'files')
+                atomic_write(files_list, ''.join(rel + '\n' for rel in changed + deleted).encode('utf-8'))
+
+                base = self._base_cmd(delta=True)
+                base.extend(self._session_args(host, base))
+                base.append('--files-from=' + files_list)
+                if len(deleted) > 0:
+                    base.append('--delete-missing-args')
+
+                commands.append(base + [ source, destination ])
+
+            logger.info('deploying {0} changed and {1} deleted files of {2} to {3}'.format(
+                        len(changed), len(deleted), self.name, host))
+
+        static_list = self.static_files_list()
+        if static_list is not None:
+            base = self._base_cmd()
+            base.extend(self._session_args(host, base))
+            commands.append(base + [ '--files-from=' + static_list,
+                                     self.local_root() + '/', self.destination(host) ])
+
+        return commands
+
     def deploy_commands(self):
-        base = self._base_cmd()
+        manifest = self.update_manifest(self.load_manifest())
 
         for host in self.hosts:
-            if self.branched is True:
-                yield base + [ os.path.join(self.conf.paths.output, self.local_path, self.conf.git.branches.current),
-                               host + ':' + self.remote_path ]
-            else:
-                yield base + [ os.path.join(self.conf.paths.output, self.local_path) + '/',
-                               host + ':' + self.remote_path ]
+            for cmd in self.host_commands(host, manifest):
+                yield cmd
 
-            for fn in self.static_files:
-                if self.conf.git.branches.current != 'master' and fn == '.htaccess':
-                    logger.debug('skipping .htaccess files from non-master branch')
-                    continue
-                else:
-                    yield base + [ os.path.join(self.conf.paths.output,  self.local_path,  fn),
-                                   host + ':' + self.remote_path ]
+    def deploy_host(self, host, manifest):
+        """
+        Runs all rsync commands for ``host`` in turn, and then records the
+        deployed files in ``manifest`` if every command transferred all
+        files.
+
+        :returns: A :class:`~giza.deploy.HostResult`.
+        """
+
+        start = time.time()
+        transferred = 0
+        complete = True
+
+        for cmd in self.host_commands(host, manifest):
+            r = deploy_target(cmd)
+
+            if r.return_code != 0:
+                complete = False
+
+            m = transferred_regex.search(r.out)
+            if m is not None:
+                transferred += int(m.group(1).replace(',', ''))
+
+        if complete is True:
+            manifest['hosts'][host] = dict((rel, sig[0]) for rel, sig in manifest['files'].items())
+        else:
+            # the next deployment sends these files again, using the
+            # manifest of the last complete deployment.
+            logger.warning('some files did not transfer to {0}, not recording the deployment'.format(host))
+
+        seconds = time.time() - start
+        logger.info('deployed {0} to {1}: {2} bytes in {3:.1f} seconds ({4:.1f} KB/s)'.format(
+                    self.name, host, transferred, seconds, transferred / 1024.0 / max(seconds, 0.001)))
+
+        return HostResult(host, transferred, seconds)
 
     def run(self):
-        map(deploy_target, self.deploy_commands())
+        """
+        Deploys to up to ``fanout`` hosts at once, or to all hosts if
+        ``fanout`` is ``None``.
+
+        :returns: A list of :class:`~giza.deploy.HostResult` objects.
+        """
+
+        manifest = self.update_manifest(self.load_manifest())
+
+        def deploy_host(host):
+            return self.deploy_host(host, manifest)
+
+        fanout = min(self.fanout or len(self.hosts), len(self.hosts))
+
+        # record the hosts that succeeded even if others fail.
+        try:
+            if fanout <= 1:
+                return [ deploy_host(host) for host in self.hosts ]
+
+            p = multiprocessing.dummy.Pool(fanout)
+            try:
+                return p.map(deploy_host, self.hosts)
+            finally:
+                p.close()
+                p.join()
+        finally:
+            self.save_manifest(manifest)
+
+def run_deploy(deploy):
+    return deploy.run()
 
 def deploy_target(cmd):
     r = command(cmd, capture=True, ignore=True, logger=logger)
@@ -12,44 +12,114 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import multiprocessing.dummy
 import os.path
 import re
 
-from itertools import groupby
-from operator import itemgetter
-
 from giza.tools.serialization import ingest_yaml_doc, ingest_yaml_list
 from giza.tools.files import expand_tree
-from giza.tools.command import command
+
+########## Include Scanning ##########
+
+# one pass over each file finds every directive that makes a document depend on
+# another file in the source tree.
+include_directive_regex = re.compile(r'^[ \t]*\.\. (?:include|literalinclude|figure)::[ \t]+(\S.*?)[ \t]*$',
+                                     re.MULTILINE)
+
+scanned_extensions = ['txt', 'rst', 'yaml']
+
+# maps absolute file names to a ((mtime, size), [targets]) tuple, so that
+# re-scanning a tree only reads the files that changed since the last scan.
+_scan_cache = {}
+
+def _file_key(fn):
+    st = os.stat(fn)
+    return (st.st_mtime, st.st_size)
+
+def _scan_file(fn):
+    key = _file_key(fn)
+
+    with open(fn, 'r') as f:
+        targets = include_directive_regex.findall(f.read())
+
+    _scan_cache[fn] = (key, targets)
+
+    return fn, targets
+
+def scan_includes(source_dir, pool_size=1):
+    """
+    :param string source_dir: The path of the source tree to scan.
+
+    :param int pool_size: The number of threads that read changed files.
+
+    :returns: A dictionary that maps every file in ``source_dir`` that contains
+       an ``include``, ``literalinclude`` or ``figure`` directive to the list of
+       directive arguments, in document order. Only files that changed since
+       the last scan in this process are read.
+    """
+
+    results = {}
+    stale = []
+
+    for fn in expand_tree(source_dir, scanned_extensions):
+        if fn.endswith('~') or fn.endswith('overview.rst'):
+            continue
+
+        try:
+            key = _file_key(fn)
+        except OSError:
+            continue
+
+        cached = _scan_cache.get(fn)
+        if cached is not None and cached[0] == key:
+            if len(cached[1]) > 0:
+                results[fn] = cached[1]
+        else:
+            stale.append(fn)
+
+    if len(stale) > 1 and pool_size > 1:
+        p = multiprocessing.dummy.Pool(pool_size)
+        try:
+            scanned = p.map(_scan_file, stale)
+        finally:
+            p.close()
+            p.join()
+    else:
+        scanned = [ _scan_file(fn) for fn in stale ]
+
+    for fn, targets in scanned:
+        if len(targets) > 0:
+            results[fn] = targets
+
+    return results
+
+def _resolve_include_target(src, target):
+    if target.startswith('/'):
+        return target
+    else:
+        return os.path.normpath(os.path.join(os.path.dirname(src), target))
 
 def include_files(conf, files=None):
     if files is not None:
         return files
     else:
         source_dir = os.path.join(conf.paths.projectroot, conf.paths.source)
-        grep = command('grep -R ".. include:: /" {0} || exit 0'.format(source_dir), capture=True).out
+        prefix_len = len(source_dir)
 
-        rx = re.compile(source_dir + r'(.*):.*\.\. include:: (.*)')
+        graph = {}
+        for fn, targets in scan_includes(source_dir, conf.runstate.pool_size).items():
+            src = fn[prefix_len:]
+            for target in targets:
+                if src.endswith('yaml') and not target.startswith('/'):
+                    # relative paths in content specifications resolve
+                    # against the generated file, not the yaml file.
+                    continue
 
-        s = [ m.groups()
-              for m in [ rx.match(d)
-                         for d in grep.split('\n') ]
-              if m is not None
-            ]
-
-        def tuple_sort(k):
-            return k[1]
-        s.sort(key=tuple_sort)
+                graph.setdefault(_resolve_include_target(src, target), set()).add(src)
 
         files = dict()
-
-        for i in groupby(s, itemgetter(1)):
-            files[i[0]] = set()
-            for src in i[1]:
-                if not src[0].endswith('~') and not src[0].endswith('overview.rst'):
-                    files[i[0]].add(src[0])
-            files[i[0]] = list(files[i[0]])
-            files[i[0]].sort()
+        for inc, srcs in graph.items():
+            files[inc] = sorted(srcs)
 
         for k,v in generated_includes(conf).items():
             if k in files:
@@ -59,6 +129,208 @@ def include_files(conf, files=None):
 
         return files
 
+########## Include Graph ##########
+
+class IncludeGraph(object):
+    """
+    A compact, queryable form of the mapping that
+    :func:`~giza.includes.include_files()` returns. File names are interned as
+    integers and the graph is condensed into its strongly connected components,
+    so include cycles are safe and files in the same cycle share one node.
+
+    Closures (in both directions) are computed on demand over the condensed
+    graph and cached per component, so the cost of a query is proportional to
+    the part of the graph it reaches, not to the size of the whole graph.
+
+    :param dict graph: A mapping of included files to the lists of files that
+       include them.
+    """
+
+    def __init__(self, graph):
+        self.paths = []
+        self.ids = {}
+
+        includers = []
+
+        for inc, srcs in graph.items():
+            inc_id = self._intern(inc, includers)
+            for src in srcs:
+                includers[inc_id].append(self._intern(src, includers))
+
+        self.component, self.members = strongly_connected_components(includers)
+
+        num_components = len(self.members)
+        self._includers = [ set() for _ in range(num_components) ]
+        self._includes = [ set() for _ in range(num_components) ]
+        self._cyclic = [ len(m) > 1 for m in self.members ]
+
+        for inc_id, srcs in enumerate(includers):
+            inc_comp = self.component[inc_id]
+            for src_id in srcs:
+                src_comp = self.component[src_id]
+                if src_comp == inc_comp:
+                    self._cyclic[inc_comp] = True
+                else:
+                    self._includers[inc_comp].add(src_comp)
+                    self._includes[src_comp].add(inc_comp)
+
+        self._dependents = {}
+        self._dependencies = {}
+
+    def _intern(self, fn, adjacency):
+        if fn in self.ids:
+            return self.ids[fn]
+        else:
+            idx = len(self.paths)
+            self.ids[fn] = idx
+            self.paths.append(fn)
+            adjacency.append([])
+
+            return idx
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __contains__(self, fn):
+        return fn in self.ids
+
+    def dependents(self, fn):
+        """
+        :returns: The set of all files that include ``fn`` directly or through
+           other included files.
+        """
+
+        return self._closure(fn, self._includers, self._dependents)
+
+    def dependencies(self, fn):
+        """
+        :returns: The set of all files that ``fn`` includes directly or through
+           other included files.
+        """
+
+        return self._closure(fn, self._includes, self._dependencies)
+
+    def _closure(self, fn, edges, cache):
+        if fn not in self.ids:
+            return set()
+
+        comp = self.component[self.ids[fn]]
+        if comp not in cache:
+            reached = self._reach([comp], edges)
+            if self._cyclic[comp] is True:
+                reached.add(comp)
+            cache[comp] = frozenset(reached)
+
+        return self._expand(cache[comp])
+
+    def _reach(self, start, edges):
+        seen = set()
+        stack = list(start)
+
+        while len(stack) > 0:
+            for comp in edges[stack.pop()]:
+                if comp not in seen:
+                    seen.add(comp)
+                    stack.append(comp)
+
+        return seen
+
+    def _expand(self, components):
+        return set(self.paths[idx]
+                   for comp in components
+                   for idx in self.members[comp])
+
+    def affected(self, changed):
+        """
+        :param list changed: A list of file names (relative to the source
+           directory, beginning with ``/``) that changed.
+
+        :returns: The set of files that include any of the ``changed`` files,
+           directly or indirectly. Uses one traversal for all changed files.
+        """
+
+        start = set(self.component[self.ids[fn]] for fn in changed if fn in self.ids)
+
+        reached = self._reach(start, self._includers)
+        reached.update(comp for comp in start if self._cyclic[comp] is True)
+
+        return self._expand(reached)
+
+def strongly_connected_components(adjacency):
+    """
+    :param list adjacency: A list where the item at index ``n`` holds the list
+       of node ids reachable in one step from node ``n``.
+
+    :returns: A tuple of a list that maps each node id to its component id, and
+       a list of the members of each component.
+
+    An iterative version of Tarjan's algorithm, so that deeply nested includes
+    do not exhaust the interpreter's stack.
+    """
+
+    num_nodes = len(adjacency)
+    index = [None] * num_nodes
+    lowlink = [0] * num_nodes
+    on_stack = [False] * num_nodes
+    component = [None] * num_nodes
+    members = []
+
+    stack = []
+    counter = 0
+
+    for root in range(num_nodes):
+        if index[root] is not None:
+            continue
+
+        work = [(root, 0)]
+        while len(work) > 0:
+            node, edge_idx = work.pop()
+
+            if edge_idx == 0:
+                index[node] = lowlink[node] = counter
+                counter += 1
+                stack.append(node)
+                on_stack[node] = True
+
+            edges = adjacency[node]
+            while edge_idx < len(edges):
+                succ = edges[edge_idx]
+                edge_idx += 1
+                if index[succ] is None:
+                    work.append((node, edge_idx))
+                    work.append((succ, 0))
+                    break
+                elif on_stack[succ] is True:
+                    lowlink[node] = min(lowlink[node], index[succ])
+            else:
+                if lowlink[node] == index[node]:
+                    comp = len(members)
+                    comp_members = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        component[member] = comp
+                        comp_members.append(member)
+                        if member == node:
+                            break
+                    members.append(comp_members)
+
+                if len(work) > 0:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+
+    return component, members
+
+def affected_files(conf, changed, inc_files=None):
+    """
+    :returns: A sorted list of all files that include one of the ``changed``
+       files, directly or through nested includes.
+    """
+
+    graph = IncludeGraph(include_files(conf=conf, files=inc_files))
+
+    return sorted(graph.affected(changed))
+
 def included_once(conf, inc_files=None):
     results = []
     for file, includes in include_files(conf=conf, files=inc_files).items():
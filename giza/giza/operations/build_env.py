@@ -17,17 +17,20 @@ import datetime
 import itertools
 import logging
 import os
-import tarfile
 import tempfile
 
 import argh
 from sphinx.application import Sphinx, ENV_PICKLE_FILENAME
 from sphinx.builders.html import get_stable_hash
 
+from giza.config.helper import fetch_config
 from giza.config.sphinx_config import avalible_sphinx_builders, resolve_builder_path
-from giza.operations.packaging import fetch_package
+from giza.content.dependency_store import get_dependency_store
+from giza.core.app import BuildApp
+from giza.operations.packaging import open_package
 from giza.operations.sphinx_cmds import get_sphinx_build_configuration
 from giza.tools.files import cd, safe_create_directory, FileNotFoundError
+from giza.tools.package import create_package_file, extract_package_chain
 from giza.tools.strings import hyph_concat
 
 logger = logging.getLogger('giza.operations.build_env')
@@ -41,10 +44,46 @@ def is_git_dir(path):
     else:
         return False
 
-def extract_package_at_root(path, conf):
-    with cd(conf.paths.projectroot):
-        with tarfile.open(path, "r:gz") as t:
-            t.extractall()
+def get_builder_prefixes(builders, conf):
+    """
+    :returns: The paths, relative to the project root, of the build
+       environment package members that ``builders`` need, or ``None`` for
+       all members.
+    """
+
+    if not builders:
+        return None
+
+    prefixes = [ conf.paths.branch_source,
+                 os.path.relpath(get_dependency_store(conf).path, conf.paths.projectroot) ]
+
+    for builder in builders:
+        prefixes.append(os.path.join(conf.paths.branch_output, builder))
+        prefixes.append(os.path.join(conf.paths.branch_output, hyph_concat('doctrees', builder)))
+
+    return prefixes
+
+def extract_package_at_root(path, conf, builders=None):
+    """
+    Extracts the build environment package at ``path``, a file name or URL,
+    into the project root, limited to ``builders`` if specified. If the
+    package is a delta, extracts the packages it is based on as well.
+    """
+
+    extract_package_chain(path, conf.paths.projectroot,
+                          prefixes=get_builder_prefixes(builders, conf),
+                          threads=conf.runstate.pool_size,
+                          opener=open_package)
+
+def resolve_base_package(base, conf):
+    # a base may be a URL, a path, or the name of a package in the build
+    # archive.
+    if base.startswith('http'):
+        return base
+    elif os.path.exists(base):
+        return os.path.abspath(base)
+    else:
+        return os.path.join(conf.paths.projectroot, conf.paths.buildarchive, base)
 
 def get_existing_builders(conf):
     return [ b
@@ -57,8 +96,20 @@ def env_package_worker(args, conf):
 
 #################### Core Workers ####################
 
-def package_build_env(builders, editions, languages, conf):
-    arc_fn = hyph_concat('cache', conf.project.name, conf.git.branches.current, datetime.datetime.utcnow().strftime('%s'), conf.git.commit[:8]) + ".tar.gz"
+def package_build_env(builders, editions, languages, conf, base=None):
+    """
+    Packages the source, output, doctrees and dependency cache of the
+    builders. If ``base`` names a package, creates a delta package that only
+    contains the files that changed since ``base``.
+    """
+
+    arc_fn = hyph_concat('cache', conf.project.name, conf.git.branches.current, datetime.datetime.utcnow().strftime('%s'), conf.git.commit[:8])
+    if base is None:
+        arc_fn += ".tar.gz"
+    else:
+        base = resolve_base_package(base, conf)
+        arc_fn += "-delta.tar.gz"
+
     archive_path = os.path.join(conf.paths.buildarchive, arc_fn)
     safe_create_directory(conf.paths.buildarchive)
 
@@ -81,7 +132,7 @@ def package_build_env(builders, editions, languages, conf):
             files_to_archive.add(rconf.paths.branch_source)
             files_to_archive.add(os.path.join(rconf.paths.branch_output, builder_dirname))
             files_to_archive.add(os.path.join(rconf.paths.branch_output, hyph_concat('doctrees', builder_dirname)))
-            files_to_archive.add(rconf.system.dependency_cache_fn)
+            files_to_archive.add(os.path.relpath(get_dependency_store(rconf).path, rconf.paths.projectroot))
 
         files_to_archive = list(files_to_archive)
         logger.info('prepped build cache archive. writing file now.')
@@ -91,14 +142,14 @@ def package_build_env(builders, editions, languages, conf):
                 raise FileNotFoundError(fn)
 
         try:
-            with tarfile.open(archive_path, 'w:gz') as t:
-                for fn in files_to_archive:
-                    t.add(fn, exclude=is_git_dir)
+            create_package_file(archive_path, [ (fn, fn) for fn in sorted(files_to_archive) ],
+                                exclude=is_git_dir, threads=conf.runstate.pool_size,
+                                base=base, opener=open_package)
             logger.info("created build-cache archive: " + archive_path)
         except Exception as e:
-            os.remove(archive_path)
             logger.critical("failed to create archive: " + archive_path)
             logger.error(e)
+            raise
 
 def fix_build_env(builder, conf):
     """
@@ -163,20 +214,25 @@ def fix_build_env_tasks(builders, conf, app):
 @argh.arg('--edition', '-e', nargs='*', dest='editions_to_build')
 @argh.arg('--language', '-l', nargs='*',dest='languages_to_build')
 @argh.arg('--builder', '-b', nargs='*', default='html')
+@argh.arg('--base', default=None, dest='package_base')
 @argh.expects_obj
 def package(args):
     conf = fetch_config(args)
 
-    package_build_env(args.builder, args.editions_to_build, args.languages_to_build, conf)
+    package_build_env(args.builder, args.editions_to_build, args.languages_to_build, conf,
+                      base=conf.runstate.package_base)
 
 @argh.arg('--path', '-p', default=None, dest='_path')
+@argh.arg('--builder', '-b', nargs='*', default=[])
 @argh.expects_obj
 def extract(args):
     conf = fetch_config(args)
 
     with BuildApp.context(conf) as app:
-        path = fetch_package(args._path, conf)
-        extract_package_at_root(path, conf)
+        extract_package_at_root(args._path, conf, args.builder)
 
         builders = get_existing_builders(conf)
+        if args.builder:
+            builders = [ b for b in builders if b in args.builder ]
+
         fix_build_env_tasks(builders, conf, app)
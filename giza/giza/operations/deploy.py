@@ -22,7 +22,7 @@ logger = logging.getLogger('giza.operations.deploy')
 
 from giza.config.helper import fetch_config, new_credentials_config
 from giza.core.app import BuildApp
-from giza.deploy import Deploy, deploy_target
+from giza.deploy import Deploy, run_deploy
 from giza.operations.sphinx_cmds import sphinx_publication
 from giza.tools.command import command
 from giza.tools.serialization import ingest_yaml_list, dict_from_list
@@ -32,6 +32,8 @@ import onetimepass as otp
 
 @argh.arg('--target', '-t', nargs='*', dest='push_targets')
 @argh.arg('--dry-run', '-d', action='store_true', dest='dry_run')
+@argh.arg('--fanout', type=int, default=None, dest='deploy_fanout')
+@argh.arg('--full', action='store_true', default=False, dest='deploy_full')
 @argh.named('deploy')
 @argh.expects_obj
 def main(args):
@@ -53,6 +55,8 @@ def main(args):
 @argh.arg('--language', '-l', nargs='*',dest='languages_to_build')
 @argh.arg('--builder', '-b', nargs='*', default='html')
 @argh.arg('--serial_sphinx', action='store_true')
+@argh.arg('--fanout', type=int, default=None, dest='deploy_fanout')
+@argh.arg('--full', action='store_true', default=False, dest='deploy_full')
 @argh.named('push')
 @argh.expects_obj
 def publish_and_deploy(args):
@@ -79,8 +83,8 @@ def deploy_tasks(c, app):
     in ``giza.deploy``, and the configuration data is typically in
     ``config/push``.
 
-    This function glues the config with the rsync command creation and then
-    runs the commands.
+    This function glues the config with the rsync command creation and adds
+    one task for each target, which deploys to the target's hosts.
     """
 
     pconf = c.system.files.data.push
@@ -96,14 +100,23 @@ def deploy_tasks(c, app):
 
         d.load(target_pconf)
 
-        for cmd in d.deploy_commands():
-            task = app.add('task')
-            task.args = ' '.join(cmd)
-            task.job = deploy_target
-            task.target = ""
-            task.depends = os.path.join(c.paths.projectroot, c.paths.public_site_output)
+        if 'deploy_fanout' in c.runstate:
+            d.fanout = c.runstate.deploy_fanout
 
-            if c.runstate.dry_run is True:
+        if 'deploy_full' in c.runstate:
+            d.full = c.runstate.deploy_full
+
+        d.pool_size = c.runstate.pool_size
+
+        task = app.add('task')
+        task.args = [ d ]
+        task.job = run_deploy
+        task.target = ""
+        task.depends = os.path.join(c.paths.projectroot, c.paths.public_site_output)
+        task.description = 'deploying {0} to {1} hosts'.format(target, len(d.hosts))
+
+        if c.runstate.dry_run is True:
+            for cmd in d.deploy_commands():
                 logger.info('dry run: {0}'.format(' '.join(cmd)))
 
     logger.info('completed deploy for: {0}'.format(' '.join(c.runstate.push_targets)))
@@ -33,7 +33,8 @@ from giza.config.helper import fetch_config
 
 from giza.includes import (included_once, included_recusively,
                            includes_masked, include_files,
-                           include_files_unused, changed_includes)
+                           include_files_unused, changed_includes,
+                           affected_files)
 
 ## Helper
 
@@ -89,6 +90,22 @@ def graph(args):
 
         render_for_console(includes_masked(mask=mask, conf=c))
 
+@argh.arg('changed_files', nargs='+')
+@argh.expects_obj
+def affected(args):
+    c = fetch_config(args)
+
+    changed = []
+    for fn in c.runstate.changed_files:
+        if fn.startswith(c.paths.source + '/'):
+            fn = fn[len(c.paths.source):]
+        elif not fn.startswith('/'):
+            fn = '/' + fn
+
+        changed.append(fn)
+
+    render_for_console(affected_files(conf=c, changed=changed))
+
 @argh.expects_obj
 def clean(args):
     c = fetch_config(args)
@@ -15,12 +15,17 @@
 """
 Create and manipulate "packages" of build artifacts that can be used to quickly
 share and deploy artifacts and build environment data.
+
+Packages use the chunked format of :mod:`giza.tools.package`: they compress
+and extract in parallel, begin with an index that allows verifying them
+without extracting them, and extract while they download.
 """
 
 import logging
 import datetime
 import os
-import tarfile
+import shutil
+from contextlib import closing
 
 logger = logging.getLogger('giza.operations.packaging')
 
@@ -29,11 +34,18 @@ try:
 except ImportError:
     import pickle
 
+try:
+    from urllib2 import urlopen
+except ImportError:
+    from urllib.request import urlopen
+
 import argh
 
 from giza.config.helper import fetch_config
+from giza.core.app import BuildApp
 from giza.tools.serialization import dict_from_list
-from giza.tools.files import safe_create_directory, FileNotFoundError
+from giza.tools.files import FileNotFoundError
+from giza.tools.package import create_package_file, extract_package_file, verify_package
 from giza.operations.deploy import deploy_tasks
 
 ############### Helper ###############
@@ -71,14 +83,23 @@ def dump_config(conf):
 
     return conf_dump_path
 
-def create_archive(files_to_archive, tarball_name):
-    # ready to write the tarball
+def create_archive(files_to_archive, tarball_name, pool_size=None):
+    return create_package_file(tarball_name, files_to_archive, threads=pool_size)
 
-    safe_create_directory(os.path.dirname(tarball_name))
+def open_package(path):
+    """
+    :returns: A file object that reads the package at ``path``, which may be
+       a URL, so that extraction can begin while the package downloads.
+    """
 
-    with tarfile.open(tarball_name, 'w:gz') as t:
-        for fn, arc_fn in files_to_archive:
-            t.add(name=fn, arcname=arc_fn)
+    if path.startswith('http'):
+        return urlopen(path)
+    elif os.path.isfile(path):
+        return open(path, 'rb')
+    else:
+        msg = 'no archive named "{0}" exists'.format(path)
+        logger.error(msg)
+        raise FileNotFoundError(msg)
 
 #################### Worker Functions ####################
 
@@ -99,6 +120,9 @@ def create_package(target, conf):
         artifacts = (os.path.join(conf.paths.projectroot, conf.paths.output, pconf['paths']['local']),
                      os.path.split(pconf['paths']['local'])[-1])
 
+    # published trees are symbolic links to snapshots; archive the snapshot.
+    artifacts = (os.path.realpath(artifacts[0]), artifacts[1])
+
     files_to_archive.append(artifacts)
 
     if 'static' in pconf['paths']:
@@ -112,22 +136,14 @@ def create_package(target, conf):
     archive_fn = package_filename(target, conf)
     files_to_archive.append((conf_dump_path, os.path.basename(conf_dump_path)))
 
-    create_archive(files_to_archive, archive_fn)
+    create_archive(files_to_archive, archive_fn, conf.runstate.pool_size)
 
     logger.info('wrote build package to: {0}'.format(archive_fn))
 
 def extract_package(conf):
-    if conf.runstate.package_path.startswith('http'):
-        path = fetch_package(path, conf)
-    elif os.path.isfile(conf.runstate.package_path):
-        path = conf.runstate.package_path
-    else:
-        m = "package {0} does not exist".format(conf.runstate.package_path)
-        logger.critical(m)
-        raise GizaPackagingError(m)
-
-    with tarfile.open(path, "r:gz") as t:
-        t.extractall(os.path.join(conf.paths.projectroot, conf.paths.public))
+    with closing(open_package(conf.runstate.package_path)) as f:
+        extract_package_file(f, os.path.join(conf.paths.projectroot, conf.paths.public),
+                             threads=conf.runstate.pool_size)
 
     conf_extract_path = os.path.join(conf.paths.projectroot, conf.paths.branch_output, 'conf.pickle')
 
@@ -149,9 +165,9 @@ def fetch_package(path, conf):
                                 local_path)
 
         if not os.path.exists(tar_path):
-            with closing(urllib2.urlopen(path)) as u:
-                with open(tar_path, 'w') as f:
-                    f.write(u.read())
+            with closing(urlopen(path)) as u:
+                with open(tar_path, 'wb') as f:
+                    shutil.copyfileobj(u, f)
             logger.info('downloaded {0}'.format(local_path))
         else:
             logger.info('{0} exists locally, not downloading.'.format(local_path))
@@ -179,7 +195,6 @@ def create(args):
 def unwind(args):
     conf = fetch_config(args)
 
-    conf.runstate.package_path = fetch_package(conf.runstate.package_path, conf)
     logger.info('extracting package: ' + conf.runstate.package_path)
     extract_package(conf)
     logger.info('extracted package')
@@ -215,3 +230,16 @@ def fetch(args):
     else:
         logger.error('{0} is not a url'.format(conf.runstate.package_path))
         raise SystemExit
+
+@argh.arg('--path', dest='package_path')
+@argh.arg('--members', action='store_true', default=False, dest='verify_members')
+@argh.expects_obj
+def verify(args):
+    conf = fetch_config(args)
+
+    with closing(open_package(conf.runstate.package_path)) as f:
+        index = verify_package(f, members=conf.runstate.verify_members, threads=conf.runstate.pool_size)
+
+    logger.info('verified {0} members in {1} chunks of {2}'.format(len(index['members']),
+                                                                   len(index['chunks']),
+                                                                   conf.runstate.package_path))
@@ -22,6 +22,7 @@ import argh
 
 from giza.config.helper import fetch_config, get_builder_jobs, register_content_generators
 from giza.core.app import BuildApp
+from giza.core.pool import SerialPool, ThreadPool
 
 logger = logging.getLogger('giza.operations.sphinx')
 
@@ -34,11 +35,16 @@ from giza.content.table import table_tasks
 from giza.content.hash import hash_tasks
 from giza.content.source import source_tasks, latex_image_transfer_tasks
 from giza.content.dependencies import refresh_dependency_tasks, dump_file_hash_tasks
-from giza.content.sphinx import sphinx_tasks, output_sphinx_stream, finalize_sphinx_build
+from giza.content.changes import record_built_commit
+from giza.content.sphinx import (sphinx_tasks, output_sphinx_stream, finalize_sphinx_build,
+                                 get_timing_key)
+from giza.content.sphinx_engine import group_builds, sphinx_group_tasks
+from giza.content.sphinx_planner import sphinx_job_plan, record_timings
 from giza.content.redirects import redirect_tasks
 
 from giza.config.sphinx_config import render_sconf
 from giza.tools.timing import Timer
+from giza.tools.files import summarize_writes
 
 @argh.arg('--edition', '-e', nargs='*', dest='editions_to_build')
 @argh.arg('--language', '-l', nargs='*',dest='languages_to_build')
@@ -60,7 +66,7 @@ def main(args):
 ## sphinx_publication is its own function because it's called as part of some
 ## giza.operations.deploy tasks (i.e. ``push``).
 
-def sphinx_publication(c, args, app):
+def sphinx_publication(c, args, app, configs=None, content_types=None):
     """
     :arg Configuration c: A :class:`giza.config.main.Configuration()` object.
 
@@ -68,6 +74,13 @@ def sphinx_publication(c, args, app):
 
     :arg BuildApp app: A :class:`giza.core.app.BuildApp()` object.
 
+    :arg dict configs: Optional. Caches the configuration objects for each
+       (edition, language, builder) combination between calls.
+
+    :arg set content_types: Optional. The names of the content types (see
+       :mod:`giza.config.content`) to generate. Generates all content types by
+       default.
+
     Adds all required tasks to build a Sphinx site. Specifically:
 
     1. Iterates through the (language * builder * edition) combination and adds
@@ -95,13 +108,23 @@ def sphinx_publication(c, args, app):
 
     # this loop will produce an app for each language/edition/builder combination
     build_source_copies = set()
+    source_configs = []
+    command_builds = []
+    inprocess_builds = []
 
     for edition, language, builder in get_builder_jobs(c):
-        build_config, sconf = get_sphinx_build_configuration(edition, language, builder, args)
+        if configs is not None and (edition, language, builder) in configs:
+            build_config, sconf = configs[(edition, language, builder)]
+        else:
+            build_config, sconf = get_sphinx_build_configuration(edition, language, builder, args)
+
+            if configs is not None:
+                configs[(edition, language, builder)] = (build_config, sconf)
 
         # only do these tasks once per-language+edition combination
         if build_config.paths.branch_source not in build_source_copies:
             build_source_copies.add(build_config.paths.branch_source)
+            source_configs.append(build_config)
 
             prep_app = app.add('app')
             prep_app.conf = build_config
@@ -113,7 +136,7 @@ def sphinx_publication(c, args, app):
             # the content generation tasks are created properly
 
             # these operation groups each execute in isolation of each-other and should.
-            build_content_generation_tasks(build_config, prep_app.add('app'))
+            build_content_generation_tasks(build_config, prep_app.add('app'), content_types)
             refresh_dependency_tasks(build_config, prep_app.add('app'))
 
             # once the source is prepared, we dump a dict with md5 hashes of all
@@ -129,9 +152,50 @@ def sphinx_publication(c, args, app):
             logger.info(msg.format(builder, language, edition, build_config.paths.branch_source))
 
         # Add sphinx tasks for this builder/language/edition combination
-        sphinx_tasks(sconf, build_config, sphinx_app)
+        if build_config.system.sphinx_engine == 'inprocess':
+            inprocess_builds.append((sconf, build_config))
+        else:
+            command_builds.append((sconf, build_config))
         logger.info("adding builder job for {0} ({1}, {2})".format(builder, language, edition))
 
+    # builders that share a source tree share one in-process Sphinx
+    # environment.
+    groups = group_builds(inprocess_builds)
+
+    # divide the processors between the sphinx builds that run at the same
+    # time.
+    if isinstance(sphinx_app.pool, SerialPool):
+        concurrency = 1
+    else:
+        concurrency = c.runstate.pool_size
+
+    plan = [ [ get_timing_key(sconf) ] for sconf, build_config in command_builds ]
+    group_plan = [ [ get_timing_key(sconf) for sconf, build_config in group ]
+                   for group in groups.values() ]
+
+    if isinstance(sphinx_app.pool, ThreadPool) and len(groups) > 0:
+        # Sphinx and docutils keep global state, so in-process builds cannot
+        # run in threads of one process: build the groups one at a time after
+        # the sphinx-build tasks.
+        jobs = sphinx_job_plan(c, plan, concurrency)
+        group_jobs = sphinx_job_plan(c, group_plan, 1)
+
+        group_app = BuildApp(c)
+        group_app.pool = 'serial'
+    else:
+        jobs = sphinx_job_plan(c, plan + group_plan, concurrency)
+        group_jobs = jobs[len(command_builds):]
+
+        group_app = sphinx_app
+
+    for (sconf, build_config), build_jobs in zip(command_builds, jobs):
+        sphinx_tasks(sconf, build_config, sphinx_app, build_jobs)
+
+    sphinx_group_tasks(groups, group_app, group_jobs)
+
+    if group_app is not sphinx_app:
+        sphinx_app.add(group_app)
+
     # Connect the special sphinx app to the main app.
     app.add(sphinx_app)
 
@@ -139,6 +203,9 @@ def sphinx_publication(c, args, app):
     app.run()
     logger.info("sphinx build complete.")
 
+    changed, unchanged = summarize_writes(app.results)
+    logger.info('generated content: wrote {0} changed files, kept {1} unchanged files'.format(len(changed), unchanged))
+
     logger.info('builds finalized. sphinx output and errors to follow')
 
     # process the sphinx build. These oeprations allow us to de-duplicate
@@ -149,6 +216,17 @@ def sphinx_publication(c, args, app):
     # if entry points return this value, giza will inherit the sum of the Sphinx
     # build return codes.
     ret_code = sum([ o[0] for o in sphinx_app.results ])
+
+    timings = {}
+    for o in sphinx_app.results:
+        timings.update(o[2])
+    record_timings(c, timings)
+
+    if ret_code == 0:
+        for build_config in source_configs:
+            if build_config.system.change_detection == 'git':
+                record_built_commit(build_config)
+
     return ret_code
 
 def get_sphinx_build_configuration(edition, language, builder, args):
@@ -167,12 +245,15 @@ def get_sphinx_build_configuration(edition, language, builder, args):
 
     return conf, sconf
 
-def build_content_generation_tasks(conf, app):
+def build_content_generation_tasks(conf, app, content_types=None):
     """
     :param Configuration conf: The current build configuration object.
 
     :param BuildApp app: A :class:`~giza.core.app.BuildApp()` object.
 
+    :param set content_types: Optional. If specified, only run the task
+       generators for these content types.
+
     Add tasks to the ``app`` for all tasks that modify the content in
     ``build/<branch>/source`` directory.
     """
@@ -180,6 +261,9 @@ def build_content_generation_tasks(conf, app):
 
     with Timer("adding content tasks"):
         for content, func in conf.system.content.task_generators:
+            if content_types is not None and content.name not in content_types:
+                continue
+
             t = app.add('task')
             t.job = func
             t.args = [conf]
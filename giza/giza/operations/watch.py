@@ -0,0 +1,139 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Rebuilds a project whenever its source or configuration changes. ``giza
+watch`` keeps the configuration objects for every build and the include scan
+cache in memory between builds, and only reruns the content generators for
+the kinds of generated content whose source files changed.
+"""
+
+import logging
+import os.path
+
+import argh
+
+logger = logging.getLogger('giza.operations.watch')
+
+from giza.config.helper import fetch_config
+from giza.core.app import BuildApp
+from giza.operations.sphinx_cmds import sphinx_publication
+from giza.tools.timing import Timer
+from giza.tools.watch import get_watcher, wait_for_changes
+
+def affected_content_types(conf, changed):
+    """
+    :returns: The set of names of content types (i.e. ``steps`` or
+       ``options``) with source files in ``changed``.
+    """
+
+    includes_dir = os.path.join(conf.paths.projectroot, conf.paths.includes)
+
+    names = set()
+    for fn in changed:
+        if not fn.endswith('.yaml') or not fn.startswith(includes_dir):
+            continue
+
+        basename = fn[len(includes_dir)+1:]
+        for name, prefixes in conf.system.content.content_prefixes:
+            if any(basename.startswith(prefix) for prefix in prefixes):
+                names.add(name)
+
+    return names
+
+class WatchSession(object):
+    def __init__(self, conf, args):
+        self.conf = conf
+        self.args = args
+        self.configs = {}
+
+    @property
+    def config_dir(self):
+        return os.path.dirname(self.args.conf_path)
+
+    @property
+    def watched_paths(self):
+        return [ os.path.join(self.conf.paths.projectroot, self.conf.paths.source),
+                 self.config_dir ]
+
+    def build(self, content_types=None):
+        app = BuildApp(self.conf)
+        # run in threads so that caches in giza.includes persist between builds.
+        app.pool = 'thread'
+
+        try:
+            with Timer('incremental build'):
+                return sphinx_publication(self.conf, self.args, app,
+                                          configs=self.configs,
+                                          content_types=content_types)
+        finally:
+            app.close_pool()
+
+    def rebuild(self, changed):
+        if any(fn.startswith(self.config_dir) for fn in changed):
+            logger.info('configuration changed, reloading configuration')
+            self.conf = fetch_config(self.args)
+            self.configs = {}
+
+            return self.build()
+        else:
+            content_types = affected_content_types(self.conf, changed)
+            logger.info('{0} files changed, regenerating: {1}'.format(len(changed), ', '.join(sorted(content_types)) or 'none'))
+
+            return self.build(content_types)
+
+    def try_rebuild(self, changed=None):
+        """
+        Rebuilds for ``changed``, or runs a full build if ``changed`` is
+        ``None``. Logs errors rather than raising them, so that one failed
+        build does not stop the session.
+        """
+
+        try:
+            if changed is None:
+                return self.build()
+            else:
+                return self.rebuild(changed)
+        except Exception:
+            logger.exception('build failed, waiting for the next change')
+
+@argh.arg('--edition', '-e', nargs='*', dest='editions_to_build')
+@argh.arg('--language', '-l', nargs='*',dest='languages_to_build')
+@argh.arg('--builder', '-b', nargs='*', default='html')
+@argh.arg('--serial_sphinx', action='store_true')
+@argh.arg('--poll', action='store_true', default=False, dest='poll')
+@argh.arg('--debounce', type=float, default=0.5, dest='debounce')
+@argh.named('watch')
+@argh.expects_obj
+def main(args):
+    """
+    Build the project, then rebuild it when the source or configuration
+    changes. Uses inotify if pyinotify is installed, and otherwise polls.
+    """
+
+    c = fetch_config(args)
+    session = WatchSession(c, args)
+    session.try_rebuild()
+
+    watcher = get_watcher(session.watched_paths, poll=args.poll)
+    logger.info('watching for changes in: {0}'.format(', '.join(session.watched_paths)))
+
+    try:
+        while True:
+            changed = wait_for_changes(watcher, args.debounce)
+            session.try_rebuild(changed)
+    except KeyboardInterrupt:
+        logger.info('stopped watching for changes')
+    finally:
+        watcher.close()
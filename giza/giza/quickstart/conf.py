@@ -31,6 +31,7 @@ extensions = [
     'mongodb',
     'directives',
     'intermanual',
+    'giza.sphinxext',
 ]
 
 locale_dirs = [ os.path.join(conf.paths.projectroot, conf.paths.locale) ]
@@ -0,0 +1,188 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A Sphinx extension that connects giza's dependency resolution to Sphinx. Add
+``giza.sphinxext`` to the ``extensions`` list in ``conf.py``.
+
+When ``targeted_rebuilds`` is set in the ``system`` section of the project
+configuration, :func:`giza.content.dependencies.refresh_deps()` writes the
+names of all documents affected by changed include files to a JSON file,
+rather than bumping the ``mtime`` of every affected file.
+:func:`giza.content.sphinx.run_sphinx()` passes the path of this file to
+``sphinx-build`` in the ``GIZA_CHANGED_DOCUMENTS`` environment variable, and
+this extension reports those documents as outdated with the
+``env-get-outdated`` event. Sphinx still checks the ``mtime`` of every
+document. giza only relies on this event, rather than bumping timestamps,
+when Sphinx provides it and the project's ``conf.py`` lists this extension.
+
+When the ``GIZA_PHASE_TIMINGS`` environment variable names a file, this
+extension writes the time that Sphinx spent reading and writing to that file
+at the end of the build. :mod:`giza.content.sphinx_planner` uses these
+durations to divide processors between concurrent builds.
+
+In-process builds share one environment between threads, so
+:mod:`giza.content.sphinx_engine` sets the ``giza_changed_documents`` and
+``giza_phase_timings`` configuration values of each Sphinx application
+instead, which take precedence over the environment variables.
+"""
+
+import ast
+import json
+import logging
+import os
+import time
+
+import pkg_resources
+
+logger = logging.getLogger('giza.sphinxext')
+
+changed_documents_variable = 'GIZA_CHANGED_DOCUMENTS'
+changed_documents_config = 'giza_changed_documents'
+
+def has_outdated_hook():
+    """
+    :returns: ``True`` if the installed version of Sphinx provides the
+       ``env-get-outdated`` event, which was added in Sphinx 1.3.
+    """
+
+    version = pkg_resources.get_distribution("sphinx").version
+
+    return pkg_resources.parse_version(version) >= pkg_resources.parse_version('1.3')
+
+def _literal(node):
+    # ast.Str in Python 2, ast.Constant in later versions of Python 3.
+    if type(node).__name__ == 'Str':
+        return node.s
+    elif type(node).__name__ == 'Constant':
+        return node.value
+    else:
+        return None
+
+def extension_enabled(conf_fn, name='giza.sphinxext'):
+    """
+    :returns: ``True`` if the Sphinx configuration file ``conf_fn`` adds
+       ``name`` to ``extensions``. Only finds names that are string literals
+       in assignments to ``extensions`` or in calls to its ``append()``,
+       ``extend()`` or ``insert()`` methods.
+    """
+
+    try:
+        with open(conf_fn) as f:
+            tree = ast.parse(f.read(), conf_fn)
+    except (IOError, OSError, SyntaxError):
+        return False
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign):
+            targets = node.targets
+            values = [ node.value ]
+        elif isinstance(node, ast.AugAssign):
+            targets = [ node.target ]
+            values = [ node.value ]
+        elif (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and
+              node.func.attr in ('append', 'extend', 'insert')):
+            targets = [ node.func.value ]
+            values = node.args
+        else:
+            continue
+
+        if not any(isinstance(t, ast.Name) and t.id == 'extensions' for t in targets):
+            continue
+
+        for value in values:
+            if any(_literal(n) == name for n in ast.walk(value)):
+                return True
+
+    return False
+
+def to_docname(fn):
+    """
+    Converts a source file name in the form that :mod:`giza.includes` uses
+    (i.e. ``/tutorial/install.txt``) into a Sphinx docname.
+    """
+
+    return os.path.splitext(fn.lstrip('/'))[0]
+
+def read_changed_documents(fn):
+    if fn is None or not os.path.isfile(fn):
+        return []
+
+    with open(fn, 'r') as f:
+        try:
+            return json.load(f)
+        except ValueError:
+            logger.warning('could not read list of changed documents from: ' + fn)
+            return []
+
+def get_setting(app, name, variable):
+    """
+    :returns: The configuration value ``name`` of the Sphinx application, if
+       set, and otherwise the environment variable ``variable``.
+    """
+
+    value = getattr(getattr(app, 'config', None), name, None)
+
+    if value is None:
+        return os.environ.get(variable)
+    else:
+        return value
+
+def get_outdated(app, env, added, changed, removed):
+    docnames = read_changed_documents(get_setting(app, changed_documents_config,
+                                                  changed_documents_variable))
+
+    return [ docname for docname in docnames
+             if docname in env.found_docs and
+             docname not in added and docname not in changed ]
+
+phase_timings_variable = 'GIZA_PHASE_TIMINGS'
+phase_timings_config = 'giza_phase_timings'
+
+def start_phase_timer(app):
+    app.giza_phase_marks = [time.time()]
+
+def mark_read_complete(app, env):
+    marks = getattr(app, 'giza_phase_marks', None)
+
+    if marks is not None and len(marks) == 1:
+        marks.append(time.time())
+
+def write_phase_timings(app, exception):
+    fn = get_setting(app, phase_timings_config, phase_timings_variable)
+    marks = getattr(app, 'giza_phase_marks', None)
+
+    if fn is None or exception is not None or marks is None:
+        return
+
+    end = time.time()
+    if len(marks) == 1:
+        # sphinx doesn't emit env-updated when no document changed.
+        marks.append(marks[0])
+
+    with open(fn, 'w') as f:
+        json.dump({ 'read': marks[1] - marks[0], 'write': end - marks[1] }, f)
+
+def setup(app):
+    app.add_config_value(changed_documents_config, None, '')
+    app.add_config_value(phase_timings_config, None, '')
+
+    app.connect('builder-inited', start_phase_timer)
+    app.connect('env-updated', mark_read_complete)
+    app.connect('build-finished', write_phase_timings)
+
+    if has_outdated_hook() is True:
+        app.connect('env-get-outdated', get_outdated)
+    else:
+        logger.debug('this version of Sphinx cannot accept targeted rebuilds from giza')
@@ -139,6 +139,33 @@ def command(command, capture=True, ignore=False, logger=None):
     else:
         raise CommandError('"{0}" returned code {1}'.format(out.cmd, out.return_code))
 
+def stream_command(command, callback, ignore=False):
+    """
+    Runs a shell command and calls ``callback`` with each line of its
+    combined standard output and standard error as the line appears. Returns
+    a :class:`~giza.command.CommandResult` object without captured output.
+    """
+
+    if isinstance(command, (list, tuple)):
+        command = ' '.join(command)
+
+    logger.debug("running '{0}'".format(command))
+
+    p = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                         shell=True, universal_newlines=True)
+
+    for line in iter(p.stdout.readline, ''):
+        callback(line)
+
+    p.stdout.close()
+
+    out = CommandResult(cmd=command, err='', out='', return_code=p.wait())
+
+    if out.succeeded is True or ignore is True:
+        return out
+    else:
+        raise CommandError('"{0}" returned code {1}'.format(out.cmd, out.return_code))
+
 def verbose_command(cmd, capture=False, ignore=False):
     """
     .. deprecated:: 0.2.7
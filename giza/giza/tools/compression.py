@@ -0,0 +1,376 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Creates reproducible, compressed tarballs, using all processors.
+
+:class:`~giza.tools.compression.ParallelGzipWriter` splits its input into
+blocks and compresses the blocks independently in threads, like ``pigz``. Each
+block ends with a sync flush, so the concatenated blocks form a single
+standard deflate stream that any ``gzip`` implementation can read. zlib
+releases the interpreter lock while it compresses, so the threads run in
+parallel. On Python 3, each block uses the end of the previous block as a
+preset dictionary, as ``pigz`` does, so that splitting the input costs almost
+no compression; Python 2's zlib module cannot set a dictionary, so blocks are
+larger there.
+
+:func:`~giza.tools.compression.tarball()` adds members in sorted order with
+normalized owners, permissions and modification times, so that the same tree
+always produces the same archive. The archive header records a digest of the
+tree, and when an existing archive has the same digest, ``tarball()`` leaves
+it in place rather than compressing the tree again.
+
+If the optional :mod:`zstandard` package is installed, ``tarball()`` writes
+``.tar.zst`` archives with zstd's own threaded compressor.
+"""
+
+import hashlib
+import json
+import logging
+import multiprocessing
+import multiprocessing.dummy
+import os
+import struct
+import tarfile
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger('giza.tools.compression')
+
+from giza.core.git import GitError, GitRepo
+from giza.tools.files import hash_files, safe_create_directory
+
+digest_prefix = b'giza-tree-digest:'
+
+########## Parallel gzip ##########
+
+try:
+    zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS, zlib.DEF_MEM_LEVEL, 0, b'')
+    preset_dictionaries = True
+except TypeError:
+    preset_dictionaries = False
+
+dictionary_size = 2**15
+
+def _deflate_block(args):
+    block, dictionary, level = args
+
+    if dictionary is None:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS,
+                                      zlib.DEF_MEM_LEVEL, 0, dictionary)
+
+    return compressor.compress(block) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+class ParallelGzipWriter(object):
+    """
+    A write-only file object that writes a gzip stream to ``fileobj``.
+
+    :param bytes comment: Optional. Stored in the ``FCOMMENT`` field of the
+       gzip header.
+    """
+
+    def __init__(self, fileobj, level=6, threads=None, block_size=None, comment=None):
+        self.fileobj = fileobj
+        self.level = level
+
+        if block_size is None:
+            block_size = 2**17 if preset_dictionaries is True else 2**20
+
+        self.block_size = block_size
+
+        if threads is None:
+            threads = multiprocessing.cpu_count()
+
+        self.threads = threads
+        self.pool = multiprocessing.dummy.Pool(threads)
+
+        self.crc = 0
+        self.size = 0
+        self.buffer = []
+        self.buffered = 0
+        self.blocks = []
+        self.dictionary = None
+
+        # magic, deflate, flags, mtime 0, no extra flags, unknown OS.
+        flags = 0 if comment is None else 0x10
+        self.fileobj.write(struct.pack('<BBBBIBB', 0x1f, 0x8b, 8, flags, 0, 0, 255))
+        if comment is not None:
+            self.fileobj.write(comment + b'\0')
+
+    def write(self, data):
+        self.crc = zlib.crc32(data, self.crc)
+        self.size += len(data)
+
+        self.buffer.append(data)
+        self.buffered += len(data)
+
+        if self.buffered >= self.block_size:
+            data = b''.join(self.buffer)
+            offset = 0
+            while len(data) - offset >= self.block_size:
+                self.blocks.append(data[offset:offset+self.block_size])
+                offset += self.block_size
+
+            self.buffer = [ data[offset:] ]
+            self.buffered = len(data) - offset
+
+            if len(self.blocks) >= self.threads * 4:
+                self._compress_blocks()
+
+    def _compress_blocks(self):
+        jobs = []
+        for block in self.blocks:
+            jobs.append((block, self.dictionary, self.level))
+
+            if preset_dictionaries is True:
+                self.dictionary = block[-dictionary_size:]
+
+        for compressed in self.pool.map(_deflate_block, jobs):
+            self.fileobj.write(compressed)
+
+        self.blocks = []
+
+    def close(self):
+        if self.pool is None:
+            return
+
+        if self.buffered > 0:
+            self.blocks.append(b''.join(self.buffer))
+            self.buffer = []
+            self.buffered = 0
+
+        self._compress_blocks()
+
+        self.pool.close()
+        self.pool.join()
+        self.pool = None
+
+        # an empty final block ends the deflate stream.
+        self.fileobj.write(zlib.compressobj(self.level, zlib.DEFLATED, -zlib.MAX_WBITS).flush(zlib.Z_FINISH))
+        self.fileobj.write(struct.pack('<II', self.crc & 0xffffffff, self.size & 0xffffffff))
+
+def read_gzip_comment(fn):
+    """
+    :returns: The ``FCOMMENT`` field of the gzip file ``fn``, or ``None``.
+    """
+
+    with open(fn, 'rb') as f:
+        head = f.read(10)
+        if len(head) < 10 or head[:2] != b'\x1f\x8b':
+            return None
+
+        flags = bytearray(head)[3]
+        if flags & 0x04:
+            extra_length = struct.unpack('<H', f.read(2))[0]
+            f.read(extra_length)
+
+        fields = []
+        for flag in (0x08, 0x10):
+            if flags & flag:
+                value = []
+                while True:
+                    c = f.read(1)
+                    if c in (b'', b'\0'):
+                        break
+                    value.append(c)
+                fields.append(b''.join(value))
+            else:
+                fields.append(None)
+
+        return fields[1]
+
+########## zstd ##########
+
+# the first of the 16 magic numbers that mark skippable zstd frames.
+zstd_skippable_magic = 0x184D2A50
+
+def read_zstd_comment(fn):
+    with open(fn, 'rb') as f:
+        head = f.read(8)
+        if len(head) < 8:
+            return None
+
+        magic, length = struct.unpack('<II', head)
+        if magic != zstd_skippable_magic:
+            return None
+
+        return f.read(length)
+
+########## Reproducible Tarballs ##########
+
+def get_compression(name):
+    """
+    :returns: ``zstd`` for file names that end with ``.zst`` and ``gzip``
+       otherwise.
+    """
+
+    if name.endswith('.zst'):
+        return 'zstd'
+    else:
+        return 'gzip'
+
+def get_source_date(path):
+    """
+    :returns: ``SOURCE_DATE_EPOCH``, or the time of the last commit of the git
+       repository that contains ``path``, or 0 outside of a repository.
+    """
+
+    if 'SOURCE_DATE_EPOCH' in os.environ:
+        return int(os.environ['SOURCE_DATE_EPOCH'])
+
+    if not os.path.isdir(path):
+        path = os.path.dirname(path)
+
+    try:
+        return GitRepo(path).commit_time()
+    except (GitError, ValueError):
+        return 0
+
+def _list_members(path, arcname):
+    # returns (arcname, full path) tuples in sorted order, directories before
+    # their contents.
+    members = [ (arcname, path) ]
+
+    if os.path.isdir(path) and not os.path.islink(path):
+        for root, dirs, files in os.walk(path):
+            rel_root = os.path.relpath(root, path)
+
+            for name in sorted(dirs + files):
+                rel = name if rel_root == '.' else os.path.join(rel_root, name)
+                members.append((os.path.join(arcname, rel), os.path.join(root, name)))
+
+    return sorted(members)
+
+def _normalized_info(member, arcname, mtime):
+    info = tarfile.TarInfo(arcname)
+    st = os.lstat(member)
+
+    info.mtime = mtime
+    info.uid = info.gid = 0
+    info.uname = info.gname = ''
+
+    if os.path.islink(member):
+        info.type = tarfile.SYMTYPE
+        info.linkname = os.readlink(member)
+        info.mode = 0o777
+    elif os.path.isdir(member):
+        info.type = tarfile.DIRTYPE
+        info.mode = 0o755
+    else:
+        info.type = tarfile.REGTYPE
+        info.size = st.st_size
+        info.mode = 0o755 if st.st_mode & 0o100 else 0o644
+
+    return info
+
+def tree_digest(members, mtime, compression, level, pool_size=None):
+    """
+    :returns: A digest of the names, types, normalized metadata and content
+       of ``members``, and of the compression settings.
+    """
+
+    if pool_size is None:
+        pool_size = multiprocessing.cpu_count()
+
+    infos = [ _normalized_info(member, arcname, mtime) for arcname, member in members ]
+    hashes = hash_files([ member for (_, member), info in zip(members, infos) if info.isreg() ],
+                        pool_size=pool_size)
+
+    h = hashlib.sha1()
+    h.update(json.dumps([compression, level, mtime]).encode('utf-8'))
+    for (_, member), info in zip(members, infos):
+        record = [info.name, info.type.decode('ascii') if isinstance(info.type, bytes) else info.type,
+                  info.mode, info.linkname, hashes[member][0] if info.isreg() else None]
+        h.update(json.dumps(record).encode('utf-8'))
+
+    return h.hexdigest().encode('ascii')
+
+def _write_members(t, members, mtime):
+    for arcname, member in members:
+        info = _normalized_info(member, arcname, mtime)
+
+        if info.isreg():
+            with open(member, 'rb') as f:
+                t.addfile(info, f)
+        else:
+            t.addfile(info)
+
+def tarball(name, path, newp=None, cdir=None, level=6, threads=None):
+    """
+    Creates a reproducible tarball ``name`` that contains ``path``, as
+    ``newp/<basename of path>`` if ``newp`` is specified. Relative paths are
+    relative to ``cdir``. Uses zstd if ``name`` ends with ``.zst``.
+
+    Modification times are set to the time from
+    :func:`~giza.tools.compression.get_source_date()`.
+
+    :returns: ``True`` if the tarball was written, and ``False`` if the
+       existing tarball already contains the same tree.
+    """
+
+    compression = get_compression(name)
+    if compression == 'zstd' and zstandard is None:
+        raise ValueError('cannot create {0}: zstandard is not installed'.format(name))
+
+    safe_create_directory(os.path.dirname(name))
+
+    if cdir is not None:
+        path = os.path.join(cdir, path)
+
+    if newp is not None:
+        arcname = os.path.join(newp, os.path.basename(path))
+    else:
+        arcname = path.lstrip(os.path.sep)
+
+    mtime = get_source_date(path)
+    members = _list_members(path, arcname)
+    comment = digest_prefix + tree_digest(members, mtime, compression, level, threads)
+
+    if os.path.isfile(name):
+        if compression == 'zstd':
+            existing = read_zstd_comment(name)
+        else:
+            existing = read_gzip_comment(name)
+
+        if existing == comment:
+            logger.info('tarball {0} is up to date'.format(name))
+            return False
+
+    tmp = os.path.join(os.path.dirname(name), '.' + os.path.basename(name) + '.tmp')
+    with open(tmp, 'wb') as f:
+        if compression == 'zstd':
+            f.write(struct.pack('<II', zstd_skippable_magic, len(comment)) + comment)
+            writer = zstandard.ZstdCompressor(level=level, threads=threads or -1).stream_writer(f)
+        else:
+            writer = ParallelGzipWriter(f, level=level, threads=threads, comment=comment)
+
+        t = tarfile.open(fileobj=writer, mode='w|', format=tarfile.GNU_FORMAT)
+        _write_members(t, members, mtime)
+        t.close()
+
+        if compression == 'zstd':
+            writer.flush(zstandard.FLUSH_FRAME)
+        else:
+            writer.close()
+
+    os.rename(tmp, name)
+    logger.info('created tarball: {0}'.format(name))
+
+    return True
@@ -12,12 +12,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
+import filecmp
 import hashlib
+import io
 import os
 import shutil
-import tarfile
+import tempfile
 import logging
 import contextlib
+import multiprocessing.dummy
 
 logger = logging.getLogger('giza.files')
 
@@ -69,31 +73,13 @@ def verbose_remove(path):
         os.remove(path)
 
 def rm_rf(path):
-    if os.path.isdir(path):
+    if os.path.islink(path):
+        os.remove(path)
+    elif os.path.isdir(path):
         shutil.rmtree(path)
     elif os.path.exists(path):
         os.remove(path)
 
-def tarball(name, path, newp=None, cdir=None):
-    tarball_path = os.path.dirname(name)
-    safe_create_directory(tarball_path)
-
-    logger.debug('creating tarball: {0}'.format(name))
-    with tarfile.open(name, 'w:gz') as t:
-        if newp is not None:
-            arcname = os.path.join(newp, os.path.basename(path))
-        else:
-            arcname = None
-
-        if cdir is not None:
-            path = os.path.join(cdir, path)
-
-        logger.debug('tarball internal path {0}'.format(path))
-
-        t.add(name=path, arcname=arcname)
-
-    logger.info('created tarball: {0}'.format(name))
-
 def symlink(name, target):
     if not os.path.islink(name):
         try:
@@ -137,6 +123,117 @@ def md5_file(file, block_size=2**20):
 
     return md5.hexdigest()
 
+########## Content Hashing ##########
+
+# prefer the fastest available digest: xxhash is an optional dependency, and
+# blake2b is only available in newer versions of hashlib.
+try:
+    import xxhash
+
+    hash_algorithm = 'xxh64'
+    _new_hash = xxhash.xxh64
+except ImportError:
+    if hasattr(hashlib, 'blake2b'):
+        hash_algorithm = 'blake2b'
+        def _new_hash():
+            return hashlib.blake2b(digest_size=16)
+    else:
+        hash_algorithm = 'md5'
+        _new_hash = hashlib.md5
+
+def hash_file(fn, block_size=2**20):
+    h = _new_hash()
+
+    with open(fn, 'rb') as f:
+        for chunk in iter(lambda: f.read(block_size), b''):
+            h.update(chunk)
+
+    return h.hexdigest()
+
+def stat_signature(fn):
+    """
+    :returns: A ``[size, mtime_ns, inode]`` list for ``fn``.
+    """
+
+    st = os.stat(fn)
+
+    try:
+        mtime = st.st_mtime_ns
+    except AttributeError:
+        mtime = int(st.st_mtime * 1000000000)
+
+    return [st.st_size, mtime, st.st_ino]
+
+def file_signature(fn, previous=None):
+    """
+    :param list previous: A signature from an earlier call.
+
+    :returns: A ``[digest, size, mtime_ns, inode]`` list for ``fn``. Reuses
+       the digest in ``previous`` without reading the file, if the stat
+       information in ``previous`` matches the file.
+    """
+
+    sig = stat_signature(fn)
+
+    if isinstance(previous, list) and previous[1:] == sig:
+        return previous
+    else:
+        sig.insert(0, hash_file(fn))
+        return sig
+
+def hash_files(files, previous=None, pool_size=1):
+    """
+    :param list files: A list of file names.
+
+    :param dict previous: A mapping of file names to signatures from an
+       earlier call.
+
+    :param int pool_size: The number of threads that hash files.
+
+    :returns: A mapping of file names to ``[digest, size, mtime_ns, inode]``
+       signatures. Only files whose stat information changed are read.
+    """
+
+    if previous is None:
+        previous = {}
+
+    def signature(fn):
+        try:
+            return fn, file_signature(fn, previous.get(fn))
+        except (OSError, IOError):
+            return fn, None
+
+    if pool_size > 1 and len(files) > 1:
+        p = multiprocessing.dummy.Pool(pool_size)
+        try:
+            results = p.map(signature, files)
+        finally:
+            p.close()
+            p.join()
+    else:
+        results = [ signature(fn) for fn in files ]
+
+    return dict((fn, sig) for fn, sig in results if sig is not None)
+
+def atomic_copy(source_file, target_file):
+    """
+    Copies ``source_file`` to a temporary file and renames it over
+    ``target_file``. Unlike :func:`shutil.copyfile()`, never writes into an
+    existing ``target_file``, which may be a hard link that other trees share.
+    """
+
+    fd, tmp_fn, mode = _create_temporary_file(target_file)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            with open(source_file, 'rb') as src:
+                shutil.copyfileobj(src, f)
+        os.chmod(tmp_fn, mode)
+        os.rename(tmp_fn, target_file)
+    except:
+        if os.path.exists(tmp_fn):
+            os.remove(tmp_fn)
+        raise
+
 def copy_always(source_file, target_file, name='build'):
     if os.path.isfile(source_file) is False:
         msg = "{0}: Input file '{1}' does not exist.".format(name, source_file)
@@ -144,7 +241,7 @@ def copy_always(source_file, target_file, name='build'):
         raise FileOperationError(msg)
     else:
         safe_create_directory(os.path.dirname(target_file))
-        shutil.copyfile(source_file, target_file)
+        atomic_copy(source_file, target_file)
 
     logger.debug('{0}: copied {1} to {2}'.format(name, source_file, target_file))
 
@@ -155,7 +252,7 @@ def copy_if_needed(source_file, target_file, name='build'):
         raise FileOperationError(msg)
     elif os.path.isfile(target_file) is False:
         safe_create_directory(os.path.dirname(target_file))
-        shutil.copyfile(source_file, target_file)
+        atomic_copy(source_file, target_file)
 
         if name is not None:
             logger.debug('{0}: created "{1}" which did not exist.'.format(name, target_file))
@@ -164,7 +261,7 @@ def copy_if_needed(source_file, target_file, name='build'):
             if name is not None:
                 logger.debug('{0}: "{1}" not changed.'.format(name, source_file))
         else:
-            shutil.copyfile(source_file, target_file)
+            atomic_copy(source_file, target_file)
 
             if name is not None:
                 logger.debug('{0}: "{1}" changed. Updated: {2}'.format(name, source_file, target_file))
@@ -195,6 +292,151 @@ def create_link(input_fn, output_fn):
         os.rename(out_base, output_fn)
         logger.debug('{0} created symbolic link pointing to "{1}" named "{2}"'.format('symlink', input_fn, out_base))
 
+########## Output Writing ##########
+
+WriteResult = collections.namedtuple('WriteResult', ['path', 'changed'])
+
+# os.umask() can only read the umask by setting it, which would briefly
+# change the mode of files that other threads create, so read it once.
+_umask = os.umask(0)
+os.umask(_umask)
+
+def _output_bytes(content):
+    if isinstance(content, (list, tuple)):
+        content = '\n'.join(content) + '\n'
+
+    if not isinstance(content, bytes):
+        content = content.encode('utf-8')
+
+    return content
+
+def _create_temporary_file(fn):
+    # returns the descriptor and name of a new file next to ``fn``, and the
+    # mode that ``fn`` should have when the temporary file replaces it.
+    dirname = os.path.dirname(fn)
+    if dirname != '':
+        safe_create_directory(dirname)
+
+    if os.path.exists(fn):
+        mode = os.stat(fn).st_mode & 0o777
+    else:
+        mode = 0o666 & ~_umask
+
+    fd, tmp_fn = tempfile.mkstemp(dir=dirname or None,
+                                  prefix='.' + os.path.basename(fn) + '.')
+
+    return fd, tmp_fn, mode
+
+def atomic_write(fn, content):
+    """
+    Writes ``content`` to a temporary file in the same directory as ``fn`` and
+    renames the temporary file over ``fn``, so that readers never observe a
+    partially written file.
+    """
+
+    fd, tmp_fn, mode = _create_temporary_file(fn)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.chmod(tmp_fn, mode)
+        os.rename(tmp_fn, fn)
+    except:
+        if os.path.exists(tmp_fn):
+            os.remove(tmp_fn)
+        raise
+
+def atomic_write_lines(fn, lines, if_changed=False):
+    """
+    Like :func:`~giza.tools.files.atomic_write()`, but writes the unicode
+    strings in the iterable ``lines`` as UTF-8, each followed by a newline, as
+    it consumes them, so that the content of ``fn`` is never in memory at
+    once.
+
+    :param bool if_changed: If ``True``, leaves ``fn`` and its ``mtime`` in
+       place when it already has the new content.
+
+    :returns: A :class:`~giza.tools.files.WriteResult`.
+    """
+
+    fd, tmp_fn, mode = _create_temporary_file(fn)
+    try:
+        with io.open(fd, 'w', encoding='utf-8', newline='\n') as f:
+            for line in lines:
+                f.write(line)
+                f.write(u'\n')
+
+        if if_changed is True and os.path.isfile(fn) and filecmp.cmp(tmp_fn, fn, shallow=False):
+            os.remove(tmp_fn)
+            logger.debug('output "{0}" not changed.'.format(fn))
+            return WriteResult(fn, False)
+
+        os.chmod(tmp_fn, mode)
+        os.rename(tmp_fn, fn)
+    except:
+        if os.path.exists(tmp_fn):
+            os.remove(tmp_fn)
+        raise
+
+    return WriteResult(fn, True)
+
+def write_if_changed(fn, content):
+    """
+    Writes ``content`` to ``fn`` only if the file does not already hold exactly
+    these bytes. Unchanged files keep their ``mtime``, so Sphinx does not
+    re-read pages that giza regenerates with identical content.
+
+    :param string fn: The path of the output file.
+
+    :param content: A string, or a list of lines as produced by
+       :class:`rstcloth.rstcloth.RstCloth` or :class:`rstcloth.table.TableBuilder`.
+
+    :returns: A :class:`~giza.tools.files.WriteResult` that records whether
+       the file changed.
+    """
+
+    content = _output_bytes(content)
+
+    try:
+        if os.path.getsize(fn) == len(content):
+            with open(fn, 'rb') as f:
+                if f.read() == content:
+                    logger.debug('output "{0}" not changed.'.format(fn))
+                    return WriteResult(fn, False)
+    except (OSError, IOError):
+        pass
+
+    atomic_write(fn, content)
+
+    return WriteResult(fn, True)
+
+def summarize_writes(results):
+    """
+    Collects the :class:`~giza.tools.files.WriteResult` objects from a
+    :attr:`~giza.core.app.BuildApp.results` list, including those returned in
+    lists by tasks that write more than one file.
+
+    :returns: A tuple of a list of changed paths and the number of unchanged
+       outputs.
+    """
+
+    changed = []
+    unchanged = 0
+
+    stack = list(results)
+    while len(stack) > 0:
+        r = stack.pop()
+        if isinstance(r, WriteResult):
+            if r.changed is True:
+                changed.append(r.path)
+            else:
+                unchanged += 1
+        elif isinstance(r, list):
+            stack.extend(r)
+
+    changed.sort()
+
+    return changed, unchanged
+
 def decode_lines_from_file(fn):
     with open(fn, 'r') as f:
         return [ line.decode('utf-8').rstrip() for line in f.readlines() ]
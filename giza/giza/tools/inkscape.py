@@ -0,0 +1,231 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Renders ``svg`` files with ``inkscape``, starting inkscape only once for many
+images, and caches rendered images by content.
+
+:class:`~giza.tools.inkscape.InkscapeShell` runs ``inkscape --shell``, which
+reads one set of command line arguments per line and prints a ``>`` prompt
+when it is ready for the next line, so that each image costs only its export
+and not inkscape's startup.
+
+:class:`~giza.tools.inkscape.ImageCache` stores rendered images under a key
+derived from the digest of the ``svg`` file and the export settings, so that
+builds of other editions or branches copy identical images rather than
+rendering them again.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+logger = logging.getLogger('giza.tools.inkscape')
+
+from giza.tools.files import atomic_copy, hash_file, safe_create_directory
+
+class InkscapeError(Exception):
+    pass
+
+def get_inkscape_cmd():
+    if sys.platform in ['linux', 'linux2']:
+        return '/usr/bin/inkscape'
+    elif sys.platform == 'darwin':
+        inkscape = '/Applications/Inkscape.app/Contents/Resources/bin/inkscape'
+        if os.path.exists(inkscape):
+            return inkscape
+
+    return 'inkscape'
+
+def get_export_args(source, target, dpi, width, build_type):
+    """
+    :returns: The inkscape arguments that export ``source`` to ``target`` as
+       an ``eps`` file or as a ``png`` file with a transparent background.
+    """
+
+    args = [ source, '-z', '-d', str(dpi), '-w', str(width) ]
+
+    if build_type == 'eps':
+        args.extend([ '-y', '1.0', '-E', target ])
+    else:
+        args.extend([ '-y', '0.0', '-e', target ])
+
+    return args
+
+class InkscapeShell(object):
+    """
+    A running ``inkscape --shell`` process. Use as a context manager, or call
+    :meth:`~giza.tools.inkscape.InkscapeShell.close()`.
+
+    :param list cmd: Optional. The command that starts inkscape, without the
+       ``--shell`` option.
+    """
+
+    def __init__(self, cmd=None):
+        if cmd is None:
+            cmd = [ get_inkscape_cmd() ]
+
+        with open(os.devnull, 'w') as devnull:
+            self.process = subprocess.Popen(cmd + [ '--shell' ],
+                                            stdin=subprocess.PIPE,
+                                            stdout=subprocess.PIPE,
+                                            stderr=devnull)
+
+        self._read_prompt()
+        logger.debug('started inkscape shell: ' + ' '.join(cmd))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _read_prompt(self):
+        # returns the output up to the next prompt, which is a ">" at the
+        # beginning of a line.
+        output = bytearray()
+
+        while True:
+            c = self.process.stdout.read(1)
+            if c == b'':
+                raise InkscapeError('inkscape exited unexpectedly: ' + output.decode('utf-8', 'replace'))
+            elif c == b'>' and (len(output) == 0 or output[-1:] == b'\n'):
+                return output.decode('utf-8', 'replace')
+
+            output.extend(c)
+
+    def run(self, args):
+        """
+        Runs inkscape with ``args`` in the shell.
+
+        :returns: The output of inkscape.
+        """
+
+        line = ' '.join(quote(arg) for arg in args) + '\n'
+        self.process.stdin.write(line.encode('utf-8'))
+        self.process.stdin.flush()
+
+        return self._read_prompt()
+
+    def export(self, source, target, dpi, width, build_type):
+        if os.path.exists(target):
+            os.remove(target)
+
+        output = self.run(get_export_args(source, target, dpi, width, build_type))
+
+        if not os.path.isfile(target):
+            raise InkscapeError('inkscape did not create {0}: {1}'.format(target, output.strip()))
+
+        logger.info('generated image file {0}'.format(target))
+
+    def close(self):
+        if self.process is None:
+            return
+
+        try:
+            self.process.stdin.write(b'quit\n')
+            self.process.stdin.close()
+        except (IOError, OSError):
+            pass
+
+        self.process.wait()
+        self.process = None
+
+class ImageCache(object):
+    """
+    A directory of rendered images, named by the digest of their source and
+    export settings.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def key(self, source, dpi, width, build_type):
+        settings = json.dumps([ hash_file(source), str(dpi), str(width), build_type ])
+        return hashlib.sha1(settings.encode('utf-8')).hexdigest()
+
+    def _fn(self, key, build_type):
+        return os.path.join(self.path, key[:2], key + '.' + build_type)
+
+    def fetch(self, key, build_type, target):
+        """
+        Copies the cached image for ``key`` to ``target``.
+
+        :returns: ``True`` if the cache had the image.
+        """
+
+        fn = self._fn(key, build_type)
+        if not os.path.isfile(fn):
+            return False
+
+        # copy through a temporary file with a unique name, so that concurrent
+        # builds and threads never see a partial image.
+        atomic_copy(fn, target)
+        logger.debug('copied cached image for {0}'.format(target))
+
+        return True
+
+    def store(self, key, build_type, image):
+        fn = self._fn(key, build_type)
+        safe_create_directory(os.path.dirname(fn))
+        atomic_copy(image, fn)
+
+def render_images(renders, cache_path=None, cmd=None):
+    """
+    :param list renders: A list of ``(source, target, dpi, width,
+       build_type)`` tuples. ``build_type`` is ``png`` or ``eps``.
+
+    :param string cache_path: Optional. The directory of the image cache.
+
+    :param list cmd: Optional. The command that starts inkscape.
+
+    Copies images from the cache when possible, and renders the rest in one
+    inkscape process.
+
+    :returns: The number of rendered images.
+    """
+
+    cache = None if cache_path is None else ImageCache(cache_path)
+
+    pending = []
+    for source, target, dpi, width, build_type in renders:
+        key = None
+        if cache is not None:
+            key = cache.key(source, dpi, width, build_type)
+            if cache.fetch(key, build_type, target) is True:
+                continue
+
+        pending.append((key, source, target, dpi, width, build_type))
+
+    if len(pending) == 0:
+        return 0
+
+    with InkscapeShell(cmd) as shell:
+        for key, source, target, dpi, width, build_type in pending:
+            shell.export(source, target, dpi, width, build_type)
+
+            if key is not None:
+                cache.store(key, build_type, target)
+
+    logger.info('rendered {0} images, copied {1} from the cache'.format(len(pending), len(renders) - len(pending)))
+
+    return len(pending)
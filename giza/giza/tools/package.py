@@ -0,0 +1,841 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Writes and reads build packages: tarballs that consist of independently
+compressed chunks and that begin with an index of their contents.
+
+A package is a sequence of gzip members, so ``tar -xzf`` and
+:mod:`tarfile` read it as an ordinary ``.tar.gz`` file:
+
+- The first member is empty. Its ``FCOMMENT`` field holds the index, as
+  JSON, and an ``FEXTRA`` subfield holds the length of the index, so that
+  readers can read the index in one piece.
+
+- Each following member is a chunk: a part of the tar stream that contains
+  only complete tar members. :class:`~giza.tools.package.PackageWriter`
+  compresses chunks in threads, and never puts the members of two trees
+  that it adds into one chunk.
+
+- The last member holds the end-of-archive marker of the tar stream.
+
+The index records the offset, the compressed length and the SHA-1 digest of
+each chunk, and for each tar member its chunk, its offset in the
+uncompressed chunk, its size and the SHA-1 digest of its content. Readers
+use it to verify a package without extracting it, to decompress only the
+chunks that hold selected members, and to decompress chunks in parallel
+while reading a package as a stream, for instance from an HTTP response.
+
+A delta package names a base package in its index, and contains only the
+members that differ from the base, with a list of the members of the base
+that it deletes. The base may itself be a delta package.
+:func:`~giza.tools.package.extract_package_chain()` resolves the chain of
+bases, which must be next to the delta package, and extracts each member
+from the newest package that contains it.
+
+The extraction functions also accept ``.tar.gz`` files that are not build
+packages, such as packages from earlier versions of giza, and extract them
+as ordinary tarballs.
+"""
+
+import collections
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import multiprocessing.dummy
+import os
+import struct
+import tarfile
+import tempfile
+import zlib
+
+logger = logging.getLogger('giza.tools.package')
+
+from giza.tools.files import rm_rf, safe_create_directory
+
+index_prefix = b'giza-package-index:'
+index_subfield = b'GZ'
+package_format = 1
+
+default_chunk_size = 2**24
+
+#: The fields of the entries in the ``members`` list of the index. ``type`` is
+#: ``file``, ``dir`` or ``symlink``. ``digest`` is the SHA-1 digest of the
+#: content of a file, or the target of a symbolic link.
+PackageMember = collections.namedtuple('PackageMember', ['name', 'type', 'chunk', 'offset', 'size', 'digest'])
+
+class PackageError(Exception):
+    pass
+
+class NotAPackageError(PackageError):
+    """
+    Raised for files that are not build packages, such as ``.tar.gz`` files
+    that giza wrote before build packages.
+    """
+
+    pass
+
+########## Writing ##########
+
+def _gzip_header(flags=0, extra=None, comment=None):
+    # deflate, mtime 0, no extra flags, unknown OS.
+    header = [ struct.pack('<BBBBIBB', 0x1f, 0x8b, 8, flags, 0, 0, 255) ]
+
+    if extra is not None:
+        header.append(struct.pack('<H', len(extra)) + extra)
+    if comment is not None:
+        header.append(comment + b'\0')
+
+    return b''.join(header)
+
+def _gzip_member(data, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    body = compressor.compress(data) + compressor.flush(zlib.Z_FINISH)
+    trailer = struct.pack('<II', zlib.crc32(data) & 0xffffffff, len(data) & 0xffffffff)
+
+    return _gzip_header() + body + trailer
+
+def _compress_chunk(args):
+    data, level = args
+    member = _gzip_member(data, level)
+
+    return member, hashlib.sha1(member).hexdigest()
+
+def _hash_file(fn):
+    h = hashlib.sha1()
+    with open(fn, 'rb') as f:
+        for block in iter(lambda: f.read(io.DEFAULT_BUFFER_SIZE * 64), b''):
+            h.update(block)
+
+    return h.hexdigest()
+
+class _HashingReader(object):
+    # computes the SHA-1 digest of the data that tarfile copies from ``f``.
+    def __init__(self, f):
+        self.f = f
+        self.sha1 = hashlib.sha1()
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.sha1.update(data)
+        return data
+
+def _index_member(index):
+    comment = index_prefix + json.dumps(index, sort_keys=True).encode('ascii')
+    extra = index_subfield + struct.pack('<HQ', 8, len(comment))
+
+    return _gzip_header(flags=0x04 | 0x10, extra=extra, comment=comment) + _gzip_member(b'')[10:]
+
+def _list_tree(path, arcname, exclude):
+    # returns (arcname, full path) tuples in sorted order, directories before
+    # their contents.
+    members = [ (arcname, path) ]
+
+    if os.path.isdir(path) and not os.path.islink(path):
+        for root, dirs, files in os.walk(path):
+            dirs[:] = [ d for d in dirs if exclude is None or not exclude(os.path.join(root, d)) ]
+            rel_root = os.path.relpath(root, path)
+
+            for name in dirs + [ fn for fn in files if exclude is None or not exclude(os.path.join(root, fn)) ]:
+                rel = name if rel_root == '.' else os.path.join(rel_root, name)
+                members.append((os.path.join(arcname, rel), os.path.join(root, name)))
+
+    return sorted(members)
+
+def _tar_info(fn, arcname):
+    # hard links would refer to members in other chunks, so store every file.
+    st = os.lstat(fn)
+
+    info = tarfile.TarInfo(arcname)
+    info.mtime = int(st.st_mtime)
+    info.mode = st.st_mode & 0o7777
+
+    if os.path.islink(fn):
+        info.type = tarfile.SYMTYPE
+        info.linkname = os.readlink(fn)
+    elif os.path.isdir(fn):
+        info.type = tarfile.DIRTYPE
+    else:
+        info.type = tarfile.REGTYPE
+        info.size = st.st_size
+
+    return info
+
+class PackageWriter(object):
+    """
+    Writes a package to ``fn``. Chunks hold about ``chunk_size`` bytes of the
+    tar stream, and are compressed in ``threads`` threads. A file of at least
+    ``chunk_size`` bytes is a chunk by itself, which is compressed while the
+    file is read, so that large files are never held in memory. The package replaces ``fn`` on
+    :meth:`~giza.tools.package.PackageWriter.close()`.
+
+    If ``base`` is the file name or URL of a package, writes a delta package
+    against ``base``, which ``opener`` opens.
+    """
+
+    def __init__(self, fn, level=6, threads=None, chunk_size=None, base=None, opener=None):
+        self.fn = fn
+        self.level = level
+
+        if base is None:
+            self.base = None
+            self.base_members = {}
+        else:
+            self.base = os.path.basename(base)
+            self.base_members = chain_state(resolve_chain(base, opener))[0]
+
+        self.names = set()
+
+        if chunk_size is None:
+            chunk_size = default_chunk_size
+
+        self.chunk_size = chunk_size
+
+        if threads is None:
+            threads = multiprocessing.cpu_count()
+
+        self.threads = threads
+        self.pool = multiprocessing.dummy.Pool(threads)
+
+        safe_create_directory(os.path.dirname(os.path.abspath(fn)))
+        self.spool = tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(fn)))
+        self.offset = 0
+
+        self.chunks = []
+        self.members = []
+        self.pending = []
+        self._new_chunk()
+
+    def _new_chunk(self):
+        self.buffer = io.BytesIO()
+        self.tar = tarfile.open(fileobj=self.buffer, mode='w', format=tarfile.GNU_FORMAT)
+
+    def _finish_chunk(self):
+        data = self.buffer.getvalue()
+        if len(data) == 0:
+            return
+
+        self.pending.append((len(data), self.pool.apply_async(_compress_chunk, [(data, self.level)])))
+        self._new_chunk()
+
+        # bound the uncompressed chunks in memory to one for each thread.
+        if len(self.pending) >= self.threads:
+            self._write_chunks(self.threads - 1)
+
+    def _write_chunks(self, keep=0):
+        while len(self.pending) > keep:
+            size, result = self.pending.pop(0)
+            member, digest = result.get()
+
+            self.spool.write(member)
+            self.chunks.append({ 'offset': self.offset, 'length': len(member),
+                                 'digest': digest, 'size': size })
+            self.offset += len(member)
+
+    def _write_file_chunk(self, info, fn):
+        # writes a file that fills a chunk by itself straight to the spool,
+        # compressing it as it is read.
+        self._finish_chunk()
+        self._write_chunks()
+
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        member_sha1 = hashlib.sha1()
+        content_sha1 = hashlib.sha1()
+        state = { 'crc': 0, 'size': 0, 'length': 0 }
+
+        def write(data):
+            member_sha1.update(data)
+            self.spool.write(data)
+            state['length'] += len(data)
+
+        def add(data):
+            state['crc'] = zlib.crc32(data, state['crc'])
+            state['size'] += len(data)
+            write(compressor.compress(data))
+
+        write(_gzip_header())
+        add(info.tobuf(tarfile.GNU_FORMAT))
+
+        remaining = info.size
+        with open(fn, 'rb') as f:
+            while remaining > 0:
+                block = f.read(min(remaining, io.DEFAULT_BUFFER_SIZE * 64))
+                if not block:
+                    raise PackageError('{0} changed while it was added to the package'.format(fn))
+
+                content_sha1.update(block)
+                add(block)
+                remaining -= len(block)
+
+        padding = -info.size % tarfile.BLOCKSIZE
+        if padding > 0:
+            add(b'\0' * padding)
+
+        write(compressor.flush(zlib.Z_FINISH))
+        write(struct.pack('<II', state['crc'] & 0xffffffff, state['size'] & 0xffffffff))
+
+        self.chunks.append({ 'offset': self.offset, 'length': state['length'],
+                             'digest': member_sha1.hexdigest(), 'size': state['size'] })
+        self.offset += state['length']
+
+        return content_sha1.hexdigest()
+
+    def add(self, path, arcname=None, exclude=None):
+        """
+        Adds ``path`` and, if it is a directory, its contents, as
+        ``arcname``.
+
+        :param callable exclude: Optional. Returns ``True`` for the paths
+           that the package should not contain.
+        """
+
+        if arcname is None:
+            arcname = path
+
+        for name, fn in _list_tree(path, os.path.normpath(arcname), exclude):
+            info = _tar_info(fn, name)
+            self.names.add(name)
+
+            if info.isreg():
+                kind, digest = 'file', None
+            elif info.issym():
+                kind, digest = 'symlink', info.linkname
+            else:
+                kind, digest = 'dir', None
+
+            if name in self.base_members:
+                previous = self.base_members[name][1]
+                if kind == 'file' and previous.type == 'file':
+                    # delta packages compare content before adding a file.
+                    digest = _hash_file(fn)
+
+                if (previous.type, previous.digest) == (kind, digest):
+                    continue
+
+            if kind == 'file' and info.size >= self.chunk_size:
+                chunk = len(self.chunks) + len(self.pending)
+                if self.buffer.tell() > 0:
+                    chunk += 1
+
+                digest = self._write_file_chunk(info, fn)
+                self.members.append(PackageMember(name, kind, chunk, 0, info.size, digest))
+                continue
+
+            chunk = len(self.chunks) + len(self.pending)
+            offset = self.buffer.tell()
+
+            if kind == 'file':
+                with open(fn, 'rb') as f:
+                    reader = _HashingReader(f)
+                    self.tar.addfile(info, reader)
+                digest = reader.sha1.hexdigest()
+            else:
+                self.tar.addfile(info)
+
+            self.members.append(PackageMember(name, kind, chunk, offset, info.size, digest))
+
+            if self.buffer.tell() >= self.chunk_size:
+                self._finish_chunk()
+
+        # keep each tree in its own chunks, so that readers can select trees.
+        self._finish_chunk()
+
+    def close(self):
+        """
+        :returns: The index of the package, as
+           :func:`~giza.tools.package.read_index()` returns it.
+        """
+
+        self._finish_chunk()
+        self._write_chunks()
+
+        self.pool.close()
+        self.pool.join()
+
+        index = { 'format': package_format,
+                  'chunks': self.chunks,
+                  'members': [ list(m) for m in self.members ] }
+
+        if self.base is not None:
+            index['base'] = self.base
+            index['deleted'] = sorted(name for name in self.base_members if name not in self.names)
+
+        tmp = os.path.join(os.path.dirname(os.path.abspath(self.fn)), '.' + os.path.basename(self.fn) + '.tmp')
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(_index_member(index))
+
+                self.spool.seek(0)
+                while True:
+                    data = self.spool.read(2**20)
+                    if not data:
+                        break
+                    f.write(data)
+
+                f.write(_gzip_member(b'\0' * tarfile.BLOCKSIZE * 2, self.level))
+        except:
+            rm_rf(tmp)
+            raise
+        finally:
+            self.spool.close()
+
+        os.rename(tmp, self.fn)
+        logger.info('wrote package {0} with {1} members in {2} chunks'.format(self.fn, len(self.members), len(self.chunks)))
+
+        index['members'] = self.members
+
+        return index
+
+def create_package_file(fn, paths, exclude=None, level=6, threads=None, base=None, opener=None):
+    """
+    :param list paths: A list of ``(path, arcname)`` tuples.
+
+    :param string base: Optional. The package that a delta package is
+       relative to.
+
+    :returns: The index of the package.
+    """
+
+    writer = PackageWriter(fn, level, threads, base=base, opener=opener)
+    for path, arcname in paths:
+        writer.add(path, arcname, exclude)
+
+    return writer.close()
+
+########## Reading ##########
+
+def _read_exactly(f, length):
+    data = f.read(length)
+    if len(data) != length:
+        raise PackageError('package ends unexpectedly')
+
+    return data
+
+def read_index(f):
+    """
+    Reads the index from the beginning of the package file object ``f``,
+    which is then positioned at the first chunk.
+
+    :returns: The index, with the entries of ``members`` as
+       :class:`~giza.tools.package.PackageMember` tuples.
+    """
+
+    head = _read_exactly(f, 10)
+    flags = bytearray(head)[3]
+    if head[:2] != b'\x1f\x8b' or flags != 0x04 | 0x10:
+        raise NotAPackageError('not a build package')
+
+    extra_length = struct.unpack('<H', _read_exactly(f, 2))[0]
+    extra = _read_exactly(f, extra_length)
+    if extra[:2] != index_subfield:
+        raise NotAPackageError('not a build package')
+
+    length = struct.unpack('<Q', extra[4:12])[0]
+    comment = _read_exactly(f, length + 1)[:-1]
+    if not comment.startswith(index_prefix):
+        raise NotAPackageError('not a build package')
+
+    if _read_exactly(f, 10) != _gzip_member(b'')[10:]:
+        raise PackageError('invalid package index')
+
+    index = json.loads(comment[len(index_prefix):].decode('ascii'))
+    if index.get('format') != package_format:
+        raise PackageError('unsupported package format: {0}'.format(index.get('format')))
+
+    index['members'] = [ PackageMember(*m) for m in index['members'] ]
+
+    return index
+
+def _skip(f, length):
+    try:
+        f.seek(length, os.SEEK_CUR)
+    except (AttributeError, IOError, OSError):
+        # streams cannot seek.
+        while length > 0:
+            length -= len(_read_exactly(f, min(length, 2**20)))
+
+def read_chunks(f, index, selected=None):
+    """
+    Reads the chunks that follow the index from ``f``, and verifies their
+    digests.
+
+    :param set selected: Optional. The numbers of the chunks to read. Skips
+       the other chunks.
+
+    :returns: A generator of ``(number, compressed chunk)`` tuples.
+    """
+
+    for number, chunk in enumerate(index['chunks']):
+        if selected is not None and number not in selected:
+            _skip(f, chunk['length'])
+            continue
+
+        data = _read_exactly(f, chunk['length'])
+        if hashlib.sha1(data).hexdigest() != chunk['digest']:
+            raise PackageError('chunk {0} of the package is corrupt'.format(number))
+
+        yield number, data
+
+def _decompress_chunk(data, chunk):
+    raw = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(data)
+    if len(raw) != chunk['size']:
+        raise PackageError('chunk has {0} bytes instead of {1}'.format(len(raw), chunk['size']))
+
+    return tarfile.open(fileobj=io.BytesIO(raw), mode='r:')
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+def _map_chunks(f, index, selected, job, threads):
+    # bounds the number of compressed chunks in memory.
+    if threads is None:
+        threads = multiprocessing.cpu_count()
+
+    p = multiprocessing.dummy.Pool(threads)
+    try:
+        for batch in _batches(read_chunks(f, index, selected), threads * 2):
+            p.map(job, batch)
+    finally:
+        p.close()
+        p.join()
+
+class _RecordingReader(object):
+    # reads from ``f`` and keeps the bytes read, so that a stream can be read
+    # again from the beginning after rewind().
+    def __init__(self, f):
+        self.f = f
+        self.head = io.BytesIO()
+        self.replay = None
+
+    def read(self, size=-1):
+        if self.replay is None:
+            data = self.f.read(size)
+            self.head.write(data)
+            return data
+
+        data = self.replay.read(size)
+        if size is None or size < 0:
+            return data + self.f.read()
+        elif len(data) < size:
+            return data + self.f.read(size - len(data))
+        else:
+            return data
+
+    def rewind(self):
+        self.replay = io.BytesIO(self.head.getvalue())
+        self.head = None
+
+def _extract_tarball(f, path, prefixes):
+    # extracts a plain .tar.gz file in one pass, for packages from before
+    # build packages.
+    members = []
+
+    with tarfile.open(fileobj=f, mode='r|gz') as t:
+        for info in t:
+            _check_name(info.name)
+            if not is_selected(info.name, prefixes):
+                continue
+
+            if info.isdir():
+                safe_create_directory(os.path.join(path, info.name))
+                kind = 'dir'
+            else:
+                _extract_member(t, info, path)
+                kind = 'symlink' if info.issym() else 'file'
+
+            members.append(PackageMember(info.name, kind, None, None, info.size, None))
+
+    return members
+
+def _open(source):
+    if hasattr(source, 'read'):
+        return source
+    else:
+        return open(source, 'rb')
+
+def verify_package(source, members=False, threads=None):
+    """
+    Checks the digests of all chunks of the package ``source``, a file name
+    or file object. With ``members``, also decompresses the chunks in memory
+    and checks the offset and digest of every member.
+
+    :raises: :exc:`~giza.tools.package.PackageError` if the package is
+       corrupt.
+
+    :returns: The index of the package.
+    """
+
+    f = _open(source)
+    try:
+        index = read_index(f)
+
+        by_chunk = collections.defaultdict(list)
+        for m in index['members']:
+            by_chunk[m.chunk].append(m)
+
+        def verify_chunk(args):
+            number, data = args
+            if members is False:
+                return
+
+            t = _decompress_chunk(data, index['chunks'][number])
+            infos = t.getmembers()
+            expected = by_chunk[number]
+
+            if [ (i.name, i.offset) for i in infos ] != [ (m.name, m.offset) for m in expected ]:
+                raise PackageError('members of chunk {0} do not match the index'.format(number))
+
+            for info, m in zip(infos, expected):
+                if m.type == 'file' and hashlib.sha1(t.extractfile(info).read()).hexdigest() != m.digest:
+                    raise PackageError('member {0} of the package is corrupt'.format(m.name))
+
+        _map_chunks(f, index, None, verify_chunk, threads)
+    finally:
+        if f is not source:
+            f.close()
+
+    return index
+
+def is_selected(name, prefixes):
+    """
+    :returns: ``True`` if ``prefixes`` is ``None``, or if ``name`` is one of
+       ``prefixes``, or is in a directory in ``prefixes``.
+    """
+
+    if prefixes is None:
+        return True
+
+    for prefix in prefixes:
+        prefix = os.path.normpath(prefix)
+        if name == prefix or name.startswith(prefix + '/'):
+            return True
+
+    return False
+
+def _check_name(name):
+    if os.path.isabs(name) or name == '..' or name.startswith('../') or '/../' in name:
+        raise PackageError('package member {0} is outside of the package'.format(name))
+
+def _extract_member(t, info, path):
+    target = os.path.join(path, info.name)
+
+    # replace files rather than writing through them: they may be hard links.
+    if os.path.lexists(target) and not os.path.isdir(target):
+        os.remove(target)
+
+    t.extract(info, path)
+
+def _extract_members(f, index, path, members, threads):
+    for m in members:
+        _check_name(m.name)
+
+    # create directories first: the members of a directory may be in
+    # several chunks, which threads extract at the same time.
+    for m in members:
+        if m.type == 'dir':
+            safe_create_directory(os.path.join(path, m.name))
+        else:
+            safe_create_directory(os.path.join(path, os.path.dirname(m.name)))
+
+    by_chunk = collections.defaultdict(set)
+    for m in members:
+        if m.type != 'dir':
+            by_chunk[m.chunk].add(m.name)
+
+    def extract_chunk(args):
+        number, data = args
+        t = _decompress_chunk(data, index['chunks'][number])
+
+        for info in t.getmembers():
+            if info.name in by_chunk[number]:
+                _extract_member(t, info, path)
+
+    _map_chunks(f, index, set(by_chunk), extract_chunk, threads)
+
+def extract_package_file(source, path, prefixes=None, threads=None):
+    """
+    Extracts the package ``source``, a file name or a file object, into
+    ``path``, decompressing chunks in ``threads`` threads. Reads the package
+    once, from beginning to end, so ``source`` may be a stream. Extracts
+    ``.tar.gz`` files that are not build packages as ordinary tarballs.
+
+    :param list prefixes: Optional. The names of the members, or of the
+       directories, to extract. Only the chunks that hold these members are
+       decompressed.
+
+    :returns: The list of the extracted members.
+    """
+
+    f = _open(source)
+    try:
+        stream = _RecordingReader(f)
+        try:
+            index = read_index(stream)
+        except NotAPackageError:
+            logger.info('not a build package, extracting it as a tarball')
+            stream.rewind()
+            members = _extract_tarball(stream, path, prefixes)
+        else:
+            # read_index() only reads the index, so ``f`` is at the first
+            # chunk.
+            if 'base' in index:
+                raise PackageError('package is a delta of {0}'.format(index['base']))
+
+            members = [ m for m in index['members'] if is_selected(m.name, prefixes) ]
+            _extract_members(f, index, path, members, threads)
+    finally:
+        if f is not source:
+            f.close()
+
+    logger.info('extracted {0} members of the package into {1}'.format(len(members), path))
+
+    return members
+
+########## Delta Packages ##########
+
+max_chain_length = 64
+
+def resolve_chain(source, opener=None):
+    """
+    :param string source: The file name or URL of a package.
+
+    :param callable opener: Optional. Returns a file object for a file name
+       or URL. Opens local files by default.
+
+    :returns: A list of ``(source, index)`` tuples for ``source`` and the
+       packages it is a delta of, beginning with the full package.
+    """
+
+    if opener is None:
+        opener = _open
+
+    chain = []
+    while True:
+        if len(chain) == max_chain_length or source in [ s for s, _ in chain ]:
+            raise PackageError('cannot resolve the bases of {0}'.format(chain[0][0]))
+
+        f = opener(source)
+        try:
+            index = read_index(f)
+        except NotAPackageError:
+            if len(chain) == 0:
+                raise
+            else:
+                raise PackageError('{0}, the base of {1}, is not a build package'.format(source, chain[-1][0]))
+        finally:
+            f.close()
+
+        chain.append((source, index))
+
+        if 'base' not in index:
+            break
+
+        # bases are next to their deltas, in the same directory or at the
+        # same URL.
+        source = os.path.join(os.path.dirname(source), index['base'])
+
+    chain.reverse()
+
+    return chain
+
+def chain_state(chain):
+    """
+    :param list chain: A list of ``(source, index)`` tuples from
+       :func:`~giza.tools.package.resolve_chain()`.
+
+    :returns: A mapping of the name of each member of the resolved chain to a
+       tuple of the number of the package in ``chain`` that contains it and
+       its :class:`~giza.tools.package.PackageMember`, and the set of names
+       that the deltas deleted.
+    """
+
+    members = {}
+    deleted = set()
+
+    for number, (_, index) in enumerate(chain):
+        for name in index.get('deleted', []):
+            members.pop(name, None)
+            deleted.add(name)
+
+        for m in index['members']:
+            members[m.name] = (number, m)
+            deleted.discard(m.name)
+
+    return members, deleted
+
+def extract_package_chain(source, path, prefixes=None, threads=None, opener=None):
+    """
+    Extracts the package ``source``, which may be a delta package, into
+    ``path``. Reads each package of the chain once and extracts only the
+    newest version of each member, then removes the members that the deltas
+    deleted from ``path``.
+
+    :param list prefixes: Optional. The names of the members, or of the
+       directories, to extract.
+
+    :returns: The list of the extracted members.
+    """
+
+    if opener is None:
+        opener = _open
+
+    try:
+        chain = resolve_chain(source, opener)
+    except NotAPackageError:
+        # a .tar.gz file from before build packages, which has no bases.
+        f = opener(source)
+        try:
+            return extract_package_file(f, path, prefixes, threads)
+        finally:
+            f.close()
+
+    members, deleted = chain_state(chain)
+
+    by_package = collections.defaultdict(list)
+    for number, m in members.values():
+        if is_selected(m.name, prefixes):
+            by_package[number].append(m)
+
+    extracted = []
+    for number, (package, index) in enumerate(chain):
+        if number not in by_package:
+            continue
+
+        f = opener(package)
+        try:
+            read_index(f)
+            _extract_members(f, index, path, by_package[number], threads)
+        finally:
+            f.close()
+
+        extracted.extend(by_package[number])
+
+    for name in sorted(deleted, reverse=True):
+        if is_selected(name, prefixes):
+            _check_name(name)
+            rm_rf(os.path.join(path, name))
+
+    logger.info('extracted {0} members of {1} packages into {2}'.format(len(extracted), len(chain), path))
+
+    return extracted
@@ -0,0 +1,292 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Publishes a build into a public tree atomically, copying only the files that
+changed since the last publish.
+
+The public path (i.e. ``build/public/<branch>``) is a symbolic link to a
+snapshot directory. :func:`~giza.tools.publish.publish_tree()` creates the next
+snapshot in a staging directory, where every file of the current snapshot is
+a hard link, and only the build output files whose content hash differs from
+the manifest of the last publish are copied. Then it renames a new symbolic
+link over the public path, so that readers always see either the complete old
+tree or the complete new tree.
+
+Files that other tasks added to the public tree, and that are not part of the
+build output, remain in later snapshots, as they would with ``rsync`` without
+``--delete``. The previous snapshot stays on disk until the next publish, so
+that readers that resolved the old link can finish.
+"""
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+logger = logging.getLogger('giza.tools.publish')
+
+from giza.tools.files import atomic_write, hash_files, rm_rf, safe_create_directory
+
+def load_manifest(fn):
+    """
+    :returns: A mapping of the paths of the published files, relative to the
+       public tree, to their signatures.
+    """
+
+    if not os.path.isfile(fn):
+        return {}
+
+    with open(fn, 'r') as f:
+        try:
+            return json.load(f)['files']
+        except (ValueError, KeyError):
+            logger.warning('could not read publish manifest {0}, copying all files'.format(fn))
+            return {}
+
+def tree_signatures(path, previous=None, pool_size=1):
+    """
+    :param dict previous: A mapping of relative paths to signatures from an
+       earlier call.
+
+    :returns: A mapping of the paths of all files below ``path``, relative to
+       ``path``, to their signatures. The digest of a symbolic link is
+       ``symlink:`` followed by the target of the link.
+    """
+
+    if previous is None:
+        previous = {}
+
+    dirs, files = _list_tree(path)
+
+    signatures = {}
+    regular = []
+    for rel in files:
+        fn = os.path.join(path, rel)
+        if os.path.islink(fn):
+            signatures[rel] = [ 'symlink:' + os.readlink(fn) ]
+        else:
+            regular.append(rel)
+
+    hashed = hash_files([ os.path.join(path, rel) for rel in regular ],
+                        dict((os.path.join(path, rel), previous[rel])
+                             for rel in regular if rel in previous),
+                        pool_size)
+
+    for rel in regular:
+        sig = hashed.get(os.path.join(path, rel))
+        if sig is not None:
+            signatures[rel] = sig
+
+    return signatures
+
+def _current_snapshot(public):
+    # returns the directory that the public path refers to, or None.
+    if os.path.isdir(public):
+        return os.path.realpath(public)
+    else:
+        return None
+
+def _list_tree(path):
+    dirs = []
+    files = []
+
+    for root, dirnames, filenames in os.walk(path):
+        rel_root = os.path.relpath(root, path)
+        for name in dirnames:
+            if os.path.islink(os.path.join(root, name)):
+                files.append(os.path.normpath(os.path.join(rel_root, name)))
+            else:
+                dirs.append(os.path.normpath(os.path.join(rel_root, name)))
+
+        files.extend(os.path.normpath(os.path.join(rel_root, name)) for name in filenames)
+
+    return dirs, files
+
+def _link_file(source, target):
+    if os.path.islink(source):
+        os.symlink(os.readlink(source), target)
+    else:
+        try:
+            os.link(source, target)
+        except OSError:
+            # the file system does not support hard links.
+            shutil.copy2(source, target)
+
+def _copy_file(source, target):
+    # never write through an existing name: it may be a hard link to a file in
+    # the live snapshot.
+    if os.path.lexists(target):
+        os.remove(target)
+
+    if os.path.islink(source):
+        os.symlink(os.readlink(source), target)
+    else:
+        shutil.copy2(source, target)
+
+def _swap_link(public, snapshot):
+    # returns the path of the public tree from before snapshots, if there was
+    # one, and otherwise None.
+    parent = os.path.dirname(public)
+    safe_create_directory(parent)
+
+    tmp_link = os.path.join(parent, '.' + os.path.basename(public) + '.publish')
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+
+    os.symlink(os.path.relpath(snapshot, parent), tmp_link)
+
+    legacy = None
+    if os.path.isdir(public) and not os.path.islink(public):
+        # a public tree from before snapshots. A link cannot replace a
+        # directory atomically, so move it into the snapshots once, where it
+        # stays until the next publish like any previous snapshot.
+        legacy = os.path.join(os.path.dirname(snapshot), '.legacy-' + os.path.basename(snapshot))
+        os.rename(public, legacy)
+        logger.info('moved existing public tree {0} to {1}'.format(public, legacy))
+
+    os.rename(tmp_link, public)
+
+    return legacy
+
+def _carry_over(previous, snapshot, published):
+    # links files that other tasks wrote into the previous snapshot while the
+    # new one was staged.
+    dirs, files = _list_tree(previous)
+
+    for rel in dirs:
+        safe_create_directory(os.path.join(snapshot, rel))
+
+    count = 0
+    for rel in files:
+        if rel in published:
+            continue
+
+        source = os.path.join(previous, rel)
+        target = os.path.join(snapshot, rel)
+
+        if os.path.lexists(target) and os.lstat(target).st_ino == os.lstat(source).st_ino:
+            continue
+
+        tmp = os.path.join(os.path.dirname(target), '.' + os.path.basename(target) + '.publish')
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        _link_file(source, tmp)
+        os.rename(tmp, target)
+        count += 1
+
+    if count > 0:
+        logger.info('carried over {0} files written during publishing'.format(count))
+
+def _next_snapshot_name(snapshots):
+    numbers = [ int(name) for name in os.listdir(snapshots) if name.isdigit() ]
+
+    return str(max(numbers) + 1 if numbers else 1)
+
+def _remove_old_snapshots(snapshots, keep):
+    for name in os.listdir(snapshots):
+        if name not in keep:
+            rm_rf(os.path.join(snapshots, name))
+
+def publish_tree(source, public, snapshots, manifest_fn, excluded=None, pool_size=1):
+    """
+    :param string source: The build output to publish.
+
+    :param string public: The public path, which becomes a symbolic link to
+       the new snapshot.
+
+    :param string snapshots: The directory that holds the snapshots.
+
+    :param string manifest_fn: The file that records the signatures of the
+       published files.
+
+    :param list excluded: Optional. Paths, relative to ``source``, that are
+       not published.
+
+    :returns: The number of copied files.
+    """
+
+    manifest = load_manifest(manifest_fn)
+    previous = _current_snapshot(public)
+
+    if excluded is None:
+        excluded = []
+    excluded = set(os.path.normpath(rel) for rel in excluded)
+
+    dirs, files = _list_tree(source)
+    files = [ rel for rel in files if rel not in excluded ]
+
+    signatures = hash_files([ os.path.join(source, rel) for rel in files ],
+                            dict((os.path.join(source, rel), sig) for rel, sig in manifest.items()),
+                            pool_size)
+
+    safe_create_directory(snapshots)
+    staging = tempfile.mkdtemp(dir=snapshots, prefix='.staging-')
+
+    copied = 0
+    published = {}
+    try:
+        if previous is not None:
+            previous_dirs, previous_files = _list_tree(previous)
+            for rel in previous_dirs:
+                safe_create_directory(os.path.join(staging, rel))
+            for rel in previous_files:
+                _link_file(os.path.join(previous, rel), os.path.join(staging, rel))
+
+        for rel in dirs:
+            safe_create_directory(os.path.join(staging, rel))
+
+        for rel in files:
+            sig = signatures.get(os.path.join(source, rel))
+            if sig is None:
+                continue
+
+            published[rel] = sig
+            target = os.path.join(staging, rel)
+
+            if (rel in manifest and manifest[rel][0] == sig[0] and
+                os.path.lexists(target)):
+                continue
+
+            _copy_file(os.path.join(source, rel), target)
+            copied += 1
+
+        for rel in excluded:
+            rm_rf(os.path.join(staging, rel))
+
+        os.chmod(staging, 0o755)
+        snapshot = os.path.join(snapshots, _next_snapshot_name(snapshots))
+        os.rename(staging, snapshot)
+    except:
+        rm_rf(staging)
+        raise
+
+    legacy = _swap_link(public, snapshot)
+    if legacy is not None:
+        previous = os.path.realpath(legacy)
+
+    if previous is not None:
+        _carry_over(previous, snapshot, set(published) | excluded)
+
+    atomic_write(manifest_fn, json.dumps({ 'files': published }).encode('utf-8'))
+
+    keep = [ os.path.basename(snapshot) ]
+    if previous is not None and os.path.dirname(previous) == os.path.realpath(snapshots):
+        keep.append(os.path.basename(previous))
+    _remove_old_snapshots(snapshots, keep)
+
+    logger.info('published {0} to {1}: copied {2} of {3} files'.format(source, public, copied, len(published)))
+
+    return copied
@@ -0,0 +1,381 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A compact inverted index of a documentation site, in a binary format that
+readers can query through :mod:`mmap` without loading the whole file.
+
+The file has four sections, all little-endian:
+
+1. A header: the ``GIZAIDX1`` magic string, the number of documents and
+   terms, and the offsets of the other sections.
+
+2. The document table: one 8 byte offset per document, followed by records
+   of the document key, URL, title and source digest, each a 2 byte length
+   followed by UTF-8 text.
+
+3. The term table: one fixed-size entry per term, in sorted order, so that
+   readers can find a term with a binary search. Each entry holds the offset
+   and length of the term's text and of its postings, and the number of
+   documents that contain the term.
+
+4. The postings: for each term, a list of documents, each as the delta of the
+   document number, the number of positions, and the deltas of the positions,
+   all encoded as variable-length integers.
+
+:func:`~giza.tools.search_index.update_index()` rebuilds the index from a
+previous version, so that only documents whose digest changed are tokenized
+again.
+"""
+
+import collections
+import logging
+import mmap
+import os
+import re
+import struct
+
+logger = logging.getLogger('giza.tools.search_index')
+
+from giza.tools.files import atomic_write
+
+magic = b'GIZAIDX1'
+
+# magic, document count, term count, document table offset, term table offset,
+# postings offset.
+header = struct.Struct('<8sIIQQQ')
+
+# term offset, term length, postings offset, postings length, document count.
+term_entry = struct.Struct('<QIQII')
+
+doc_offset = struct.Struct('<Q')
+field_length = struct.Struct('<H')
+
+Document = collections.namedtuple('Document', ['key', 'url', 'title', 'digest'])
+
+token_regex = re.compile(r'[a-z0-9_$]+(?:\.[a-z0-9_$]+)*', re.UNICODE)
+
+def tokenize(text):
+    """
+    :returns: The list of lower-cased terms in ``text``. Terms keep inner
+       periods (i.e. ``db.collection.find``) and dollar signs (i.e. ``$set``).
+    """
+
+    return token_regex.findall(text.lower())
+
+########## Variable-length Integers ##########
+
+def encode_varint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+
+    out.append(value)
+
+def decode_varint(data, offset):
+    value = 0
+    shift = 0
+
+    while True:
+        byte = data[offset]
+        offset += 1
+
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+
+        shift += 7
+
+def encode_postings(postings):
+    """
+    :param list postings: A list of ``(document, [positions])`` tuples, sorted
+       by document.
+    """
+
+    out = bytearray()
+    last_doc = 0
+
+    for doc, positions in postings:
+        encode_varint(doc - last_doc, out)
+        encode_varint(len(positions), out)
+        last_doc = doc
+
+        last_pos = 0
+        for pos in positions:
+            encode_varint(pos - last_pos, out)
+            last_pos = pos
+
+    return out
+
+def decode_postings(data):
+    data = bytearray(data)
+
+    postings = []
+    offset = 0
+    doc = 0
+
+    while offset < len(data):
+        delta, offset = decode_varint(data, offset)
+        count, offset = decode_varint(data, offset)
+        doc += delta
+
+        positions = []
+        pos = 0
+        for _ in range(count):
+            delta, offset = decode_varint(data, offset)
+            pos += delta
+            positions.append(pos)
+
+        postings.append((doc, positions))
+
+    return postings
+
+########## Writing ##########
+
+def _encode_field(value):
+    data = value.encode('utf-8')
+    return field_length.pack(len(data)) + data
+
+def write_index(fn, documents, postings):
+    """
+    :param list documents: A list of :class:`Document` tuples. Postings refer
+       to documents by their position in this list.
+
+    :param dict postings: A mapping of terms to lists of ``(document,
+       [positions])`` tuples.
+    """
+
+    doc_records = []
+    offset = 0
+    for doc in documents:
+        record = b''.join(_encode_field(value) for value in doc)
+        doc_records.append((offset, record))
+        offset += len(record)
+
+    doc_table = b''.join(doc_offset.pack(o) for o, _ in doc_records)
+    doc_table += b''.join(record for _, record in doc_records)
+
+    terms = sorted(postings)
+    term_texts = [ term.encode('utf-8') for term in terms ]
+    term_blob_offset = term_entry.size * len(terms)
+
+    entries = []
+    postings_blob = bytearray()
+    text_offset = term_blob_offset
+    for term, text in zip(terms, term_texts):
+        encoded = encode_postings(sorted(postings[term]))
+        entries.append(term_entry.pack(text_offset, len(text), len(postings_blob),
+                                       len(encoded), len(postings[term])))
+        text_offset += len(text)
+        postings_blob.extend(encoded)
+
+    term_table = b''.join(entries) + b''.join(term_texts)
+
+    docs_start = header.size
+    terms_start = docs_start + len(doc_table)
+    postings_start = terms_start + len(term_table)
+
+    atomic_write(fn, b''.join([header.pack(magic, len(documents), len(terms),
+                                           docs_start, terms_start, postings_start),
+                               doc_table, term_table, bytes(postings_blob)]))
+
+########## Reading ##########
+
+class SearchIndex(object):
+    """
+    Reads an index written by :func:`~giza.tools.search_index.write_index()`
+    through :mod:`mmap`. Use as a context manager, or call
+    :meth:`~giza.tools.search_index.SearchIndex.close()`.
+    """
+
+    def __init__(self, fn):
+        self.file = open(fn, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        fields = header.unpack_from(self.data, 0)
+        if fields[0] != magic:
+            self.close()
+            raise ValueError('{0} is not a search index'.format(fn))
+
+        (_, self.doc_count, self.term_count,
+         self.docs_start, self.terms_start, self.postings_start) = fields
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def _read_field(self, offset):
+        length = field_length.unpack_from(self.data, offset)[0]
+        offset += field_length.size
+
+        return self.data[offset:offset+length].decode('utf-8'), offset + length
+
+    def document(self, idx):
+        """
+        :returns: The :class:`Document` with the number ``idx``.
+        """
+
+        offset = doc_offset.unpack_from(self.data, self.docs_start + idx * doc_offset.size)[0]
+        offset += self.docs_start + self.doc_count * doc_offset.size
+
+        values = []
+        for _ in Document._fields:
+            value, offset = self._read_field(offset)
+            values.append(value)
+
+        return Document(*values)
+
+    def documents(self):
+        return [ self.document(idx) for idx in range(self.doc_count) ]
+
+    def _entry(self, idx):
+        return term_entry.unpack_from(self.data, self.terms_start + idx * term_entry.size)
+
+    def _term(self, entry):
+        start = self.terms_start + entry[0]
+        return self.data[start:start+entry[1]].decode('utf-8')
+
+    def _postings(self, entry):
+        start = self.postings_start + entry[2]
+        return decode_postings(self.data[start:start+entry[3]])
+
+    def terms(self):
+        """
+        Yields ``(term, postings)`` tuples for every term in the index.
+        """
+
+        for idx in range(self.term_count):
+            entry = self._entry(idx)
+            yield self._term(entry), self._postings(entry)
+
+    def lookup(self, term):
+        """
+        :returns: The list of ``(document, [positions])`` tuples for ``term``,
+           found with a binary search of the term table.
+        """
+
+        low = 0
+        high = self.term_count
+        while low < high:
+            mid = (low + high) // 2
+            entry = self._entry(mid)
+            current = self._term(entry)
+
+            if current < term:
+                low = mid + 1
+            elif current > term:
+                high = mid
+            else:
+                return self._postings(entry)
+
+        return []
+
+    def search(self, query):
+        """
+        :returns: The documents that contain every term in ``query``, ordered
+           by the number of occurrences of the terms.
+        """
+
+        scores = None
+        for term in tokenize(query):
+            matches = dict((doc, len(positions)) for doc, positions in self.lookup(term))
+
+            if scores is None:
+                scores = matches
+            else:
+                scores = dict((doc, score + matches[doc])
+                              for doc, score in scores.items() if doc in matches)
+
+        if not scores:
+            return []
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [ self.document(doc) for doc, _ in ranked ]
+
+########## Incremental Updates ##########
+
+def _load_previous(fn):
+    if not os.path.isfile(fn):
+        return [], {}
+
+    try:
+        with SearchIndex(fn) as index:
+            return index.documents(), dict(index.terms())
+    except (ValueError, struct.error, EnvironmentError) as e:
+        logger.warning('could not read search index {0} ({1}), rebuilding it'.format(fn, e))
+        return [], {}
+
+def update_index(fn, digests, read_document):
+    """
+    :param dict digests: A mapping of the keys of all documents in the index
+       to the digests of their sources.
+
+    :param callable read_document: Called with the key of a new or changed
+       document. Returns a ``(url, title, text)`` tuple, or ``None`` to omit
+       the document.
+
+    Writes the index to ``fn``. Postings of documents whose digests match the
+    previous index are copied from that index.
+
+    :returns: The number of documents that were tokenized.
+    """
+
+    old_documents, old_postings = _load_previous(fn)
+
+    documents = []
+    renumbered = {}
+    for idx, doc in enumerate(old_documents):
+        if digests.get(doc.key) == doc.digest:
+            renumbered[idx] = len(documents)
+            documents.append(doc)
+
+    postings = collections.defaultdict(list)
+    for term, term_postings in old_postings.items():
+        for doc, positions in term_postings:
+            if doc in renumbered:
+                postings[term].append((renumbered[doc], positions))
+
+    kept = set(doc.key for doc in documents)
+    changed = 0
+    for key in sorted(digests):
+        if key in kept:
+            continue
+
+        content = read_document(key)
+        if content is None:
+            continue
+
+        url, title, text = content
+        idx = len(documents)
+        documents.append(Document(key, url, title, digests[key]))
+        changed += 1
+
+        positions = collections.defaultdict(list)
+        for pos, term in enumerate(tokenize(title + ' ' + text)):
+            positions[term].append(pos)
+
+        for term, term_positions in positions.items():
+            postings[term].append((idx, term_positions))
+
+    write_index(fn, documents, postings)
+
+    logger.info('wrote search index with {0} documents ({1} updated) and {2} terms to {3}'.format(len(documents), changed, len(postings), fn))
+
+    return changed
@@ -0,0 +1,181 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Writes gzip-compressed sitemaps (see `sitemaps.org
+<http://www.sitemaps.org/protocol.html>`_) from a list of URLs, without
+walking the output directory.
+
+:func:`~giza.tools.sitemap.write_sitemaps()` streams the URLs into compressed
+files as it goes, and starts a new file before one would exceed 50,000 URLs
+or 50 MiB of uncompressed XML. A single file is written as ``sitemap.xml.gz``;
+otherwise the files are ``sitemap-1.xml.gz``, ``sitemap-2.xml.gz``, ...
+and ``sitemap.xml.gz`` is a sitemap index that lists them.
+
+The gzip header of ``sitemap.xml.gz`` records a digest of the base URL and
+the URLs, and ``write_sitemaps()`` does nothing when the digest matches. The
+sitemaps omit ``lastmod``, because the modification times of build output do
+not reflect changes in content.
+"""
+
+import hashlib
+import logging
+import os
+from xml.sax.saxutils import escape
+
+logger = logging.getLogger('giza.tools.sitemap')
+
+from giza.tools.compression import ParallelGzipWriter, read_gzip_comment
+from giza.tools.files import rm_rf, safe_create_directory
+
+max_urls = 50000
+max_size = 50 * 1024 * 1024
+max_sitemaps = 50000
+
+digest_prefix = b'giza-sitemap-digest:'
+
+header = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+          '<{0} xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+footer = '</{0}>\n'
+
+def get_sitemap_digest(base_url, urls):
+    h = hashlib.sha1()
+    h.update(base_url.encode('utf-8'))
+
+    for url in urls:
+        h.update(b'\n')
+        h.update(url.encode('utf-8'))
+
+    return digest_prefix + h.hexdigest().encode('ascii')
+
+class SitemapWriter(object):
+    """
+    Writes one compressed sitemap or sitemap index through a temporary file,
+    which replaces ``fn`` on :meth:`~giza.tools.sitemap.SitemapWriter.close()`.
+
+    :param string element: ``urlset`` or ``sitemapindex``.
+    """
+
+    def __init__(self, fn, element='urlset', comment=None):
+        self.fn = fn
+        self.tmp_fn = os.path.join(os.path.dirname(fn), '.' + os.path.basename(fn) + '.tmp')
+        self.element = element
+        self.count = 0
+
+        self.file = open(self.tmp_fn, 'wb')
+        self.writer = ParallelGzipWriter(self.file, level=9, threads=1, comment=comment)
+
+        self.size = 0
+        self._write(header.format(element))
+        self.footer_size = len(footer.format(element))
+
+    def _write(self, text):
+        data = text.encode('utf-8')
+        self.size += len(data)
+        self.writer.write(data)
+
+    def entry(self, url):
+        if self.element == 'urlset':
+            return '<url><loc>{0}</loc></url>\n'.format(escape(url))
+        else:
+            return '<sitemap><loc>{0}</loc></sitemap>\n'.format(escape(url))
+
+    def fits(self, entry):
+        return (self.count < max_urls and
+                self.size + len(entry.encode('utf-8')) + self.footer_size <= max_size)
+
+    def add(self, entry):
+        self._write(entry)
+        self.count += 1
+
+    def close(self):
+        self._write(footer.format(self.element))
+        self.writer.close()
+        self.file.close()
+
+        os.rename(self.tmp_fn, self.fn)
+
+    def abort(self):
+        self.file.close()
+        rm_rf(self.tmp_fn)
+
+def write_sitemaps(path, base_url, urls, name='sitemap'):
+    """
+    :param string path: The output directory, which ``base_url`` serves.
+
+    :param string base_url: The absolute URL of ``path``, ending with a slash.
+
+    :param list urls: The absolute URLs of the pages.
+
+    :returns: The list of written files, which is empty if the sitemap was
+       already up to date.
+    """
+
+    urls = sorted(set(urls))
+    digest = get_sitemap_digest(base_url, urls)
+
+    index_fn = os.path.join(path, name + '.xml.gz')
+    if os.path.isfile(index_fn) and read_gzip_comment(index_fn) == digest:
+        logger.info('sitemap {0} is up to date'.format(index_fn))
+        return []
+
+    safe_create_directory(path)
+
+    def part_fn(number):
+        return os.path.join(path, '{0}-{1}.xml.gz'.format(name, number))
+
+    # the first file becomes the sitemap itself if all URLs fit in it.
+    writers = [ SitemapWriter(part_fn(1), comment=digest) ]
+    written = []
+    try:
+        for url in urls:
+            entry = writers[-1].entry(url)
+
+            if not writers[-1].fits(entry):
+                writers[-1].close()
+                written.append(writers[-1].fn)
+                writers.append(SitemapWriter(part_fn(len(writers) + 1)))
+
+            writers[-1].add(entry)
+
+        writers[-1].close()
+        written.append(writers[-1].fn)
+    except:
+        writers[-1].abort()
+        raise
+
+    parts = len(written)
+
+    if parts == 1:
+        os.rename(written[0], index_fn)
+        written = [ index_fn ]
+    else:
+        if len(written) > max_sitemaps:
+            raise ValueError('{0} sitemaps exceed the limit of a sitemap index'.format(len(written)))
+
+        index = SitemapWriter(index_fn, element='sitemapindex', comment=digest)
+        for fn in written:
+            index.add(index.entry(base_url + os.path.basename(fn)))
+        index.close()
+        written.append(index_fn)
+
+    # remove parts of a larger, earlier sitemap.
+    number = parts + 1
+    while os.path.exists(part_fn(number)):
+        os.remove(part_fn(number))
+        number += 1
+
+    logger.info('wrote sitemap with {0} urls in {1} files to {2}'.format(len(urls), len(written), path))
+
+    return written
@@ -0,0 +1,355 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Synchronizes a target directory with a source directory, like ``rsync
+--checksum --recursive --delete``, without reading every file on every run.
+
+:func:`~giza.tools.transfer.transfer_tree()` keeps a manifest with the stat
+information and digest of every source file and the stat information of every
+target file from the last transfer. Files whose source and target stat
+information both match the manifest are skipped without reading either
+file. Other files are hashed, and only copied when their content differs from
+the target. Copies preserve the content but not the ``mtime`` of the source,
+so that Sphinx rebuilds every file that changed.
+
+Files are placed in the target with a reflink (copy-on-write clone) when the
+file system supports it, or, if requested, with a hard link. Both fall back to
+regular copies.
+"""
+
+import collections
+import errno
+import json
+import logging
+import os
+import re
+import shutil
+import multiprocessing.dummy
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger('giza.tools.transfer')
+
+from giza.tools.files import (atomic_write, hash_file, hash_files, hash_algorithm,
+                              stat_signature, safe_create_directory)
+
+TransferResult = collections.namedtuple('TransferResult', ['copied', 'deleted', 'unchanged'])
+
+# from linux/fs.h
+FICLONE = 0x40049409
+
+link_modes = ('copy', 'reflink', 'hardlink')
+
+########## Exclusions ##########
+
+def _translate_pattern(pattern):
+    rx = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith('**', i):
+            rx.append('.*')
+            i += 2
+            continue
+        elif c == '*':
+            rx.append('[^/]*')
+        elif c == '?':
+            rx.append('[^/]')
+        elif c == '[' and ']' in pattern[i+1:]:
+            end = pattern.index(']', i + 1)
+            rx.append(pattern[i:end+1])
+            i = end
+        else:
+            rx.append(re.escape(c))
+
+        i += 1
+
+    return ''.join(rx)
+
+class ExclusionMatcher(object):
+    """
+    Matches relative paths against a list of ``rsync`` style exclusion
+    patterns. Patterns that begin with ``/`` match from the root of the
+    transfer; other patterns match the end of a path (i.e. ``table`` matches
+    ``includes/table``.) ``*`` and ``?`` do not match ``/``, and ``**`` matches
+    anything.
+    """
+
+    def __init__(self, patterns):
+        regexes = []
+        for pattern in patterns:
+            pattern = pattern.rstrip('/')
+
+            if pattern.startswith('/'):
+                regexes.append('^' + _translate_pattern(pattern[1:]) + '$')
+            else:
+                regexes.append('(?:^|/)' + _translate_pattern(pattern) + '$')
+
+        if len(regexes) == 0:
+            self.regex = None
+        else:
+            self.regex = re.compile('|'.join(regexes))
+
+    def match(self, path):
+        return self.regex is not None and self.regex.search(path) is not None
+
+def _walk(root, exclusions, redactions):
+    # yields (relative directory, [relative file names]) for every directory in
+    # root that isn't excluded or redacted.
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel_dir = os.path.relpath(dirpath, root)
+        if rel_dir == '.':
+            rel_dir = ''
+
+        for dn in list(dirnames):
+            rel = os.path.join(rel_dir, dn)
+            if exclusions.match(rel) or rel in redactions:
+                dirnames.remove(dn)
+
+        files = []
+        for fn in filenames:
+            rel = os.path.join(rel_dir, fn)
+            if not exclusions.match(rel) and rel not in redactions:
+                files.append(rel)
+
+        yield rel_dir, files
+
+########## File Placement ##########
+
+class _Linker(object):
+    """
+    Places files in the target directory. Remembers when the file system does
+    not support reflinks or hard links, to avoid retrying them for every file.
+    """
+
+    def __init__(self, link):
+        self.reflink = link == 'reflink' and fcntl is not None
+        self.hardlink = link == 'hardlink'
+
+    def place(self, source, target, touch=True):
+        tmp = os.path.join(os.path.dirname(target), '.' + os.path.basename(target) + '.giza-transfer')
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+
+        if self.hardlink is True:
+            try:
+                os.link(source, tmp)
+                os.rename(tmp, target)
+                if touch is True:
+                    # the link shares the mtime of the source, which may be
+                    # older than the last Sphinx build.
+                    os.utime(target, None)
+                return
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                    raise
+                logger.warning('cannot create hard links in {0}, copying files'.format(os.path.dirname(target)))
+                self.hardlink = False
+
+        if self.reflink is True:
+            try:
+                with open(source, 'rb') as src:
+                    with open(tmp, 'wb') as dst:
+                        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                shutil.copymode(source, tmp)
+                os.rename(tmp, target)
+                return
+            except (IOError, OSError) as e:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                if e.errno not in (errno.EXDEV, errno.EINVAL, errno.ENOTTY, errno.ENOTSUP,
+                                   errno.EOPNOTSUPP, errno.EBADF, errno.ENOSYS):
+                    raise
+                logger.debug('file system does not support reflinks, copying files')
+                self.reflink = False
+
+        shutil.copyfile(source, tmp)
+        shutil.copymode(source, tmp)
+        os.rename(tmp, target)
+
+########## Manifest ##########
+
+def _load_manifest(fn):
+    empty = { 'source': {}, 'target': {} }
+
+    if fn is None or not os.path.isfile(fn):
+        return empty
+
+    with open(fn, 'r') as f:
+        try:
+            manifest = json.load(f)
+        except ValueError:
+            logger.warning('could not read transfer manifest {0}, comparing all files'.format(fn))
+            return empty
+
+    if manifest.get('hash') != hash_algorithm:
+        return empty
+    else:
+        return manifest
+
+def manifest_signatures(fn, source, target):
+    """
+    :returns: A mapping of absolute paths in ``target`` to ``[digest, size,
+       mtime_ns, inode]`` signatures, as recorded in the manifest of the last
+       transfer from ``source``. The mapping is suitable as the ``previous``
+       argument of :func:`giza.tools.files.hash_files()`, so that files that
+       have not changed since the transfer are not read again.
+    """
+
+    state = _load_manifest(fn)
+
+    signatures = {}
+    for rel, tgt_sig in state['target'].items():
+        sig = state['source'].get(os.path.join(source, rel))
+        if isinstance(sig, list):
+            signatures[os.path.join(target, rel)] = [sig[0]] + tgt_sig
+
+    return signatures
+
+def _write_manifest(fn, source_sigs, target_sigs):
+    if fn is None:
+        return
+
+    safe_create_directory(os.path.dirname(fn))
+    atomic_write(fn, json.dumps({ 'hash': hash_algorithm,
+                                  'source': source_sigs,
+                                  'target': target_sigs }))
+
+########## Transfer ##########
+
+def transfer_tree(source, target, exclusions=None, redactions=None, manifest=None,
+                  link='reflink', pool_size=1):
+    """
+    :param string source: The source directory.
+
+    :param string target: The target directory.
+
+    :param list exclusions: ``rsync`` style patterns. Matching paths are
+       neither copied from the source nor deleted from the target.
+
+    :param list redactions: Paths, relative to the source, that are not copied
+       and are deleted from the target. Paths may begin with ``/``.
+
+    :param string manifest: The path of the manifest file that records the
+       state of the last transfer. Without a manifest, all files are hashed.
+
+    :param string link: One of ``copy``, ``reflink`` or ``hardlink``.
+
+    :param int pool_size: The number of threads that hash and copy files.
+
+    :returns: A :class:`~giza.tools.transfer.TransferResult` with the numbers
+       of copied, deleted and unchanged files.
+    """
+
+    if link not in link_modes:
+        raise TypeError('{0} is not a supported link mode'.format(link))
+
+    exclusions = ExclusionMatcher(exclusions or [])
+    redactions = set(r.strip('/') for r in redactions or [])
+    state = _load_manifest(manifest)
+
+    source_dirs = set()
+    source_files = []
+    for rel_dir, files in _walk(source, exclusions, redactions):
+        source_dirs.add(rel_dir)
+        source_files.extend(files)
+
+    source_sigs = hash_files([ os.path.join(source, rel) for rel in source_files ],
+                             state['source'], pool_size)
+
+    for rel_dir in sorted(source_dirs):
+        safe_create_directory(os.path.join(target, rel_dir))
+
+    linker = _Linker(link)
+
+    def sync(rel):
+        src = os.path.join(source, rel)
+        tgt = os.path.join(target, rel)
+        sig = source_sigs.get(src)
+
+        if sig is None:
+            # the file disappeared after the scan.
+            return rel, None, False
+
+        try:
+            tgt_sig = stat_signature(tgt)
+        except OSError:
+            tgt_sig = None
+
+        previous = state['source'].get(src)
+        if (tgt_sig is not None and tgt_sig == state['target'].get(rel) and
+                isinstance(previous, list) and previous[0] == sig[0]):
+            return rel, tgt_sig, False
+        elif tgt_sig is not None and tgt_sig[0] == sig[1] and hash_file(tgt) == sig[0]:
+            if linker.hardlink is True and tgt_sig[2] != sig[3]:
+                # replace identical copies with links, without changing the
+                # mtime, so that Sphinx doesn't rebuild the file.
+                linker.place(src, tgt, touch=False)
+                tgt_sig = stat_signature(tgt)
+
+            return rel, tgt_sig, False
+        else:
+            linker.place(src, tgt)
+            return rel, stat_signature(tgt), True
+
+    if pool_size > 1 and len(source_files) > 1:
+        p = multiprocessing.dummy.Pool(pool_size)
+        try:
+            results = p.map(sync, source_files)
+        finally:
+            p.close()
+            p.join()
+    else:
+        results = [ sync(rel) for rel in source_files ]
+
+    target_sigs = {}
+    copied = 0
+    for rel, tgt_sig, changed in results:
+        if tgt_sig is not None:
+            target_sigs[rel] = tgt_sig
+        if changed is True:
+            copied += 1
+
+    deleted = _delete_extraneous(target, exclusions, source_dirs, target_sigs)
+
+    _write_manifest(manifest, source_sigs, target_sigs)
+
+    return TransferResult(copied, deleted, len(target_sigs) - copied)
+
+def _delete_extraneous(target, exclusions, source_dirs, target_files):
+    deleted = 0
+    target_dirs = []
+
+    for rel_dir, files in _walk(target, exclusions, set()):
+        target_dirs.append(rel_dir)
+
+        for rel in files:
+            if rel not in target_files:
+                os.remove(os.path.join(target, rel))
+                logger.debug('removed {0} from {1}'.format(rel, target))
+                deleted += 1
+
+    for rel_dir in reversed(target_dirs):
+        if rel_dir in source_dirs:
+            continue
+
+        path = os.path.join(target, rel_dir)
+        if len(os.listdir(path)) == 0:
+            os.rmdir(path)
+
+    return deleted
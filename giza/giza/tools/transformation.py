@@ -12,44 +12,151 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+"""
+Applies regular expression substitutions to files, one line at a time.
+
+A :class:`~giza.tools.transformation.Transformation` holds an ordered list of
+substitutions and also compiles all of their patterns into one alternation.
+For each line, a single search with the alternation finds whether any
+substitution could apply; most lines do not match, and pass through without
+running each substitution. Matching lines go through every substitution in
+order, so the result is the same as applying each substitution to every line.
+
+:func:`~giza.tools.transformation.munge_page()` streams the input file through
+the transformation into a temporary file that replaces the output file when it
+is complete. :func:`~giza.tools.transformation.process_pages()` divides many
+files among a few tasks, rather than adding one task for each file.
+"""
+
 import collections
+import io
 import logging
+import os.path
 import re
 
 logger = logging.getLogger('giza.transformation')
 
-from giza.tools.files import copy_always, copy_if_needed, encode_lines_to_file, decode_lines_from_file
+from giza.tools.files import atomic_write, atomic_write_lines
 from giza.tools.serialization import ingest_yaml
 
 class ProcessingError(Exception):
     pass
 
-def munge_page(fn, regex, out_fn=None,  tag='build'):
+# patterns that refer to their own groups cannot share an alternation, which
+# renumbers groups.
+backreference_regex = re.compile(r'\\[1-9]|\(\?P=')
+
+class Transformation(object):
+    """
+    :param regex: A ``(compiled_regex, substitution)`` tuple, a list of these
+       tuples, or another :class:`~giza.tools.transformation.Transformation`.
+    """
+
+    def __init__(self, regex):
+        if isinstance(regex, Transformation):
+            self.substitutions = list(regex.substitutions)
+        elif isinstance(regex, list):
+            self.substitutions = list(regex)
+        else:
+            self.substitutions = [ regex ]
+
+        self.pattern = self._combine()
+
+    def _combine(self):
+        # returns None when the patterns cannot be combined, in which case
+        # every line goes through every substitution.
+        if len(self.substitutions) < 2:
+            return None
+
+        flags = set(cregex.flags for cregex, _ in self.substitutions)
+        patterns = [ cregex.pattern for cregex, _ in self.substitutions ]
+
+        if len(flags) != 1 or any(backreference_regex.search(p) for p in patterns):
+            return None
+
+        try:
+            return re.compile('|'.join('(?:{0})'.format(p) for p in patterns), flags.pop())
+        except re.error:
+            return None
+
+    def __add__(self, other):
+        return Transformation(self.substitutions + Transformation(other).substitutions)
+
+    def apply(self, content):
+        if self.pattern is not None and self.pattern.search(content) is None:
+            return content
+
+        for cregex, subst in self.substitutions:
+            content = cregex.sub(subst, content)
+
+        return content
+
+def munge_page(fn, regex, out_fn=None, tag='build', copy='always'):
+    """
+    Applies the substitutions in ``regex`` to each line of ``fn``, with
+    trailing whitespace removed, and writes the result to ``out_fn``, or back
+    to ``fn``.
+
+    :param regex: A :class:`~giza.tools.transformation.Transformation`, or any
+       argument it accepts.
+
+    :param string copy: If ``ifNeeded``, leaves ``out_fn`` in place when its
+       content would not change.
+
+    :returns: ``True`` if ``out_fn`` changed.
+    """
+
     if out_fn is None:
         out_fn = fn
 
-    page_lines = [ munge_content(ln, regex) for ln in decode_lines_from_file(fn)
-                   if ln is not None ]
+    if not isinstance(regex, Transformation):
+        regex = Transformation(regex)
 
-    if len(page_lines) > 0:
-        encode_lines_to_file(out_fn, page_lines)
-        logger.info('{0}: processed {1}'.format(tag, fn))
-    else:
+    if os.path.getsize(fn) == 0:
         logger.warning('{0}: did not write {1}'.format(tag, out_fn))
+        return False
 
-def munge_content(content, regex):
-    if isinstance(regex, list):
-        for cregex, subst in regex:
-            content = cregex.sub(subst, content)
-        return content
+    with io.open(fn, 'r', encoding='utf-8') as f:
+        result = atomic_write_lines(out_fn, (regex.apply(ln.rstrip()) for ln in f),
+                                    if_changed=(copy != 'always'))
+
+    logger.info('{0}: processed {1}'.format(tag, fn))
+
+    return result.changed
+
+def munge_pages(pages, copy='always'):
+    """
+    :param list pages: A list of ``(fn, output_fn, regex, builder)`` tuples,
+       processed in order with :func:`~giza.tools.transformation.munge_page()`.
+
+    :returns: The number of changed output files.
+    """
+
+    changed = 0
+    for fn, output_fn, regex, builder in pages:
+        if munge_page(fn=fn, regex=regex, out_fn=output_fn, tag=builder, copy=copy) is True:
+            changed += 1
+
+    return changed
+
+def _encode(text):
+    if isinstance(text, bytes):
+        return text
     else:
-        return regex[0].sub(regex[1], content)
+        return text.encode('utf-8')
 
+# the following functions edit files in place, so they replace the file rather
+# than writing into it: build source trees are hard links to shared files.
 
 def truncate_file(fn, start_after=None, end_before=None):
-    with open(fn, 'r') as f:
+    with open(fn, 'rb') as f:
         source_lines = f.readlines()
 
+    if start_after is not None:
+        start_after = _encode(start_after)
+    if end_before is not None:
+        end_before = _encode(end_before)
+
     start_idx = 0
     end_idx = len(source_lines) - 1
 
@@ -64,45 +171,61 @@ def truncate_file(fn, start_after=None, end_before=None):
                 end_idx = idx
                 break
 
-    with open(fn, 'w') as f:
-        f.writelines(source_lines[start_idx:end_idx])
+    atomic_write(fn, b''.join(source_lines[start_idx:end_idx]))
 
 def append_to_file(fn, text):
-    with open(fn, 'a') as f:
-        f.write('\n')
-        f.write(text)
+    with open(fn, 'rb') as f:
+        body = f.read()
+
+    atomic_write(fn, body + b'\n' + _encode(text))
 
-def prepend_to_file(fn, text): 
-    with open(fn, 'r') as f:
-        body = f.readlines()
+def prepend_to_file(fn, text):
+    with open(fn, 'rb') as f:
+        body = f.read()
 
-    with open(fn, 'w') as f:
-        f.write(text)
-        f.writelines(body)
+    atomic_write(fn, _encode(text) + body)
 
 def process_page(fn, output_fn, regex, app, builder='processor', copy='always'):
     t = app.add('task')
-    t.job = _process_page
-    t.args = [fn, output_fn, regex, copy, builder ]
+    t.job = munge_page
+    t.args = [fn, regex, output_fn, builder, copy ]
     t.target = output_fn
-    t.depenency = None
+    t.dependency = None
     t.description = "modify page"
 
     logger.debug('added tasks to process file: {0}'.format(fn))
 
-def _process_page(fn, output_fn, regex, copy, builder):
-    tmp_fn = fn + '~'
+def process_pages(pages, app, copy='always'):
+    """
+    :param list pages: A list of ``(fn, output_fn, regex, builder)`` tuples.
 
-    munge_page(fn=fn, out_fn=tmp_fn, regex=regex)
+    Adds up to ``pool_size`` tasks to ``app`` that each process a share of
+    ``pages``. Compiles each distinct ``regex`` once.
+    """
 
-    cp_args = dict(source_file=tmp_fn,
-                   target_file=output_fn,
-                   name=builder)
+    if len(pages) == 0:
+        return
 
-    if copy == 'always':
-        copy_always(**cp_args)
-    else:
-        copy_if_needed(**cp_args)
+    compiled = {}
+    for fn, output_fn, regex, builder in pages:
+        if not isinstance(regex, Transformation) and id(regex) not in compiled:
+            compiled[id(regex)] = Transformation(regex)
+
+    pages = [ (fn, output_fn, compiled.get(id(regex), regex), builder)
+              for fn, output_fn, regex, builder in pages ]
+
+    batches = min(len(pages), app.conf.runstate.pool_size)
+    for idx in range(batches):
+        batch = pages[idx::batches]
+
+        t = app.add('task')
+        t.job = munge_pages
+        t.args = [ batch, copy ]
+        t.target = [ output_fn for _, output_fn, _, _ in batch ]
+        t.dependency = None
+        t.description = "modify {0} pages".format(len(batch))
+
+    logger.debug('added {0} tasks to process {1} files'.format(batches, len(pages)))
 
 def post_process_tasks(app, tasks=None, source_fn=None):
     """
@@ -128,9 +251,9 @@ def post_process_tasks(app, tasks=None, source_fn=None):
     elif not isinstance(tasks, collections.Iterable):
         raise ProcessingError('[ERROR]: cannot parse post processing specification.')
 
-    def rjob(fn, regex, type):
-        page_app = app.add('app')
-        process_page(fn=fn, output_fn=fn, regex=regex, app=page_app, builder=type)
+    # all transformations of a file run in one pass, in the order of the
+    # specification.
+    pages = collections.OrderedDict()
 
     for job in tasks:
         if not isinstance(job, dict):
@@ -151,4 +274,10 @@ def post_process_tasks(app, tasks=None, source_fn=None):
             job['file'] = [ job['file'] ]
 
         for fn in job['file']:
-            rjob(fn, regex, job['type'])
+            if fn in pages:
+                pages[fn] = (pages[fn][0] + regex, pages[fn][1])
+            else:
+                pages[fn] = (Transformation(regex), job['type'])
+
+    process_pages([ (fn, fn, regex, builder) for fn, (regex, builder) in pages.items() ],
+                  app.add('app'))
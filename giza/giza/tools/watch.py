@@ -0,0 +1,164 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Watches directory trees for changed files. :class:`InotifyWatcher` uses the
+optional :mod:`pyinotify` package, and :class:`PollingWatcher` compares
+snapshots of the stat information of all files. :func:`get_watcher()` returns
+an inotify watcher when possible, and :func:`wait_for_changes()` collects
+bursts of changes (i.e. editors that write several files on save) into one
+set.
+"""
+
+import logging
+import os
+import time
+
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
+
+logger = logging.getLogger('giza.tools.watch')
+
+def ignored_file(fn):
+    """
+    :returns: ``True`` for editor backup, swap and lock files.
+    """
+
+    basename = os.path.basename(fn)
+
+    return (basename.startswith('.#') or basename.endswith('~') or
+            basename.endswith('.swp') or basename.endswith('.swx') or
+            (basename.startswith('#') and basename.endswith('#')))
+
+class PollingWatcher(object):
+    def __init__(self, paths, interval=1):
+        self.paths = paths
+        self.interval = interval
+        self.snapshot = self._snapshot()
+
+    def _snapshot(self):
+        snapshot = {}
+
+        for path in self.paths:
+            for root, dirs, files in os.walk(path):
+                for fn in files:
+                    fn = os.path.join(root, fn)
+                    if ignored_file(fn):
+                        continue
+
+                    try:
+                        st = os.stat(fn)
+                    except OSError:
+                        continue
+
+                    snapshot[fn] = (st.st_mtime, st.st_size, st.st_ino)
+
+        return snapshot
+
+    def changes(self, timeout):
+        """
+        :returns: The set of files that were added, modified or removed since
+           the last call. Waits up to ``timeout`` seconds for a change.
+        """
+
+        deadline = time.time() + timeout
+
+        while True:
+            snapshot = self._snapshot()
+            changed = set(fn for fn, sig in snapshot.items() if self.snapshot.get(fn) != sig)
+            changed.update(fn for fn in self.snapshot if fn not in snapshot)
+            self.snapshot = snapshot
+
+            remaining = deadline - time.time()
+            if len(changed) > 0 or remaining <= 0:
+                return changed
+
+            time.sleep(min(self.interval, remaining))
+
+    def close(self):
+        pass
+
+if pyinotify is not None:
+    class _EventCollector(pyinotify.ProcessEvent):
+        def my_init(self, changed):
+            self.changed = changed
+
+        def process_default(self, event):
+            if not event.dir and not ignored_file(event.pathname):
+                self.changed.add(event.pathname)
+
+class InotifyWatcher(object):
+    def __init__(self, paths):
+        if pyinotify is None:
+            raise OSError('pyinotify is not installed')
+
+        self.changed = set()
+        self.manager = pyinotify.WatchManager()
+        self.notifier = pyinotify.Notifier(self.manager, _EventCollector(changed=self.changed))
+
+        mask = (pyinotify.IN_CLOSE_WRITE | pyinotify.IN_CREATE | pyinotify.IN_DELETE |
+                pyinotify.IN_MOVED_FROM | pyinotify.IN_MOVED_TO)
+
+        for path in paths:
+            self.manager.add_watch(path, mask, rec=True, auto_add=True)
+
+    def changes(self, timeout):
+        if self.notifier.check_events(timeout=int(timeout * 1000)):
+            self.notifier.read_events()
+            self.notifier.process_events()
+
+        changed = set(self.changed)
+        self.changed.clear()
+
+        return changed
+
+    def close(self):
+        self.notifier.stop()
+
+def get_watcher(paths, poll=False, interval=1):
+    """
+    :returns: An :class:`InotifyWatcher`, or a :class:`PollingWatcher` if
+       ``poll`` is ``True`` or inotify is not available.
+    """
+
+    if poll is False and pyinotify is not None:
+        try:
+            return InotifyWatcher(paths)
+        except (OSError, pyinotify.WatchManagerError) as e:
+            logger.warning('cannot use inotify ({0}), polling for changes'.format(e))
+    elif poll is False:
+        logger.info('pyinotify is not installed, polling for changes')
+
+    return PollingWatcher(paths, interval)
+
+def wait_for_changes(watcher, debounce=0.5):
+    """
+    Blocks until a file changes, then collects changes until no file has
+    changed for ``debounce`` seconds.
+
+    :returns: The set of changed files.
+    """
+
+    changed = set()
+    while len(changed) == 0:
+        changed = watcher.changes(timeout=60)
+
+    while True:
+        more = watcher.changes(timeout=debounce)
+        if len(more) == 0:
+            return changed
+        else:
+            changed.update(more)
@@ -0,0 +1,100 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+import giza.content.changes
+from giza.content.changes import (changed_since_last_build, get_last_built_commit,
+                                  record_built_commit)
+
+class Namespace(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+class TestChangedSinceLastBuild(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.conf = Namespace(paths=Namespace(projectroot=self.root,
+                                              source='source',
+                                              branch_source='build/master/source'),
+                              git=Namespace(commit='def456'),
+                              system=Namespace(last_built_commit=os.path.join(self.root, 'last-built-commit')))
+        self.graph = {
+            '/includes/intro.rst': ['/index.txt'],
+            '/includes/example.js': ['/tutorial/install.txt'],
+        }
+
+        self.original = giza.content.changes.git_changed_files
+        giza.content.changes.git_changed_files = self.git_changed_files
+        self.reported = set()
+
+    def tearDown(self):
+        giza.content.changes.git_changed_files = self.original
+        shutil.rmtree(self.root)
+
+    def git_changed_files(self, path, base):
+        self.base = base
+        return self.reported
+
+    def record(self, sha, dirty=()):
+        with open(self.conf.system.last_built_commit, 'w') as f:
+            f.write(sha + '\n')
+            for fn in dirty:
+                f.write(fn + '\n')
+
+    def test_without_recorded_commit(self):
+        self.assertIsNone(get_last_built_commit(self.conf))
+        self.assertIsNone(changed_since_last_build(self.graph, self.conf))
+
+    def test_reports_changed_includes(self):
+        self.record('abc123')
+        self.reported = set([os.path.join(self.root, 'source', 'includes', 'intro.rst'),
+                             os.path.join(self.root, 'source', 'index.txt')])
+
+        self.assertEqual(changed_since_last_build(self.graph, self.conf), ['/includes/intro.rst'])
+        self.assertEqual(self.base, 'abc123')
+
+    def test_git_failure_falls_back(self):
+        self.record('abc123')
+        self.reported = None
+
+        self.assertIsNone(changed_since_last_build(self.graph, self.conf))
+
+    def test_reports_files_that_were_dirty_at_the_last_build(self):
+        # the include was edited for the last build and reverted since.
+        self.record('abc123', [ os.path.join(self.root, 'source', 'includes', 'example.js') ])
+
+        self.assertEqual(changed_since_last_build(self.graph, self.conf), ['/includes/example.js'])
+
+    def test_records_uncommitted_changes(self):
+        self.reported = set([ os.path.join(self.root, 'source', 'includes', 'intro.rst') ])
+
+        record_built_commit(self.conf)
+        self.reported = set()
+
+        self.assertEqual(self.base, 'def456')
+        self.assertEqual(get_last_built_commit(self.conf), 'def456')
+        self.assertEqual(changed_since_last_build(self.graph, self.conf), ['/includes/intro.rst'])
+
+    def test_does_not_record_without_git(self):
+        self.record('abc123')
+        self.reported = None
+
+        record_built_commit(self.conf)
+
+        self.assertIsNone(get_last_built_commit(self.conf))
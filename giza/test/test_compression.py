@@ -0,0 +1,115 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import gzip
+import io
+import os
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import time
+
+from unittest import TestCase
+
+from giza.tools.compression import ParallelGzipWriter, read_gzip_comment, tarball
+
+class TestParallelGzip(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.fn = os.path.join(self.dir, 'data.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_standard_gzip(self):
+        data = b''.join(os.urandom(64) * 50 for _ in range(200))
+
+        with open(self.fn, 'wb') as f:
+            writer = ParallelGzipWriter(f, threads=4, block_size=4096, comment=b'note')
+            for idx in range(0, len(data), 1000):
+                writer.write(data[idx:idx+1000])
+            writer.close()
+
+        with gzip.open(self.fn, 'rb') as f:
+            self.assertEqual(f.read(), data)
+
+        self.assertEqual(read_gzip_comment(self.fn), b'note')
+
+    def test_empty(self):
+        with open(self.fn, 'wb') as f:
+            ParallelGzipWriter(f, threads=2).close()
+
+        with gzip.open(self.fn, 'rb') as f:
+            self.assertEqual(f.read(), b'')
+
+class TestTarball(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.site = os.path.join(self.dir, 'html')
+        os.makedirs(os.path.join(self.site, 'tutorial'))
+
+        for fn in ('index.html', os.path.join('tutorial', 'install.html')):
+            with open(os.path.join(self.site, fn), 'w') as f:
+                f.write('<p>{0}</p>'.format(fn))
+
+        self.name = os.path.join(self.dir, 'public', 'manual.tar.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def read(self):
+        with open(self.name, 'rb') as f:
+            return f.read()
+
+    def test_contents(self):
+        self.assertTrue(tarball(self.name, 'html', newp='manual', cdir=self.dir, threads=2))
+
+        with tarfile.open(self.name, 'r:gz') as t:
+            self.assertEqual(t.getnames(), ['manual/html', 'manual/html/index.html', 'manual/html/tutorial',
+                                            'manual/html/tutorial/install.html'])
+            self.assertEqual(t.extractfile('manual/html/index.html').read(), b'<p>index.html</p>')
+
+    def test_reproducible(self):
+        tarball(self.name, 'html', newp='manual', cdir=self.dir, threads=2)
+        first = self.read()
+        os.remove(self.name)
+
+        later = time.time() + 100
+        os.utime(os.path.join(self.site, 'index.html'), (later, later))
+
+        tarball(self.name, 'html', newp='manual', cdir=self.dir, threads=2)
+        self.assertEqual(self.read(), first)
+
+    def test_members_have_commit_time(self):
+        env = dict(os.environ, GIT_AUTHOR_NAME='giza', GIT_AUTHOR_EMAIL='giza@example.net',
+                   GIT_COMMITTER_NAME='giza', GIT_COMMITTER_EMAIL='giza@example.net',
+                   GIT_COMMITTER_DATE='1400000000 +0000')
+        env.pop('SOURCE_DATE_EPOCH', None)
+        for args in (['init', '-q'], ['add', 'html'], ['commit', '-q', '-m', 'site']):
+            subprocess.check_call(['git'] + args, cwd=self.dir, env=env)
+
+        tarball(self.name, 'html', newp='manual', cdir=self.dir)
+
+        with tarfile.open(self.name, 'r:gz') as t:
+            self.assertEqual(set(m.mtime for m in t.getmembers()), set([1400000000]))
+
+    def test_skips_unchanged_tree(self):
+        self.assertTrue(tarball(self.name, 'html', newp='manual', cdir=self.dir))
+        self.assertFalse(tarball(self.name, 'html', newp='manual', cdir=self.dir))
+
+        with open(os.path.join(self.site, 'index.html'), 'w') as f:
+            f.write('<p>changed</p>')
+
+        self.assertTrue(tarball(self.name, 'html', newp='manual', cdir=self.dir))
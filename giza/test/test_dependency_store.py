@@ -0,0 +1,104 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from unittest import TestCase
+
+from giza.content.dependency_store import JsonDependencyStore, SqliteDependencyStore
+from giza.tools.files import hash_algorithm
+
+class Namespace(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+def make_conf(root, edition):
+    if edition is None:
+        cache = 'dependencies.json'
+    else:
+        cache = 'dependencies-{0}.json'.format(edition)
+
+    return Namespace(project=Namespace(edition=edition),
+                     paths=Namespace(projectroot=root, branch_output='build/master'),
+                     system=Namespace(dependency_cache=os.path.join(root, 'build', 'master', cache)))
+
+class TestSqliteDependencyStore(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.fn = os.path.join(self.root, 'build', 'master', 'source', 'index.txt')
+        self.other = os.path.join(self.root, 'build', 'master', 'source', 'about.txt')
+        self.files = {
+            self.fn: ['0123456789abcdef', 10, 1000000000, 42],
+            self.other: ['fedcba9876543210', 20, 2000000000, 43],
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_empty_store(self):
+        self.assertIsNone(SqliteDependencyStore(make_conf(self.root, None)).load())
+
+    def test_round_trip(self):
+        store = SqliteDependencyStore(make_conf(self.root, None))
+        store.write(self.files)
+
+        self.assertEqual(store.load(), self.files)
+
+    def test_incremental_update(self):
+        store = SqliteDependencyStore(make_conf(self.root, None))
+        store.write(self.files)
+
+        previous = store.load()
+        current = { self.fn: ['00000000000000ff', 11, 3000000000, 42] }
+        store.write(current, previous)
+
+        self.assertEqual(store.load(), current)
+
+    def test_editions_share_paths(self):
+        SqliteDependencyStore(make_conf(self.root, 'one')).write(self.files)
+        SqliteDependencyStore(make_conf(self.root, 'two')).write(self.files)
+
+        store = SqliteDependencyStore(make_conf(self.root, 'two'))
+        db = sqlite3.connect(store.path)
+        try:
+            self.assertEqual(db.execute('SELECT COUNT(*) FROM paths').fetchone()[0], 2)
+        finally:
+            db.close()
+
+        self.assertEqual(store.load(), self.files)
+
+    def test_reads_json_cache(self):
+        conf = make_conf(self.root, 'one')
+        JsonDependencyStore(conf).write(self.files)
+
+        store = SqliteDependencyStore(conf)
+        self.assertEqual(store.load(), self.files)
+
+        legacy = { self.fn: '0123456789abcdef0123456789abcdef' }
+        store.write(legacy)
+        self.assertEqual(store.load(), legacy)
+
+    def test_algorithm_mismatch(self):
+        store = SqliteDependencyStore(make_conf(self.root, None))
+        store.write(self.files)
+
+        db = sqlite3.connect(store.path)
+        db.execute('UPDATE editions SET algorithm = ?', (hash_algorithm + '-old',))
+        db.commit()
+        db.close()
+
+        self.assertIsNone(store.load())
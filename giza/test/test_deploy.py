@@ -0,0 +1,185 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import sys
+import tempfile
+
+from unittest import TestCase
+
+from giza.deploy import Deploy
+
+# copies files like "rsync --recursive", following a link given as the source.
+fake_rsync = '''
+import os, shutil, sys
+
+args = [ arg for arg in sys.argv[1:] if not arg.startswith('-') ]
+files_from = [ arg[len('--files-from='):] for arg in sys.argv if arg.startswith('--files-from=') ]
+source, target = args[-2:]
+
+if files_from:
+    with open(files_from[0]) as f:
+        names = [ line.strip() for line in f if line.strip() ]
+else:
+    names = []
+    for root, dirs, files in os.walk(source):
+        names.extend(os.path.relpath(os.path.join(root, fn), source) for fn in files)
+
+size = 0
+for name in names:
+    fn = os.path.join(target, name)
+    if not os.path.exists(os.path.join(source, name)):
+        if '--delete-missing-args' in sys.argv:
+            os.remove(fn)
+        continue
+    if not os.path.isdir(os.path.dirname(fn)):
+        os.makedirs(os.path.dirname(fn))
+    shutil.copyfile(os.path.join(source, name), fn)
+    size += os.path.getsize(fn)
+
+print('Total transferred file size: {0:,} bytes'.format(size))
+'''
+
+class Namespace(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+    def __contains__(self, key):
+        return key in self.__dict__
+
+class TestDeploy(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.output = os.path.join(self.dir, 'build')
+        self.hosts = [ 'file://' + os.path.join(self.dir, 'host-{0}'.format(i)) for i in range(3) ]
+
+        self.write(os.path.join(self.output, 'public', 'master', 'index.html'), 'index')
+        self.write(os.path.join(self.output, 'public', 'robots.txt'), 'robots')
+        self.write(os.path.join(self.output, 'public', 'unlisted.txt'), 'unlisted')
+
+        stub = os.path.join(self.dir, 'rsync.py')
+        self.write(stub, fake_rsync)
+
+        conf = Namespace(paths=Namespace(output=self.output,
+                                         branch_output=os.path.join(self.output, 'master')),
+                         git=Namespace(branches=Namespace(current='master')),
+                         deploy=Namespace(production=Namespace(hosts=self.hosts, args=[])))
+
+        self.deploy = Deploy(conf)
+        self.deploy.load({ 'target': 'push',
+                           'env': 'production',
+                           'options': [ 'branched' ],
+                           'paths': { 'local': 'public', 'remote': '/srv/manual',
+                                      'static': [ 'robots.txt' ] } })
+        self.deploy.rsync = sys.executable + ' ' + stub
+
+        # exits like rsync after a partial transfer.
+        self.partial_stub = os.path.join(self.dir, 'partial-rsync.py')
+        self.write(self.partial_stub, fake_rsync + 'sys.exit(23)\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, fn, content):
+        if not os.path.isdir(os.path.dirname(fn)):
+            os.makedirs(os.path.dirname(fn))
+
+        with open(fn, 'w') as f:
+            f.write(content)
+
+    def remote(self, host, rel):
+        return os.path.join(self.dir, 'host-{0}'.format(host), 'srv', 'manual', 'master', rel)
+
+    def test_one_session_per_host(self):
+        commands = self.deploy.host_commands('example.net')
+
+        self.assertEqual(len(commands), 2)
+        self.assertIn('-e', commands[0])
+        self.assertEqual(commands[0][-1], 'example.net:/srv/manual/master')
+        self.assertTrue(commands[1][-3].startswith('--files-from='))
+        self.assertEqual(commands[1][-1], 'example.net:/srv/manual')
+
+    def test_local_hosts_use_paths(self):
+        commands = self.deploy.host_commands(self.hosts[0])
+
+        self.assertNotIn('-e', commands[0])
+        self.assertEqual(commands[0][-1], os.path.join(self.dir, 'host-0', 'srv', 'manual', 'master'))
+
+    def test_deploys_to_all_hosts(self):
+        self.deploy.fanout = 2
+
+        results = self.deploy.run()
+
+        self.assertEqual([ r.host for r in results ], self.hosts)
+        self.assertEqual([ r.transferred for r in results ], [ 11, 11, 11 ])
+
+        for i in range(3):
+            remote = os.path.join(self.dir, 'host-{0}'.format(i), 'srv', 'manual')
+            self.assertTrue(os.path.isfile(os.path.join(remote, 'master', 'index.html')))
+            self.assertTrue(os.path.isfile(os.path.join(remote, 'robots.txt')))
+            self.assertFalse(os.path.exists(os.path.join(remote, 'unlisted.txt')))
+
+    def test_deploys_only_changed_files(self):
+        self.deploy.run()
+        self.write(os.path.join(self.output, 'public', 'master', 'tutorial', 'index.html'), 'tutorial')
+
+        commands = self.deploy.host_commands(self.hosts[0])
+        self.assertIn('-ltzI', commands[0])
+        with open(commands[0][-3][len('--files-from='):]) as f:
+            self.assertEqual(f.read(), 'tutorial/index.html\n')
+
+        results = self.deploy.run()
+
+        self.assertEqual([ r.transferred for r in results ], [ 14, 14, 14 ])
+        self.assertTrue(os.path.isfile(self.remote(2, 'tutorial/index.html')))
+
+    def test_unchanged_tree_only_deploys_static_files(self):
+        self.deploy.run()
+
+        commands = self.deploy.host_commands(self.hosts[0])
+
+        self.assertEqual(len(commands), 1)
+        self.assertTrue(commands[0][-3].startswith('--files-from='))
+
+    def test_partial_transfer_is_not_recorded(self):
+        self.deploy.run()
+        self.write(os.path.join(self.output, 'public', 'master', 'tutorial', 'index.html'), 'tutorial')
+        rsync = self.deploy.rsync
+        self.deploy.rsync = sys.executable + ' ' + self.partial_stub
+
+        self.deploy.run()
+        self.deploy.rsync = rsync
+
+        commands = self.deploy.host_commands(self.hosts[0])
+        with open(commands[0][-3][len('--files-from='):]) as f:
+            self.assertEqual(f.read(), 'tutorial/index.html\n')
+
+    def test_deletes_removed_files(self):
+        self.deploy.delete = True
+        self.deploy.run()
+        os.remove(os.path.join(self.output, 'public', 'master', 'index.html'))
+
+        self.deploy.run()
+
+        self.assertFalse(os.path.exists(self.remote(0, 'index.html')))
+
+    def test_full_compares_all_files(self):
+        self.deploy.run()
+        self.deploy.full = True
+
+        commands = self.deploy.host_commands(self.hosts[0])
+
+        self.assertIn('-cltz', commands[0])
+        self.assertFalse(any(arg.startswith('--files-from=') for arg in commands[0]))
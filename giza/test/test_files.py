@@ -0,0 +1,104 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+from giza.tools.files import (write_if_changed, summarize_writes, WriteResult,
+                              file_signature, hash_file, hash_files)
+
+class TestWriteIfChanged(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.fn = os.path.join(self.dir, 'sub', 'output.rst')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_creates_missing_file(self):
+        r = write_if_changed(self.fn, ['a', 'b'])
+
+        self.assertTrue(r.changed)
+        with open(self.fn) as f:
+            self.assertEqual(f.read(), 'a\nb\n')
+
+    def test_unchanged_file_keeps_mtime(self):
+        write_if_changed(self.fn, ['a', 'b'])
+        os.utime(self.fn, (1, 1))
+
+        r = write_if_changed(self.fn, 'a\nb\n')
+
+        self.assertFalse(r.changed)
+        self.assertEqual(os.path.getmtime(self.fn), 1)
+
+    def test_changed_file_is_rewritten(self):
+        write_if_changed(self.fn, ['a', 'b'])
+        r = write_if_changed(self.fn, ['a', 'c'])
+
+        self.assertTrue(r.changed)
+        with open(self.fn) as f:
+            self.assertEqual(f.read(), 'a\nc\n')
+        self.assertEqual(os.listdir(os.path.dirname(self.fn)), ['output.rst'])
+
+    def test_summarize_nested_results(self):
+        results = [ WriteResult('a', True),
+                    [ WriteResult('b', False), WriteResult('c', True) ],
+                    None, (0, 'sphinx output') ]
+
+        changed, unchanged = summarize_writes(results)
+
+        self.assertEqual(changed, ['a', 'c'])
+        self.assertEqual(unchanged, 1)
+
+class TestFileSignatures(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.fns = [ os.path.join(self.dir, str(i)) for i in range(4) ]
+        for fn in self.fns:
+            with open(fn, 'w') as f:
+                f.write(fn)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_signature_fields(self):
+        sig = file_signature(self.fns[0])
+
+        self.assertEqual(sig[0], hash_file(self.fns[0]))
+        self.assertEqual(sig[1], len(self.fns[0]))
+        self.assertEqual(sig[3], os.stat(self.fns[0]).st_ino)
+
+    def test_unchanged_stat_reuses_digest(self):
+        previous = hash_files(self.fns, pool_size=2)
+        previous[self.fns[0]][0] = 'stale'
+
+        current = hash_files(self.fns, previous, pool_size=2)
+
+        self.assertEqual(current[self.fns[0]][0], 'stale')
+        self.assertEqual(current[self.fns[1]], previous[self.fns[1]])
+
+    def test_changed_stat_rehashes(self):
+        previous = hash_files(self.fns)
+        previous[self.fns[0]][0] = 'stale'
+        previous[self.fns[0]][2] -= 1
+
+        current = hash_files(self.fns, previous)
+
+        self.assertEqual(current[self.fns[0]][0], hash_file(self.fns[0]))
+
+    def test_missing_files_are_skipped(self):
+        self.assertEqual(len(hash_files(self.fns + [os.path.join(self.dir, 'missing')])), 4)
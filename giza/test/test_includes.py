@@ -0,0 +1,114 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+import giza.includes
+from giza.includes import scan_includes, IncludeGraph
+
+def write_file(path, content):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+
+    with open(path, 'w') as f:
+        f.write(content)
+
+class TestIncludeScanner(TestCase):
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.index = os.path.join(self.source, 'index.txt')
+        self.page = os.path.join(self.source, 'tutorial', 'page.txt')
+
+        write_file(self.index, '\n'.join(['Title', '=====', '',
+                                          '.. include:: /includes/intro.rst', '',
+                                          '   .. literalinclude:: /includes/example.js',
+                                          '      :language: javascript', '']))
+        write_file(self.page, '.. figure:: /images/diagram.png\n')
+        write_file(os.path.join(self.source, 'includes', 'intro.rst'), 'no directives\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.source)
+
+    def test_finds_all_directive_types(self):
+        results = scan_includes(self.source)
+
+        self.assertEqual(results, {
+            self.index: ['/includes/intro.rst', '/includes/example.js'],
+            self.page: ['/images/diagram.png'],
+        })
+
+    def test_rescan_reads_only_changed_files(self):
+        scan_includes(self.source)
+
+        write_file(self.page, '.. include:: /includes/intro.rst\n')
+        os.utime(self.page, (1, 1))
+
+        read = []
+        original = giza.includes._scan_file
+        def tracking_scan(fn):
+            read.append(fn)
+            return original(fn)
+
+        giza.includes._scan_file = tracking_scan
+        try:
+            results = scan_includes(self.source, pool_size=4)
+        finally:
+            giza.includes._scan_file = original
+
+        self.assertEqual(read, [self.page])
+        self.assertEqual(results[self.page], ['/includes/intro.rst'])
+
+class TestIncludeGraph(TestCase):
+    def setUp(self):
+        self.graph = IncludeGraph({
+            '/includes/leaf.rst': ['/includes/middle.rst'],
+            '/includes/middle.rst': ['/includes/top.rst', '/tutorial/b.txt'],
+            '/includes/top.rst': ['/tutorial/a.txt'],
+            '/includes/cycle-a.rst': ['/includes/cycle-b.rst'],
+            '/includes/cycle-b.rst': ['/includes/cycle-a.rst', '/tutorial/c.txt'],
+        })
+
+    def test_nested_dependents(self):
+        self.assertEqual(self.graph.dependents('/includes/leaf.rst'),
+                         set(['/includes/middle.rst', '/includes/top.rst',
+                              '/tutorial/a.txt', '/tutorial/b.txt']))
+
+    def test_dependencies(self):
+        self.assertEqual(self.graph.dependencies('/tutorial/a.txt'),
+                         set(['/includes/top.rst', '/includes/middle.rst',
+                              '/includes/leaf.rst']))
+        self.assertEqual(self.graph.dependencies('/includes/leaf.rst'), set())
+
+    def test_cycles(self):
+        self.assertEqual(self.graph.dependents('/includes/cycle-a.rst'),
+                         set(['/includes/cycle-a.rst', '/includes/cycle-b.rst',
+                              '/tutorial/c.txt']))
+
+    def test_affected_matches_closure(self):
+        changed = ['/includes/top.rst', '/includes/cycle-b.rst', '/missing.rst']
+        expected = set()
+        for fn in changed:
+            expected.update(self.graph.dependents(fn))
+
+        self.assertEqual(self.graph.affected(changed), expected)
+
+    def test_deep_chain(self):
+        graph = dict(('/includes/{0}.rst'.format(i), ['/includes/{0}.rst'.format(i + 1)])
+                     for i in range(5000))
+
+        self.assertEqual(len(IncludeGraph(graph).dependents('/includes/0.rst')), 5000)
@@ -0,0 +1,139 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import sys
+import tempfile
+
+from unittest import TestCase
+
+from giza.tools.inkscape import (render_images, get_export_args,
+                                 InkscapeShell, InkscapeError)
+
+# emulates the "inkscape --shell" protocol: prints a prompt, reads one set of
+# arguments per line, and writes the export target. Records each started
+# process in the log file given as its first argument.
+fake_inkscape = r'''
+import shlex
+import sys
+
+with open(sys.argv[1], 'a') as log:
+    log.write('start\n')
+
+sys.stdout.write('Inkscape interactive shell mode.\n>')
+sys.stdout.flush()
+
+for line in iter(sys.stdin.readline, ''):
+    args = shlex.split(line)
+    if args == ['quit']:
+        break
+
+    for flag in ('-e', '-E'):
+        if flag in args:
+            target = args[args.index(flag) + 1]
+            with open(args[0]) as src:
+                with open(target, 'w') as f:
+                    f.write(' '.join(args[1:args.index(flag)]) + '\n' + src.read())
+
+    sys.stdout.write('\n>')
+    sys.stdout.flush()
+'''
+
+class TestInkscapeRendering(TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cache = os.path.join(self.path, 'cache')
+        self.log = os.path.join(self.path, 'log')
+
+        script = os.path.join(self.path, 'fake_inkscape.py')
+        with open(script, 'w') as f:
+            f.write(fake_inkscape)
+
+        self.cmd = [ sys.executable, script, self.log ]
+
+        self.sources = []
+        for name in ('one', 'two'):
+            fn = os.path.join(self.path, name + '.svg')
+            with open(fn, 'w') as f:
+                f.write('<svg>{0}</svg>'.format(name))
+            self.sources.append(fn)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def starts(self):
+        if not os.path.isfile(self.log):
+            return 0
+
+        with open(self.log) as f:
+            return len(f.readlines())
+
+    def renders(self, prefix):
+        renders = []
+        for source in self.sources:
+            base = os.path.splitext(source)[0]
+            renders.append((source, base + prefix + '.png', 90, 300, 'png'))
+            renders.append((source, base + prefix + '.eps', 300, 900, 'eps'))
+
+        return renders
+
+    def test_export_args(self):
+        self.assertEqual(get_export_args('a.svg', 'a.png', 90, 300, 'png'),
+                         ['a.svg', '-z', '-d', '90', '-w', '300', '-y', '0.0', '-e', 'a.png'])
+        self.assertEqual(get_export_args('a.svg', 'a.eps', 300, 900, 'eps'),
+                         ['a.svg', '-z', '-d', '300', '-w', '900', '-y', '1.0', '-E', 'a.eps'])
+
+    def test_one_process_for_all_images(self):
+        renders = self.renders('')
+
+        self.assertEqual(render_images(renders, self.cache, self.cmd), 4)
+        self.assertEqual(self.starts(), 1)
+
+        for source, target, dpi, width, build_type in renders:
+            with open(target) as f:
+                self.assertIn('-d {0} -w {1}'.format(dpi, width), f.read())
+
+    def test_cache_hits_do_not_start_inkscape(self):
+        render_images(self.renders('-a'), self.cache, self.cmd)
+
+        renders = self.renders('-b')
+        self.assertEqual(render_images(renders, self.cache, self.cmd), 0)
+        self.assertEqual(self.starts(), 1)
+
+        for source, target, dpi, width, build_type in renders:
+            with open(target) as f:
+                with open(target.replace('-b.', '-a.')) as expected:
+                    self.assertEqual(f.read(), expected.read())
+
+    def test_changed_source_is_rendered(self):
+        render_images(self.renders('-a'), self.cache, self.cmd)
+
+        with open(self.sources[0], 'w') as f:
+            f.write('<svg>changed</svg>')
+
+        self.assertEqual(render_images(self.renders('-b'), self.cache, self.cmd), 2)
+        self.assertEqual(self.starts(), 2)
+
+    def test_settings_are_part_of_the_key(self):
+        source = self.sources[0]
+        render_images([(source, source + '-1.png', 90, 300, 'png')], self.cache, self.cmd)
+
+        self.assertEqual(render_images([(source, source + '-2.png', 90, 600, 'png')], self.cache, self.cmd), 1)
+
+    def test_missing_output_raises(self):
+        with InkscapeShell(self.cmd) as shell:
+            self.assertRaises(InkscapeError, shell.export,
+                              os.path.join(self.path, 'missing.svg'),
+                              os.path.join(self.path, 'missing.png'), 90, 300, 'png')
@@ -0,0 +1,92 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+from giza.content.post.json_output import (strip_markup, process_json_files,
+                                           merge_json_signatures, load_json_signatures)
+
+class Namespace(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+class TestStripMarkup(TestCase):
+    def test_tags(self):
+        self.assertEqual(strip_markup('<p>Use <a class="headerlink" href="#x">the</a> <code>shell</code></p>'),
+                         'Use the shell')
+
+    def test_entities(self):
+        self.assertEqual(strip_markup('&#8220;a&#8221; &#8216;b&#8217; &lt;c&gt;&nbsp;&#8212;'),
+                         '"a" \'b\' <c>')
+
+    def test_replaced_brackets_are_text(self):
+        self.assertEqual(strip_markup('&lt;b&gt;'), '<b>')
+
+class TestProcessJsonFiles(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.conf = Namespace(project=Namespace(url='http://docs.example.net', basepath='manual',
+                                                branched=False))
+
+        self.files = []
+        for name in ('index', 'about'):
+            fjson = os.path.join(self.dir, name + '.fjson')
+            with open(fjson, 'w') as f:
+                json.dump({ 'title': '<em>{0}</em>'.format(name), 'body': '<p>{0}</p>\nbody'.format(name) }, f)
+
+            self.files.append((fjson, os.path.join(self.dir, name + '.json')))
+
+        self.fragments = os.path.join(self.dir, 'signatures')
+        self.signatures = os.path.join(self.dir, 'signatures.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def run_chunks(self):
+        signatures = load_json_signatures(self.signatures)
+        processed = process_json_files(self.files, signatures, os.path.join(self.fragments, '0.json'), self.conf)
+        merge_json_signatures(self.fragments, self.signatures)
+
+        return processed
+
+    def test_processes_documents(self):
+        self.assertEqual(self.run_chunks(), 2)
+
+        with open(self.files[0][1]) as f:
+            doc = json.load(f)
+
+        self.assertEqual(doc['title'], 'index')
+        self.assertEqual(doc['text'], 'index body')
+
+    def test_skips_unchanged_input(self):
+        self.run_chunks()
+
+        # rewriting a file with the same content doesn't count as a change.
+        with open(self.files[0][0], 'r') as f:
+            content = f.read()
+        with open(self.files[0][0], 'w') as f:
+            f.write(content)
+
+        self.assertEqual(self.run_chunks(), 0)
+
+        with open(self.files[1][0], 'w') as f:
+            json.dump({ 'title': 'changed' }, f)
+
+        self.assertEqual(self.run_chunks(), 1)
+        self.assertFalse(os.path.exists(self.fragments))
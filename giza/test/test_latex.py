@@ -0,0 +1,131 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+import giza.content.post.latex
+from giza.content.post.latex import _render_tex_into_pdf
+
+class Namespace(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+class FakeLatex(object):
+    """
+    Simulates a document whose cross references settle after two passes.
+    """
+
+    def __init__(self, path):
+        self.base = os.path.join(path, 'manual')
+        self.commands = []
+        self.failures = 0
+
+    def write(self, ext, content):
+        with open(self.base + ext, 'w') as f:
+            f.write(content)
+
+    def __call__(self, command, ignore=False):
+        if 'pdflatex' in command:
+            self.commands.append('pdflatex')
+
+            # page numbers are only right once the previous pass wrote them.
+            if os.path.isfile(self.base + '.aux'):
+                self.write('.aux', 'refs 2')
+            else:
+                self.write('.aux', 'refs 1')
+
+            self.write('.idx', 'entries')
+
+            if self.failures > 0:
+                self.failures -= 1
+                self.write('.pdf', 'partial pdf')
+                return Namespace(succeeded=False)
+
+            self.write('.pdf', 'pdf')
+        elif 'makeindex' in command:
+            self.commands.append('makeindex')
+            self.write('.ind', 'index')
+
+        return Namespace(succeeded=True)
+
+class TestRenderPdf(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.tex = os.path.join(self.dir, 'manual.tex')
+        self.deployed = os.path.join(self.dir, 'public', 'manual.pdf')
+        os.makedirs(os.path.dirname(self.deployed))
+
+        with open(self.tex, 'w') as f:
+            f.write('\\documentclass{manual}')
+
+        self.latex = FakeLatex(self.dir)
+        self.original = giza.content.post.latex.command
+        giza.content.post.latex.command = self.latex
+
+    def tearDown(self):
+        giza.content.post.latex.command = self.original
+        shutil.rmtree(self.dir)
+
+    def render(self):
+        self.latex.commands = []
+        self.result = _render_tex_into_pdf(self.tex, self.deployed, self.dir)
+        return self.latex.commands
+
+    def change_tex(self):
+        with open(self.tex, 'a') as f:
+            f.write('\nchanged')
+
+    def test_stops_when_converged(self):
+        self.assertEqual(self.render(), ['pdflatex', 'makeindex', 'pdflatex', 'pdflatex'])
+        self.assertTrue(os.path.isfile(self.deployed))
+
+        with open(os.path.join(self.dir, 'manual.render.json')) as f:
+            self.assertEqual(len(json.load(f)['timings']), 4)
+
+    def test_skips_unchanged_tex(self):
+        self.render()
+        self.assertEqual(self.render(), [])
+
+    def test_one_pass_when_references_are_stable(self):
+        self.render()
+        self.change_tex()
+
+        self.assertEqual(self.render(), ['pdflatex', 'makeindex'])
+
+    def test_failed_first_pass_does_not_converge(self):
+        self.render()
+        self.change_tex()
+        self.latex.failures = 1
+
+        self.assertEqual(self.render(), ['pdflatex', 'makeindex', 'pdflatex'])
+
+        with open(self.deployed) as f:
+            self.assertEqual(f.read(), 'pdf')
+
+    def test_failed_passes_do_not_deploy(self):
+        self.render()
+        os.remove(self.deployed)
+        self.change_tex()
+        self.latex.failures = 2
+
+        self.render()
+
+        self.assertFalse(self.result)
+        self.assertFalse(os.path.exists(self.deployed))
+        self.assertEqual(self.render(), ['pdflatex', 'makeindex'])
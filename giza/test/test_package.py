@@ -0,0 +1,248 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+
+from unittest import TestCase
+
+from giza.tools.package import (PackageError, PackageWriter, create_package_file,
+                                extract_package_chain, extract_package_file,
+                                read_index, verify_package)
+
+class Stream(object):
+    # a file object that cannot seek, like an HTTP response.
+    def __init__(self, fn):
+        with open(fn, 'rb') as f:
+            self.data = io.BytesIO(f.read())
+
+    def read(self, size=-1):
+        return self.data.read(size)
+
+class TestPackage(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.build = os.path.join(self.dir, 'build')
+        self.fn = os.path.join(self.dir, 'archive', 'package.tar.gz')
+
+        for builder in ('html', 'dirhtml'):
+            for i in range(3):
+                self.write(os.path.join(self.build, builder, 'page-{0}.html'.format(i)),
+                           '{0} page {1}\n'.format(builder, i) * 100)
+
+        self.write(os.path.join(self.build, 'conf.pickle'), 'conf')
+        self.write(os.path.join(self.build, 'html', 'reference', 'x' * 120 + '.html'), 'long name')
+        os.symlink('page-0.html', os.path.join(self.build, 'html', 'index.html'))
+
+        self.paths = [ (os.path.join(self.build, 'dirhtml'), 'master/dirhtml'),
+                       (os.path.join(self.build, 'html'), 'master/html'),
+                       (os.path.join(self.build, 'conf.pickle'), 'conf.pickle') ]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, fn, content):
+        if not os.path.isdir(os.path.dirname(fn)):
+            os.makedirs(os.path.dirname(fn))
+
+        with open(fn, 'w') as f:
+            f.write(content)
+
+    def read(self, *parts):
+        with open(os.path.join(self.dir, 'out', *parts)) as f:
+            return f.read()
+
+    def create(self, chunk_size=None):
+        writer = PackageWriter(self.fn, threads=2, chunk_size=chunk_size)
+        for path, arcname in self.paths:
+            writer.add(path, arcname)
+
+        return writer.close()
+
+    def test_trees_do_not_share_chunks(self):
+        index = self.create(chunk_size=2048)
+
+        chunks = {}
+        for m in index['members']:
+            chunks.setdefault(m.name.split('/')[1] if '/' in m.name else m.name, set()).add(m.chunk)
+
+        self.assertGreater(len(chunks['html']), 1)
+        self.assertFalse(chunks['html'] & chunks['dirhtml'])
+        self.assertFalse(chunks['conf.pickle'] & chunks['html'])
+
+    def test_readable_as_tarball(self):
+        self.create(chunk_size=2048)
+
+        with tarfile.open(self.fn, 'r:gz') as t:
+            names = t.getnames()
+
+        self.assertIn('master/html/page-2.html', names)
+        self.assertIn('conf.pickle', names)
+
+    def test_extract(self):
+        self.create(chunk_size=2048)
+
+        extract_package_file(self.fn, os.path.join(self.dir, 'out'), threads=2)
+
+        self.assertEqual(self.read('master', 'html', 'page-1.html'), 'html page 1\n' * 100)
+        self.assertEqual(os.readlink(os.path.join(self.dir, 'out', 'master', 'html', 'index.html')), 'page-0.html')
+        self.assertEqual(self.read('conf.pickle'), 'conf')
+
+    def test_large_files_have_their_own_chunks(self):
+        self.write(os.path.join(self.build, 'html', 'large.bin'), 'large file\n' * 1000)
+
+        index = self.create(chunk_size=4096)
+        large = [ m for m in index['members'] if m.name == 'master/html/large.bin' ][0]
+
+        self.assertEqual(large.offset, 0)
+        self.assertEqual([ m.name for m in index['members'] if m.chunk == large.chunk ], [ large.name ])
+        self.assertEqual(verify_package(self.fn, members=True)['chunks'], index['chunks'])
+
+        extract_package_file(self.fn, os.path.join(self.dir, 'out'), threads=2)
+        self.assertEqual(self.read('master', 'html', 'large.bin'), 'large file\n' * 1000)
+        self.assertEqual(self.read('master', 'html', 'page-2.html'), 'html page 2\n' * 100)
+
+    def test_extract_selected_trees_from_stream(self):
+        create_package_file(self.fn, self.paths)
+
+        members = extract_package_file(Stream(self.fn), os.path.join(self.dir, 'out'),
+                                       prefixes=['master/dirhtml'])
+
+        self.assertEqual(len(members), 4)
+        self.assertEqual(self.read('master', 'dirhtml', 'page-2.html'), 'dirhtml page 2\n' * 100)
+        self.assertFalse(os.path.exists(os.path.join(self.dir, 'out', 'master', 'html')))
+
+    def test_verify(self):
+        index = self.create(chunk_size=2048)
+
+        self.assertEqual(verify_package(self.fn, members=True)['chunks'], index['chunks'])
+
+        with open(self.fn, 'r+b') as f:
+            f.seek(-100, os.SEEK_END)
+            f.write(b'corrupt')
+
+        self.assertRaises(PackageError, verify_package, self.fn)
+
+    def test_rejects_other_tarballs(self):
+        os.makedirs(os.path.dirname(self.fn))
+        with tarfile.open(self.fn, 'w:gz') as t:
+            t.add(os.path.join(self.build, 'conf.pickle'), 'conf.pickle')
+
+        with open(self.fn, 'rb') as f:
+            self.assertRaises(PackageError, read_index, f)
+
+    def create_tarball(self):
+        os.makedirs(os.path.dirname(self.fn))
+        with tarfile.open(self.fn, 'w:gz') as t:
+            for path, arcname in self.paths:
+                t.add(path, arcname)
+
+    def test_extract_tarball_from_stream(self):
+        self.create_tarball()
+
+        members = extract_package_file(Stream(self.fn), os.path.join(self.dir, 'out'),
+                                       prefixes=['master/html'])
+
+        self.assertIn('master/html/page-1.html', [ m.name for m in members ])
+        self.assertEqual(self.read('master', 'html', 'page-1.html'), 'html page 1\n' * 100)
+        self.assertEqual(os.readlink(os.path.join(self.dir, 'out', 'master', 'html', 'index.html')), 'page-0.html')
+        self.assertFalse(os.path.exists(os.path.join(self.dir, 'out', 'master', 'dirhtml')))
+
+    def test_extract_tarball_chain(self):
+        self.create_tarball()
+
+        extract_package_chain(self.fn, os.path.join(self.dir, 'out'))
+
+        self.assertEqual(self.read('conf.pickle'), 'conf')
+
+class TestDeltaPackage(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.build = os.path.join(self.dir, 'build')
+        self.archive = os.path.join(self.dir, 'archive')
+        self.out = os.path.join(self.dir, 'out')
+
+        for i in range(3):
+            self.write('html/page-{0}.html'.format(i), 'page {0}'.format(i))
+
+        self.base = os.path.join(self.archive, 'cache-base.tar.gz')
+        create_package_file(self.base, [ (self.build, 'build') ])
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, rel, content):
+        fn = os.path.join(self.build, rel)
+        if not os.path.isdir(os.path.dirname(fn)):
+            os.makedirs(os.path.dirname(fn))
+
+        with open(fn, 'w') as f:
+            f.write(content)
+
+    def read(self, rel):
+        with open(os.path.join(self.out, 'build', rel)) as f:
+            return f.read()
+
+    def delta(self, name, base):
+        fn = os.path.join(self.archive, name)
+        return fn, create_package_file(fn, [ (self.build, 'build') ], base=base)
+
+    def test_delta_contains_changes(self):
+        self.write('html/page-1.html', 'new page 1')
+        self.write('html/page-3.html', 'page 3')
+        os.remove(os.path.join(self.build, 'html', 'page-2.html'))
+
+        fn, index = self.delta('cache-delta.tar.gz', self.base)
+
+        self.assertEqual(index['base'], 'cache-base.tar.gz')
+        self.assertEqual([ m.name for m in index['members'] ],
+                         [ 'build/html/page-1.html', 'build/html/page-3.html' ])
+        self.assertEqual(index['deleted'], [ 'build/html/page-2.html' ])
+        self.assertRaises(PackageError, extract_package_file, fn, self.out)
+
+    def test_extract_chain(self):
+        self.write('html/page-1.html', 'new page 1')
+        first, _ = self.delta('cache-delta-1.tar.gz', self.base)
+
+        self.write('html/page-0.html', 'new page 0')
+        os.remove(os.path.join(self.build, 'html', 'page-2.html'))
+        second, index = self.delta('cache-delta-2.tar.gz', first)
+
+        self.assertEqual([ m.name for m in index['members'] ], [ 'build/html/page-0.html' ])
+
+        # a stale file from an earlier build that the chain deleted.
+        extract_package_file(self.base, self.out)
+        extracted = extract_package_chain(second, self.out)
+
+        self.assertEqual(len(extracted), 4)
+        self.assertEqual(self.read('html/page-0.html'), 'new page 0')
+        self.assertEqual(self.read('html/page-1.html'), 'new page 1')
+        self.assertFalse(os.path.exists(os.path.join(self.out, 'build', 'html', 'page-2.html')))
+
+    def test_base_is_not_a_package(self):
+        fn, _ = self.delta('cache-delta.tar.gz', self.base)
+        with tarfile.open(self.base, 'w:gz') as t:
+            t.add(self.build, 'build')
+
+        self.assertRaises(PackageError, extract_package_chain, fn, self.out)
+        self.assertFalse(os.path.exists(self.out))
+
+    def test_missing_base(self):
+        fn, _ = self.delta('cache-delta.tar.gz', self.base)
+        os.remove(self.base)
+
+        self.assertRaises(IOError, extract_package_chain, fn, self.out)
@@ -0,0 +1,151 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+from giza.content.post.sites import get_publish_manifest_file, get_publish_snapshots_dir
+from giza.tools.publish import publish_tree
+
+class Namespace(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+class TestPublishTree(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.dir, 'dirhtml')
+        self.public = os.path.join(self.dir, 'public', 'master')
+        self.snapshots = os.path.join(self.dir, 'snapshots')
+        self.manifest = os.path.join(self.dir, 'manifest.json')
+
+        self.write(self.source, 'index.html', 'index')
+        self.write(self.source, 'tutorial/index.html', 'tutorial')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, root, rel, content):
+        fn = os.path.join(root, rel)
+        if not os.path.isdir(os.path.dirname(fn)):
+            os.makedirs(os.path.dirname(fn))
+
+        with open(fn, 'w') as f:
+            f.write(content)
+
+    def read(self, rel):
+        with open(os.path.join(self.public, rel)) as f:
+            return f.read()
+
+    def publish(self, excluded=None):
+        return publish_tree(self.source, self.public, self.snapshots, self.manifest, excluded)
+
+    def test_first_publish_copies_everything(self):
+        self.assertEqual(self.publish(), 2)
+
+        self.assertTrue(os.path.islink(self.public))
+        self.assertEqual(self.read('tutorial/index.html'), 'tutorial')
+
+    def test_unchanged_files_are_hard_links(self):
+        self.publish()
+        first = os.path.realpath(self.public)
+        self.write(self.source, 'index.html', 'new index')
+
+        self.assertEqual(self.publish(), 1)
+
+        second = os.path.realpath(self.public)
+        self.assertNotEqual(first, second)
+        self.assertEqual(self.read('index.html'), 'new index')
+        self.assertEqual(os.stat(os.path.join(first, 'tutorial', 'index.html')).st_ino,
+                         os.stat(os.path.join(second, 'tutorial', 'index.html')).st_ino)
+
+        # the previous snapshot is intact for readers that still use it.
+        with open(os.path.join(first, 'index.html')) as f:
+            self.assertEqual(f.read(), 'index')
+
+    def test_keeps_files_from_other_tasks(self):
+        self.publish()
+        self.write(self.public, 'single/index.html', 'single')
+
+        self.publish()
+
+        self.assertEqual(self.read('single/index.html'), 'single')
+
+    def test_removes_old_snapshots(self):
+        for _ in range(3):
+            self.publish()
+
+        self.assertEqual(sorted(os.listdir(self.snapshots)), ['2', '3'])
+
+    def test_replaces_existing_directory(self):
+        self.write(self.public, 'old.html', 'old')
+
+        self.publish()
+
+        self.assertTrue(os.path.islink(self.public))
+        self.assertEqual(self.read('old.html'), 'old')
+        self.assertEqual(self.read('index.html'), 'index')
+
+    def test_keeps_existing_directory_for_one_publish(self):
+        self.write(self.public, 'old.html', 'old')
+
+        self.publish()
+        self.assertEqual(sorted(os.listdir(self.snapshots)), ['.legacy-1', '1'])
+
+        self.publish()
+        self.assertEqual(sorted(os.listdir(self.snapshots)), ['1', '2'])
+
+    def test_excluded_files(self):
+        self.publish(excluded=['tutorial/index.html'])
+
+        self.assertFalse(os.path.exists(os.path.join(self.public, 'tutorial', 'index.html')))
+        self.assertTrue(os.path.exists(os.path.join(self.public, 'index.html')))
+
+class TestPublishLanguages(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def publish(self, public, content):
+        source = os.path.join(self.dir, 'build', 'master', 'dirhtml-' + public)
+        if not os.path.isdir(source):
+            os.makedirs(source)
+
+        with open(os.path.join(source, 'index.html'), 'w') as f:
+            f.write(content)
+
+        conf = Namespace(paths=Namespace(projectroot=self.dir,
+                                         output='build',
+                                         branch_output=os.path.join('build', 'master'),
+                                         public_site_output=os.path.join('build', public, 'master')))
+
+        publish_tree(source, os.path.join(self.dir, conf.paths.public_site_output),
+                     get_publish_snapshots_dir(conf), get_publish_manifest_file(conf))
+
+    def read(self, public):
+        with open(os.path.join(self.dir, 'build', public, 'master', 'index.html')) as f:
+            return f.read()
+
+    def test_languages_have_their_own_snapshots(self):
+        for content in ('first', 'second'):
+            self.publish('public', 'en ' + content)
+            self.publish('public-es', 'es ' + content)
+
+        self.assertEqual(self.read('public'), 'en second')
+        self.assertEqual(self.read('public-es'), 'es second')
@@ -0,0 +1,78 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+from giza.tools.search_index import (SearchIndex, update_index, tokenize,
+                                     encode_postings, decode_postings)
+
+class TestPostings(TestCase):
+    def test_tokenize(self):
+        self.assertEqual(tokenize('Use db.collection.find() with $set.'),
+                         ['use', 'db.collection.find', 'with', '$set'])
+
+    def test_round_trip(self):
+        postings = [(0, [1, 5, 300]), (7, [0]), (200, [2, 40000])]
+
+        self.assertEqual(decode_postings(encode_postings(postings)), postings)
+
+class TestSearchIndex(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.fn = os.path.join(self.dir, 'search-index.idx')
+        self.docs = {
+            'install': ('/install/', 'Install', 'install the server and start the server'),
+            'find': ('/find/', 'Query Documents', 'use db.collection.find to query documents'),
+            'update': ('/update/', 'Update Documents', 'use $set to update documents'),
+        }
+        self.read = []
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def read_document(self, key):
+        self.read.append(key)
+        return self.docs.get(key)
+
+    def test_lookup_and_search(self):
+        update_index(self.fn, { 'install': 'a', 'find': 'b', 'update': 'c' }, self.read_document)
+
+        with SearchIndex(self.fn) as index:
+            self.assertEqual(index.doc_count, 3)
+            # positions count from the first word of the title.
+            self.assertEqual(index.lookup('server'), [(1, [3, 7])])
+            self.assertEqual(index.lookup('missing'), [])
+
+            self.assertEqual([ d.url for d in index.search('documents') ], ['/find/', '/update/'])
+            self.assertEqual([ d.url for d in index.search('update $set') ], ['/update/'])
+
+    def test_incremental_update(self):
+        update_index(self.fn, { 'install': 'a', 'find': 'b', 'update': 'c' }, self.read_document)
+        self.read = []
+
+        self.docs['update'] = ('/update/', 'Modify Documents', 'use $inc')
+        changed = update_index(self.fn, { 'install': 'a', 'update': 'd' }, self.read_document)
+
+        self.assertEqual(changed, 1)
+        self.assertEqual(self.read, ['update'])
+
+        with SearchIndex(self.fn) as index:
+            self.assertEqual(sorted(d.key for d in index.documents()), ['install', 'update'])
+            self.assertEqual([ d.url for d in index.search('server') ], ['/install/'])
+            self.assertEqual(index.search('find'), [])
+            self.assertEqual([ d.title for d in index.search('$inc') ], ['Modify Documents'])
@@ -0,0 +1,137 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import gzip
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+from xml.etree import ElementTree
+
+import giza.tools.sitemap
+from giza.tools.sitemap import write_sitemaps
+from giza.content.post.sites import filter_sitemap_urls, get_sitemap_config, get_sitemap_urls
+
+class Namespace(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+namespace = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+
+class TestWriteSitemaps(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.base_url = 'http://docs.example.net/manual/'
+        self.urls = [ self.base_url + 'page-{0}/'.format(i) for i in range(5) ]
+        self.max_urls = giza.tools.sitemap.max_urls
+
+    def tearDown(self):
+        giza.tools.sitemap.max_urls = self.max_urls
+        shutil.rmtree(self.dir)
+
+    def read(self, name):
+        with gzip.open(os.path.join(self.dir, name)) as f:
+            return ElementTree.fromstring(f.read())
+
+    def locations(self, name):
+        return [ loc.text for loc in self.read(name).iter(namespace + 'loc') ]
+
+    def test_single_sitemap(self):
+        written = write_sitemaps(self.dir, self.base_url, self.urls)
+
+        self.assertEqual(written, [ os.path.join(self.dir, 'sitemap.xml.gz') ])
+        self.assertEqual(self.read('sitemap.xml.gz').tag, namespace + 'urlset')
+        self.assertEqual(self.locations('sitemap.xml.gz'), sorted(self.urls))
+
+    def test_split_with_index(self):
+        giza.tools.sitemap.max_urls = 2
+
+        written = write_sitemaps(self.dir, self.base_url, self.urls)
+
+        self.assertEqual(len(written), 4)
+        self.assertEqual(self.read('sitemap.xml.gz').tag, namespace + 'sitemapindex')
+        self.assertEqual(self.locations('sitemap.xml.gz'),
+                         [ self.base_url + 'sitemap-{0}.xml.gz'.format(i) for i in (1, 2, 3) ])
+        self.assertEqual(self.locations('sitemap-3.xml.gz'), sorted(self.urls)[4:])
+
+    def test_unchanged_urls_are_not_written(self):
+        write_sitemaps(self.dir, self.base_url, self.urls)
+
+        self.assertEqual(write_sitemaps(self.dir, self.base_url, list(reversed(self.urls))), [])
+        self.assertEqual(len(write_sitemaps(self.dir, self.base_url, self.urls[1:])), 1)
+
+    def test_removes_parts_of_larger_sitemap(self):
+        giza.tools.sitemap.max_urls = 2
+        write_sitemaps(self.dir, self.base_url, self.urls)
+
+        giza.tools.sitemap.max_urls = self.max_urls
+        write_sitemaps(self.dir, self.base_url, self.urls[1:])
+
+        self.assertEqual(os.listdir(self.dir), ['sitemap.xml.gz'])
+
+    def test_escapes_urls(self):
+        write_sitemaps(self.dir, self.base_url, [ self.base_url + '?a=1&b=2' ])
+
+        self.assertEqual(self.locations('sitemap.xml.gz'), [ self.base_url + '?a=1&b=2' ])
+
+class TestSitemapUrls(TestCase):
+    def test_urls_from_dirhtml_files(self):
+        files = [ 'index.html', 'tutorial/index.html', 'tutorial/install/index.html',
+                  '_static/index.html', 'objects.inv', 'meta/404/index.html',
+                  'reference/a b/index.html' ]
+
+        urls = get_sitemap_urls('http://docs.example.net/manual/', files, [ 'meta/404' ])
+
+        self.assertEqual(urls, [ 'http://docs.example.net/manual/',
+                                 'http://docs.example.net/manual/tutorial/',
+                                 'http://docs.example.net/manual/tutorial/install/',
+                                 'http://docs.example.net/manual/reference/a%20b/' ])
+
+sitemap_config = """<?xml version="1.0" encoding="UTF-8"?>
+<site base_url="http://docs.example.net/manual" store_into="build/master/sitemap.xml.gz">
+  <directory path="build/public/master" url="http://docs.example.net/manual/" />
+  <filter action="pass" type="wildcard" pattern="*/reference/keep/*" />
+  <filter action="drop" type="wildcard" pattern="*/reference/*" />
+  <filter action="drop" type="regexp" pattern="/draft-[^/]*/$" />
+  <filter action="drop" type="regexp" pattern="(" />
+</site>
+"""
+
+class TestSitemapConfig(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.fn = os.path.join(self.dir, 'conf-sitemap.xml')
+        self.conf = Namespace(paths=Namespace(projectroot=self.dir),
+                              project=Namespace(url='http://docs.example.net', tag='ecosystem'))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_default_base_url(self):
+        self.assertEqual(get_sitemap_config(None, self.conf),
+                         ('http://docs.example.net/ecosystem/', []))
+
+    def test_filters(self):
+        with open(self.fn, 'w') as f:
+            f.write(sitemap_config)
+
+        base_url, filters = get_sitemap_config(None, self.conf)
+        urls = [ base_url + path for path in ('', 'tutorial/', 'reference/method/',
+                                              'reference/keep/method/', 'draft-1/') ]
+
+        self.assertEqual(base_url, 'http://docs.example.net/manual/')
+        self.assertEqual(len(filters), 3)
+        self.assertEqual(filter_sitemap_urls(urls, filters),
+                         [ base_url, base_url + 'tutorial/', base_url + 'reference/keep/method/' ])
@@ -0,0 +1,103 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+import giza.content.sphinx_engine
+from giza.content.sphinx_engine import group_builds, run_sphinx_group
+from giza.sphinxext import phase_timings_variable
+
+class Namespace(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+    def __contains__(self, key):
+        return key in self.__dict__
+
+conf_py = '''
+extensions = ['giza.sphinxext']
+master_doc = 'index'
+source_suffix = '.txt'
+
+def setup(app):
+    def count_reads(app, docname, source):
+        with open(reads_fn, 'a') as f:
+            f.write(docname + '\\n')
+
+    app.connect('source-read', count_reads)
+'''
+
+class TestSphinxGroups(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.reads = os.path.join(self.root, 'reads')
+
+        with open(os.path.join(self.root, 'conf.py'), 'w') as f:
+            f.write('reads_fn = {0!r}\n'.format(self.reads))
+            f.write(conf_py)
+
+        source = os.path.join(self.root, 'build', 'master', 'source')
+        os.makedirs(source)
+        for name in ('index', 'about'):
+            with open(os.path.join(source, name + '.txt'), 'w') as f:
+                f.write('{0}\n=====\n\n.. toctree::\n\n   about\n'.format(name))
+
+        self.conf = Namespace(paths=Namespace(projectroot=self.root,
+                                              branch_output=os.path.join('build', 'master'),
+                                              branch_source=os.path.join('build', 'master', 'source')),
+                              system=Namespace(targeted_rebuilds=False))
+
+        self.patched = {}
+        for name, replacement in (('prepare_sphinx_output', lambda *args: None),
+                                  ('run_sphinx_finalizers', lambda *args: None),
+                                  ('get_parallel_jobs', lambda conf: None)):
+            self.patched[name] = getattr(giza.content.sphinx_engine, name)
+            setattr(giza.content.sphinx_engine, name, replacement)
+
+    def tearDown(self):
+        for name, original in self.patched.items():
+            setattr(giza.content.sphinx_engine, name, original)
+
+        shutil.rmtree(self.root)
+
+    def sconf(self, builder):
+        return Namespace(builder=builder, edition=None, language=None,
+                         fq_build_output=os.path.join(self.root, 'build', 'master', builder))
+
+    def test_groups(self):
+        builds = [ (self.sconf(b), self.conf) for b in ('html', 'latex', 'dirhtml', 'gettext') ]
+
+        groups = group_builds(builds)
+
+        self.assertEqual(list(groups.keys()), ['source-website', 'source-print', 'source-gettext'])
+        self.assertEqual([ s.builder for s, c in groups['source-website'] ], ['html', 'dirhtml'])
+
+    def test_builders_share_read_phase(self):
+        builds = [ (self.sconf(b), self.conf) for b in ('html', 'dirhtml') ]
+
+        code, output, timings = run_sphinx_group('source-website', builds)
+
+        self.assertEqual(code, 0)
+        self.assertEqual(sorted(timings), ['dirhtml', 'html'])
+        self.assertEqual(sorted(timings['html']), ['read', 'total', 'write'])
+        self.assertNotIn(phase_timings_variable, os.environ)
+        with open(self.reads) as f:
+            self.assertEqual(sorted(f.read().split()), ['about', 'index'])
+
+        self.assertTrue(os.path.isfile(os.path.join(self.root, 'build', 'master', 'html', 'about.html')))
+        self.assertTrue(os.path.isfile(os.path.join(self.root, 'build', 'master', 'dirhtml', 'about', 'index.html')))
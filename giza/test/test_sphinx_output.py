@@ -0,0 +1,61 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+
+from unittest import TestCase
+
+from giza.content.sphinx import SphinxOutputFilter, is_msg_worthy
+from giza.tools.command import stream_command
+
+class Namespace(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+conf = Namespace(paths=Namespace(projectroot='/project', branch_output='build/master'))
+
+class TestSphinxOutputFilter(TestCase):
+    def test_ignored_messages(self):
+        self.assertFalse(is_msg_worthy('WARNING: unknown mimetype for x.bin'))
+        self.assertFalse(is_msg_worthy('x: WARNING: nonlocal image URI found: http://x'))
+        self.assertTrue(is_msg_worthy('source/index.txt:4: WARNING: undefined label: x'))
+
+    def test_normalizes_and_deduplicates(self):
+        f = SphinxOutputFilter(conf)
+        for l in ['/project/build/master/source/index.txt:4: WARNING: undefined label: x',
+                  'build/master/source/index.txt:4: WARNING: undefined label: x',
+                  'WARNING: search index couldn\'t be loaded',
+                  '']:
+            f.add(l)
+
+        self.assertEqual(f.close(), ['source/index.txt:4: WARNING: undefined label: x'])
+        self.assertEqual(f.count, 3)
+
+    def test_input_errors_join_previous_line(self):
+        f = SphinxOutputFilter(conf)
+        f.write('source/index.txt:4: ERROR: Problems with "include" directive path:\n'
+                'InputError: [Errno 2] No such file or directory: \'/project/build/master/source/missing.rst\'.\n'
+                'source/about.txt:1: WARN')
+        f.write('ING: title underline too short.')
+
+        self.assertEqual(f.close(), ['source/index.txt:4: ERROR: Problems with "include" directive path: source/missing.rst',
+                                     'source/about.txt:1: WARNING: title underline too short.'])
+
+    def test_stream_command(self):
+        lines = []
+        out = stream_command([sys.executable, '-c', '"import sys; print(1); sys.stderr.write(\'2\\\\n\'); sys.exit(3)"'],
+                             lines.append, ignore=True)
+
+        self.assertEqual(out.return_code, 3)
+        self.assertEqual(lines, ['1\n', '2\n'])
@@ -0,0 +1,85 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+from giza.content.sphinx_planner import load_timings, plan_parallel_jobs, record_timings
+
+class Namespace(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+class TestPlanParallelJobs(TestCase):
+    def setUp(self):
+        self.timings = { 'html': { 'total': 30, 'read': 10, 'write': 20 },
+                         'latex': { 'total': 15, 'read': 10, 'write': 5 },
+                         'man': { 'total': 5 } }
+
+    def test_splits_by_write_duration(self):
+        jobs = plan_parallel_jobs([['html'], ['latex']], self.timings, cores=10, concurrency=2)
+
+        self.assertEqual(sum(jobs), 10)
+        self.assertEqual(jobs, [7, 3])
+
+    def test_parallel_read(self):
+        jobs = plan_parallel_jobs([['html'], ['latex']], self.timings, cores=10, concurrency=2,
+                                  parallel_read=True)
+
+        self.assertEqual(jobs, [6, 4])
+
+    def test_total_without_phases(self):
+        jobs = plan_parallel_jobs([['html'], ['man']], self.timings, cores=7, concurrency=2)
+
+        self.assertEqual(jobs, [5, 2])
+
+    def test_unknown_builders_get_average(self):
+        jobs = plan_parallel_jobs([['epub'], ['html'], ['latex']], self.timings, cores=10, concurrency=3)
+
+        self.assertEqual(jobs, [3, 5, 2])
+
+    def test_groups_sum_durations(self):
+        jobs = plan_parallel_jobs([['html', 'latex'], ['man']], self.timings, cores=8, concurrency=2)
+
+        self.assertEqual(jobs, [6, 2])
+
+    def test_more_builds_than_cores(self):
+        jobs = plan_parallel_jobs([['html'], ['latex'], ['man']], self.timings, cores=2, concurrency=3)
+
+        self.assertEqual(jobs, [1, 1, 1])
+
+    def test_waves(self):
+        jobs = plan_parallel_jobs([['html'], ['latex'], ['man']], self.timings, cores=8, concurrency=2)
+
+        self.assertEqual(jobs, [4, 4, 4])
+
+class TestTimingRecord(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.conf = Namespace(system=Namespace(sphinx_timings=os.path.join(self.dir, 'build', 'sphinx-timings.json')))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_missing_record(self):
+        self.assertEqual(load_timings(self.conf), {})
+
+    def test_averages_durations(self):
+        record_timings(self.conf, { 'html': { 'total': 10, 'write': 6 } })
+        record_timings(self.conf, { 'html': { 'total': 20 }, 'latex': { 'total': 4 } })
+
+        self.assertEqual(load_timings(self.conf), { 'html': { 'total': 15 }, 'latex': { 'total': 4 } })
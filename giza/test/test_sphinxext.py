@@ -0,0 +1,113 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+from giza.sphinxext import (changed_documents_variable, extension_enabled, get_outdated, to_docname,
+                            phase_timings_variable, start_phase_timer,
+                            mark_read_complete, write_phase_timings)
+
+class Namespace(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+class TestChangedDocuments(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.fn = os.path.join(self.dir, 'changed-documents.json')
+        self.env = Namespace(found_docs=set(['index', 'tutorial/install', 'reference/method']))
+
+        with open(self.fn, 'w') as f:
+            json.dump(['index', 'tutorial/install', 'includes/intro'], f)
+
+        os.environ[changed_documents_variable] = self.fn
+
+    def tearDown(self):
+        del os.environ[changed_documents_variable]
+        shutil.rmtree(self.dir)
+
+    def test_to_docname(self):
+        self.assertEqual(to_docname('/tutorial/install.txt'), 'tutorial/install')
+
+    def test_reports_known_documents(self):
+        self.assertEqual(get_outdated(None, self.env, set(), set(['index']), set()),
+                         ['tutorial/install'])
+
+    def test_missing_file(self):
+        os.environ[changed_documents_variable] = os.path.join(self.dir, 'missing.json')
+
+        self.assertEqual(get_outdated(None, self.env, set(), set(), set()), [])
+
+    def test_configuration_overrides_environment(self):
+        os.environ[changed_documents_variable] = os.path.join(self.dir, 'missing.json')
+        app = Namespace(config=Namespace(giza_changed_documents=self.fn))
+
+        self.assertEqual(get_outdated(app, self.env, set(), set(), set()),
+                         ['index', 'tutorial/install'])
+
+class TestExtensionEnabled(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.fn = os.path.join(self.dir, 'conf.py')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def enabled(self, content):
+        with open(self.fn, 'w') as f:
+            f.write(content)
+
+        return extension_enabled(self.fn)
+
+    def test_listed(self):
+        self.assertTrue(self.enabled("extensions = [ 'sphinx.ext.todo', 'giza.sphinxext' ]\n"))
+        self.assertTrue(self.enabled("extensions = []\nextensions.append('giza.sphinxext')\n"))
+        self.assertTrue(self.enabled("extensions = []\nextensions += ['giza.sphinxext']\n"))
+
+    def test_not_listed(self):
+        self.assertFalse(self.enabled("extensions = [ 'sphinx.ext.todo' ]\n# giza.sphinxext\n"))
+        self.assertFalse(self.enabled("project = 'giza.sphinxext'\n"))
+        self.assertFalse(self.enabled("extensions = [\n"))
+        self.assertFalse(extension_enabled(os.path.join(self.dir, 'missing.py')))
+
+class TestPhaseTimings(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.fn = os.path.join(self.dir, 'phases.json')
+        os.environ[phase_timings_variable] = self.fn
+
+    def tearDown(self):
+        del os.environ[phase_timings_variable]
+        shutil.rmtree(self.dir)
+
+    def test_writes_phases(self):
+        app = Namespace()
+        start_phase_timer(app)
+        mark_read_complete(app, None)
+        write_phase_timings(app, None)
+
+        with open(self.fn) as f:
+            self.assertEqual(sorted(json.load(f)), ['read', 'write'])
+
+    def test_skips_failed_builds(self):
+        app = Namespace()
+        start_phase_timer(app)
+        write_phase_timings(app, Exception())
+
+        self.assertFalse(os.path.exists(self.fn))
@@ -0,0 +1,180 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+from giza.tools.files import copy_if_needed, file_signature
+from giza.tools.transfer import ExclusionMatcher, transfer_tree, manifest_signatures
+from giza.tools.transformation import append_to_file, prepend_to_file
+
+def write_file(path, content):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+
+    with open(path, 'w') as f:
+        f.write(content)
+
+def read_file(path):
+    with open(path, 'r') as f:
+        return f.read()
+
+class TestExclusionMatcher(TestCase):
+    def test_patterns(self):
+        m = ExclusionMatcher(['includes/table', 'reference/*.rst', '/images/*.png'])
+
+        self.assertTrue(m.match('includes/table'))
+        self.assertTrue(m.match('reference/method.rst'))
+        self.assertTrue(m.match('sub/reference/method.rst'))
+        self.assertFalse(m.match('reference/method/find.rst'))
+        self.assertTrue(m.match('images/a.png'))
+        self.assertFalse(m.match('sub/images/a.png'))
+
+    def test_empty(self):
+        self.assertFalse(ExclusionMatcher([]).match('index.txt'))
+
+class TestTransferTree(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.dir, 'source')
+        self.target = os.path.join(self.dir, 'build', 'source')
+        self.manifest = os.path.join(self.dir, 'build', 'manifest.json')
+
+        write_file(os.path.join(self.source, 'index.txt'), 'index')
+        write_file(os.path.join(self.source, 'tutorial', 'install.txt'), 'install')
+        write_file(os.path.join(self.source, 'includes', 'table', 'a.yaml'), 'table')
+        write_file(os.path.join(self.source, 'secret.txt'), 'secret')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def transfer(self, link='copy'):
+        return transfer_tree(self.source, self.target,
+                             exclusions=['includes/table'],
+                             redactions=['/secret.txt'],
+                             manifest=self.manifest,
+                             link=link,
+                             pool_size=2)
+
+    def test_initial_transfer(self):
+        result = self.transfer()
+
+        self.assertEqual(result.copied, 2)
+        self.assertEqual(read_file(os.path.join(self.target, 'tutorial', 'install.txt')), 'install')
+        self.assertFalse(os.path.exists(os.path.join(self.target, 'includes', 'table')))
+        self.assertFalse(os.path.exists(os.path.join(self.target, 'secret.txt')))
+
+    def test_unchanged_files_keep_mtime(self):
+        self.transfer()
+        target_fn = os.path.join(self.target, 'index.txt')
+        os.utime(target_fn, (1, 1))
+
+        # rewriting the source with the same content doesn't copy the file.
+        write_file(os.path.join(self.source, 'index.txt'), 'index')
+        result = self.transfer()
+
+        self.assertEqual(result.copied, 0)
+        self.assertEqual(result.unchanged, 2)
+        self.assertEqual(os.path.getmtime(target_fn), 1)
+
+    def test_changed_files_are_copied(self):
+        self.transfer()
+        write_file(os.path.join(self.source, 'index.txt'), 'changed')
+
+        result = self.transfer(link='reflink')
+
+        self.assertEqual(result.copied, 1)
+        self.assertEqual(read_file(os.path.join(self.target, 'index.txt')), 'changed')
+
+    def test_deletes_extraneous_files(self):
+        self.transfer()
+        write_file(os.path.join(self.target, 'secret.txt'), 'secret')
+        write_file(os.path.join(self.target, 'includes', 'table', 'generated.rst'), 'generated')
+        shutil.rmtree(os.path.join(self.source, 'tutorial'))
+
+        result = self.transfer()
+
+        self.assertEqual(result.deleted, 2)
+        self.assertFalse(os.path.exists(os.path.join(self.target, 'tutorial')))
+        self.assertFalse(os.path.exists(os.path.join(self.target, 'secret.txt')))
+        self.assertTrue(os.path.exists(os.path.join(self.target, 'includes', 'table', 'generated.rst')))
+
+    def test_hardlinks(self):
+        self.transfer(link='hardlink')
+
+        self.assertEqual(os.stat(os.path.join(self.target, 'index.txt')).st_ino,
+                         os.stat(os.path.join(self.source, 'index.txt')).st_ino)
+
+    def test_hardlinks_replace_identical_copies(self):
+        self.transfer()
+        target_fn = os.path.join(self.target, 'index.txt')
+        os.utime(target_fn, (1, 1))
+
+        result = self.transfer(link='hardlink')
+
+        self.assertEqual(result.copied, 0)
+        self.assertEqual(os.stat(target_fn).st_ino,
+                         os.stat(os.path.join(self.source, 'index.txt')).st_ino)
+
+    def test_manifest_signatures(self):
+        self.transfer()
+
+        signatures = manifest_signatures(self.manifest, self.source, self.target)
+
+        self.assertEqual(len(signatures), 2)
+        for fn, sig in signatures.items():
+            self.assertEqual(file_signature(fn), sig)
+
+class TestSharedSourceFarms(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.dir, 'source')
+        self.shared = os.path.join(self.dir, 'build', 'shared-source')
+        self.editions = [ os.path.join(self.dir, 'build', ed, 'source') for ed in ('ed1', 'ed2') ]
+
+        write_file(os.path.join(self.source, 'index.txt'), 'body\n')
+
+        transfer_tree(self.source, self.shared, link='copy')
+        for target in self.editions:
+            transfer_tree(self.shared, target, link='hardlink')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def assertUnchanged(self, *trees):
+        for tree in trees:
+            self.assertEqual(read_file(os.path.join(tree, 'index.txt')), 'body\n')
+
+    def test_prepend_in_one_edition(self):
+        prepend_to_file(os.path.join(self.editions[0], 'index.txt'), '.. include:: /x\n')
+
+        self.assertEqual(read_file(os.path.join(self.editions[0], 'index.txt')), '.. include:: /x\nbody\n')
+        self.assertUnchanged(self.editions[1], self.shared, self.source)
+
+    def test_append_in_one_edition(self):
+        append_to_file(os.path.join(self.editions[0], 'index.txt'), 'footer')
+
+        self.assertEqual(read_file(os.path.join(self.editions[0], 'index.txt')), 'body\n\nfooter')
+        self.assertUnchanged(self.editions[1], self.shared)
+
+    def test_copy_into_one_edition(self):
+        write_file(os.path.join(self.dir, 'generated.txt'), 'generated')
+
+        copy_if_needed(os.path.join(self.dir, 'generated.txt'), os.path.join(self.editions[0], 'index.txt'))
+
+        self.assertEqual(read_file(os.path.join(self.editions[0], 'index.txt')), 'generated')
+        self.assertUnchanged(self.editions[1], self.shared)
@@ -0,0 +1,106 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import os
+import re
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+from giza.core.app import BuildApp
+from giza.tools.transformation import (Transformation, munge_page,
+                                       post_process_tasks)
+
+class TestTransformation(TestCase):
+    def test_applies_substitutions_in_order(self):
+        t = Transformation([ (re.compile('a'), 'b'), (re.compile('b'), 'c') ])
+
+        self.assertIsNotNone(t.pattern)
+        self.assertEqual(t.apply('a b x'), 'c c x')
+        self.assertEqual(t.apply('xyz'), 'xyz')
+
+    def test_groups_in_substitutions(self):
+        t = Transformation([ (re.compile(r'(index|bfcode)\{(.*)--(.*)\}'), r'\1{\2-{-}\3}'),
+                             (re.compile(r'\\PYGZsq{}'), "'") ])
+
+        self.assertEqual(t.apply(r'\index{a--b} \PYGZsq{}'), r"\index{a-{-}b} '")
+
+    def test_backreferences_are_not_combined(self):
+        t = Transformation([ (re.compile(r'(a)\1'), 'b'), (re.compile('c'), 'd') ])
+
+        self.assertIsNone(t.pattern)
+        self.assertEqual(t.apply('aac'), 'bd')
+
+    def test_add(self):
+        t = Transformation((re.compile('a'), 'b')) + (re.compile('b'), 'c')
+
+        self.assertEqual(len(t.substitutions), 2)
+        self.assertEqual(t.apply('a'), 'c')
+
+class TestMungePage(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.fn = os.path.join(self.dir, 'page.html')
+
+        with io.open(self.fn, 'w', encoding='utf-8') as f:
+            f.write(u'href="contents.html"  \nunchanged \u2014 text\n')
+
+        self.regex = (re.compile('contents.html'), 'index.html')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def read(self, fn):
+        with io.open(fn, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def test_in_place(self):
+        self.assertTrue(munge_page(self.fn, self.regex))
+
+        self.assertEqual(self.read(self.fn), u'href="index.html"\nunchanged \u2014 text\n')
+        self.assertEqual(os.listdir(self.dir), ['page.html'])
+
+    def test_unchanged_output_keeps_mtime(self):
+        out_fn = os.path.join(self.dir, 'out', 'page.html')
+
+        self.assertTrue(munge_page(self.fn, self.regex, out_fn, copy='ifNeeded'))
+        os.utime(out_fn, (1, 1))
+
+        self.assertFalse(munge_page(self.fn, self.regex, out_fn, copy='ifNeeded'))
+        self.assertEqual(os.path.getmtime(out_fn), 1)
+
+    def test_post_process_tasks_merge_transforms_per_file(self):
+        app = BuildApp()
+        app.pool = 'serial'
+        app.conf.runstate.pool_size = 2
+
+        other = os.path.join(self.dir, 'other.html')
+        shutil.copyfile(self.fn, other)
+
+        post_process_tasks(app, tasks=[
+            { 'file': [ self.fn, other ],
+              'transform': { 'regex': 'contents', 'replace': 'index' } },
+            { 'file': self.fn,
+              'transform': [ { 'regex': 'index', 'replace': 'search' } ] }
+        ])
+
+        self.assertEqual(len(app.queue), 1)
+        self.assertEqual(len(app.queue[0].queue), 2)
+
+        app.run()
+
+        self.assertIn(u'href="search.html"', self.read(self.fn))
+        self.assertIn(u'href="index.html"', self.read(other))
@@ -0,0 +1,106 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+import giza.operations.watch
+
+from giza.operations.watch import WatchSession
+from giza.tools.watch import PollingWatcher, ignored_file, wait_for_changes
+
+class TestPollingWatcher(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.fn = os.path.join(self.dir, 'index.txt')
+        with open(self.fn, 'w') as f:
+            f.write('index')
+
+        self.watcher = PollingWatcher([self.dir], interval=0.01)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_no_changes(self):
+        self.assertEqual(self.watcher.changes(timeout=0), set())
+
+    def test_modified_added_and_removed_files(self):
+        new_fn = os.path.join(self.dir, 'new.txt')
+        with open(new_fn, 'w') as f:
+            f.write('new')
+        with open(self.fn, 'w') as f:
+            f.write('changed index')
+
+        self.assertEqual(self.watcher.changes(timeout=0), set([self.fn, new_fn]))
+
+        os.remove(new_fn)
+        self.assertEqual(self.watcher.changes(timeout=0), set([new_fn]))
+
+    def test_ignores_editor_files(self):
+        self.assertTrue(ignored_file('/source/.#index.txt'))
+        self.assertTrue(ignored_file('/source/index.txt~'))
+        self.assertFalse(ignored_file('/source/index.txt'))
+
+        with open(os.path.join(self.dir, '.index.txt.swp'), 'w') as f:
+            f.write('swap')
+
+        self.assertEqual(self.watcher.changes(timeout=0), set())
+
+class TestDebounce(TestCase):
+    def test_collects_bursts(self):
+        batches = [ set(), set(['a']), set(['b']), set() ]
+
+        class Watcher(object):
+            def changes(self, timeout):
+                return batches.pop(0)
+
+        self.assertEqual(wait_for_changes(Watcher(), debounce=0.1), set(['a', 'b']))
+        self.assertEqual(batches, [])
+
+class TestWatchSession(TestCase):
+    def setUp(self):
+        self.apps = []
+        apps = self.apps
+
+        class App(object):
+            def __init__(self, conf):
+                self.closed = False
+                apps.append(self)
+
+            def close_pool(self):
+                self.closed = True
+
+        def publish(conf, args, app, configs=None, content_types=None):
+            raise ValueError('broken build')
+
+        self.saved = (giza.operations.watch.BuildApp, giza.operations.watch.sphinx_publication)
+        giza.operations.watch.BuildApp = App
+        giza.operations.watch.sphinx_publication = publish
+
+        self.session = WatchSession(conf=None, args=None)
+
+    def tearDown(self):
+        giza.operations.watch.BuildApp, giza.operations.watch.sphinx_publication = self.saved
+
+    def test_failed_build_closes_pool(self):
+        self.assertRaises(ValueError, self.session.build)
+        self.assertTrue(self.apps[0].closed)
+
+    def test_failed_rebuild_is_logged(self):
+        self.assertIsNone(self.session.try_rebuild())
+        self.assertIsNone(self.session.try_rebuild())
+        self.assertEqual(len(self.apps), 2)